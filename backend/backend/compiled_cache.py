@@ -0,0 +1,100 @@
+"""
+Cache cấu trúc đã biên dịch trong bộ nhớ process
+
+Dữ liệu cấu hình ít thay đổi (quy tắc phí vận chuyển, khuyến mãi...) được đọc
+từ database một lần, biên dịch thành cấu trúc tra cứu và giữ trong bộ nhớ
+của từng process. Các process so sánh "version" tối đa mỗi `check_interval`
+giây và biên dịch lại khi version khác. Version gồm:
+
+- version nguồn (`version`, thường là table_version(Model): số dòng và
+  updated_at mới nhất, đọc từ database nên mọi process đều thấy thay đổi)
+- version trong Django cache, đổi bởi invalidate(): process gọi invalidate
+  thấy thay đổi ngay. Cache mặc định (LocMemCache) chỉ nằm trong một
+  process, nên không có version nguồn thì các process khác không biết dữ
+  liệu đã đổi (có cảnh báo ở lần biên dịch đầu tiên).
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max
+
+
+logger = logging.getLogger(__name__)
+
+
+def table_version(model, field='updated_at'):
+    """
+    Version nguồn từ bảng của model: (số dòng, giá trị lớn nhất của `field`)
+
+    Sửa (save() cập nhật auto_now), thêm hoặc xóa dòng đều đổi version.
+    """
+    def version():
+        row = model.objects.aggregate(count=Count('pk'), latest=Max(field))
+        return row['count'], row['latest']
+    return version
+
+
+class CompiledCache:
+    """
+    Giữ kết quả của `builder()` trong bộ nhớ, biên dịch lại khi version đổi
+
+    Ví dụ:
+        rules = CompiledCache('shipping_rules', build_rules, version=table_version(ShippingRule))
+        table = rules.get()
+        rules.invalidate()  # sau khi thay đổi dữ liệu
+    """
+
+    def __init__(self, name, builder, check_interval=5, version=None):
+        self.name = name
+        self.version_key = f'compiled:{name}:version'
+        self.builder = builder
+        self.check_interval = check_interval
+        self.source_version = version
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _cache_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add() để các process khởi động cùng lúc dùng chung một version
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+        return version
+
+    def _current_version(self):
+        if self.source_version is None:
+            return self._cache_version(), None
+        return self._cache_version(), self.source_version()
+
+    def get(self):
+        """Lấy cấu trúc đã biên dịch (chỉ kiểm tra version mỗi check_interval giây)"""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return self._value
+
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.check_interval:
+                return self._value
+
+            if self._version is None and self.source_version is None and isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+                logger.warning('compiled_cache.process_local_version', extra={'cache_name': self.name})
+
+            version = self._current_version()
+            if version != self._version:
+                self._value = self.builder()
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self):
+        """Đổi version để mọi process biên dịch lại ở lần kiểm tra tiếp theo"""
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        # Process hiện tại thấy thay đổi ngay
+        self._checked_at = 0.0
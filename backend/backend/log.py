@@ -0,0 +1,164 @@
+"""
+Logging có cấu trúc, không chặn request
+
+- JsonFormatter: mỗi record là một dòng JSON (thời gian, level, logger,
+  message và các field truyền qua `extra=`).
+- RedactingFilter: che giá trị của các khóa bí mật (chữ ký, secret key,
+  mật khẩu, token...) trong `extra`, trong args dạng dict và trong chuỗi
+  dạng `key=value`.
+- SamplingFilter: record DEBUG chỉ được giữ lại theo tỉ lệ lấy mẫu.
+- AsyncJsonHandler: QueueHandler đẩy record vào hàng đợi trong bộ nhớ, một
+  thread QueueListener ghi ra stream; thread xử lý request không chờ I/O.
+  Hàng đợi đầy thì bỏ record thay vì chặn.
+
+Cấu hình trong settings.LOGGING (LOG_LEVEL, LOG_LEVELS, LOG_DEBUG_SAMPLE_RATE).
+
+Ví dụ:
+    logger = logging.getLogger(__name__)
+    logger.info('payment.ipn_received', extra={'gateway': 'momo', 'order_number': number})
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import traceback
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+REDACTED = '***'
+
+SECRET_KEY_PATTERN = re.compile(
+    r'(signature|securehash|secret|password|passwd|token|access_?key|authorization|api_?key)',
+    re.IGNORECASE
+)
+SECRET_PAIR_PATTERN = re.compile(
+    r'((?:vnp_)?(?:signature|securehash|secretkey|secret_key|hash_secret|password|token|accesskey|access_key)\s*[=:]\s*)'
+    r'([^&\s,;]+)',
+    re.IGNORECASE
+)
+
+# Thuộc tính chuẩn của LogRecord (không phải field truyền qua `extra=`)
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(value):
+    """Che giá trị bí mật trong dict / list / chuỗi (trả về bản sao)"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SECRET_KEY_PATTERN.search(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        return SECRET_PAIR_PATTERN.sub(lambda match: match.group(1) + REDACTED, value)
+    return value
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in RESERVED_ATTRS}
+
+
+class RedactingFilter(logging.Filter):
+    """Che thông tin bí mật trước khi record rời khỏi thread gọi log"""
+
+    def filter(self, record):
+        if isinstance(record.msg, str):
+            record.msg = redact(record.msg)
+        if record.args:
+            record.args = redact(record.args)
+        for key, value in _extra_fields(record).items():
+            if SECRET_KEY_PATTERN.search(key):
+                setattr(record, key, REDACTED)
+            elif isinstance(value, (dict, list, tuple, str)):
+                setattr(record, key, redact(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Chỉ giữ lại một phần record DEBUG (rate: 0-1); INFO trở lên luôn được giữ"""
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Định dạng record thành một dòng JSON"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(_extra_fields(record))
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class AsyncJsonHandler(QueueHandler):
+    """
+    Handler ghi log bất đồng bộ qua hàng đợi
+
+    Record được chuẩn bị (ghép message, format traceback) ngay trên thread
+    gọi log rồi đưa vào hàng đợi; thread listener định dạng JSON và ghi ra
+    stream.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        self.stream = stream or sys.stdout
+        self.queue_size = queue_size
+        self.dropped = 0
+        super().__init__(queue.Queue(queue_size))
+        self._start_listener()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # Thread listener không tồn tại trong process con sau fork (gunicorn --preload)
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_listener(self):
+        target = logging.StreamHandler(self.stream)
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+
+    def _restart_after_fork(self):
+        self.queue = queue.Queue(self.queue_size)
+        self._start_listener()
+
+    def stop(self):
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,132 @@
+"""
+Prometheus metrics cho từng endpoint
+
+Middleware ghi nhận latency, số lượng và thời gian truy vấn DB, kích thước
+response và status code theo từng view. Endpoint /metrics trả về dữ liệu
+ở định dạng text của Prometheus.
+
+Khi chạy nhiều gunicorn worker, đặt biến môi trường PROMETHEUS_MULTIPROC_DIR
+trỏ tới một thư mục rỗng (xóa sạch mỗi lần khởi động) để các worker ghi
+metrics ra file và /metrics tổng hợp từ tất cả các worker. gunicorn.conf.py
+dọn thư mục này khi khởi động và đánh dấu worker đã dừng (child_exit).
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Thời gian xử lý request theo view',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RESPONSES = Counter(
+    'http_responses_total',
+    'Số response theo view và status code',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Số câu truy vấn DB mỗi request',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_DURATION = Histogram(
+    'http_request_db_duration_seconds',
+    'Tổng thời gian truy vấn DB mỗi request',
+    ['view'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Kích thước response (không tính streaming response)',
+    ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+
+class QueryCounter:
+    """execute_wrapper đếm số câu truy vấn và tổng thời gian truy vấn"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def _view_label(request):
+    """Tên view (route name) để giữ số lượng label nhỏ, không dùng path thô"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """Middleware ghi metrics cho mọi request (trừ chính /metrics)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == '/metrics':
+            return self.get_response(request)
+
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = _view_label(request)
+        REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        RESPONSES.labels(view, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(view).observe(queries.count)
+        DB_DURATION.labels(view).observe(queries.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+
+        return response
+
+
+def _is_allowed(request):
+    """Chỉ cho phép truy cập nội bộ: IP trong danh sách hoặc đúng token"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.META.get('HTTP_AUTHORIZATION') == f'Bearer {token}':
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+
+
+def metrics_view(request):
+    """Endpoint /metrics (Prometheus text format)"""
+    if not _is_allowed(request):
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Tổng hợp metrics của tất cả gunicorn worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
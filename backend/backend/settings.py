@@ -54,10 +54,14 @@ INSTALLED_APPS = [
     'categories',
     'products',
     'reviews',
-    'orders'
+    'orders',
+    'carts',
+    'promotions',
+    'notifications'
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',  # Per-endpoint latency/query metrics
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add Whitenoise here
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -131,6 +135,23 @@ CACHES = {
     }
 }
 
+# Cache dùng chung giữa các worker (tra cứu đơn hàng, throttle) khi có Redis
+redis_url = os.environ.get('REDIS_URL')
+if redis_url:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': redis_url,
+        'TIMEOUT': 300,
+    }
+
+# Thời gian giữ cache tra cứu đơn hàng (được làm mới mỗi khi đổi trạng thái)
+ORDER_TRACKING_CACHE_TIMEOUT = int(os.environ.get('ORDER_TRACKING_CACHE_TIMEOUT', 3600))
+
+# Cache báo cáo (orders.report_cache): khoảng thời gian chạm tới hôm nay giữ
+# trong thời gian ngắn; khoảng đã đóng giữ lâu (bị bỏ khi dữ liệu ngày cũ thay đổi)
+REPORT_CACHE_LIVE_TIMEOUT = int(os.environ.get('REPORT_CACHE_LIVE_TIMEOUT', 60))
+REPORT_CACHE_CLOSED_TIMEOUT = int(os.environ.get('REPORT_CACHE_CLOSED_TIMEOUT', 7 * 24 * 3600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -200,6 +221,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-cart-token',
 ]
 
 # REST Framework Settings
@@ -221,7 +243,8 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/minute',
-        'user': '1000/minute'
+        'user': '1000/minute',
+        'order_tracking': '20/minute'
     }
 }
 
@@ -251,6 +274,105 @@ MEDIA_ROOT = BASE_DIR / 'media'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Quy tắc phí vận chuyển được biên dịch trong bộ nhớ mỗi process;
+# số giây tối đa trước khi kiểm tra version để nhận thay đổi
+SHIPPING_RULES_CHECK_INTERVAL = int(os.environ.get('SHIPPING_RULES_CHECK_INTERVAL', 5))
+
+# Mã giảm giá: bảng mã biên dịch trong bộ nhớ (kiểm tra version mỗi N giây)
+# và số mảnh bộ đếm lượt dùng mỗi mã (giảm tranh chấp khóa khi nhiều đơn dùng cùng mã)
+COUPONS_CHECK_INTERVAL = int(os.environ.get('COUPONS_CHECK_INTERVAL', 5))
+COUPON_USAGE_SHARDS = int(os.environ.get('COUPON_USAGE_SHARDS', 16))
+
+# Số mảnh mỗi dòng tổng hợp doanh số theo ngày (orders.rollups): các đơn tạo
+# đồng thời ghi vào các mảnh khác nhau thay vì cùng chờ khóa một dòng
+SALES_ROLLUP_SLOTS = int(os.environ.get('SALES_ROLLUP_SLOTS', 8))
+
+# Lưu trữ đơn hàng: đơn đã kết thúc cũ hơn số ngày này được chuyển sang bảng lưu trữ
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+# Logging: JSON mỗi dòng ra stdout qua hàng đợi + thread ghi riêng (backend/log.py)
+# LOG_LEVELS: level theo module, ví dụ "orders.vnpay=DEBUG,orders.momo=DEBUG"
+# LOG_DEBUG_SAMPLE_RATE: tỉ lệ record DEBUG được ghi (0-1)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = dict(
+    item.strip().split('=', 1)
+    for item in os.environ.get('LOG_LEVELS', '').split(',')
+    if '=' in item
+)
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'redact': {'()': 'backend.log.RedactingFilter'},
+        'sample_debug': {'()': 'backend.log.SamplingFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'json': {
+            'class': 'backend.log.AsyncJsonHandler',
+            'filters': ['sample_debug', 'redact'],
+        },
+    },
+    'root': {
+        'handlers': ['json'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        'django': {'handlers': ['json'], 'level': 'INFO', 'propagate': False},
+        **{
+            name.strip(): {'level': level.strip().upper()}
+            for name, level in LOG_LEVELS.items()
+        },
+    },
+}
+
+# Metrics (/metrics, Prometheus text format)
+# Với gunicorn nhiều worker: đặt PROMETHEUS_MULTIPROC_DIR tới một thư mục rỗng
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Thông báo (outbox): worker `manage.py send_notifications --loop` gửi bất đồng bộ
+NOTIFICATION_CHANNELS = os.environ.get('NOTIFICATION_CHANNELS', 'email').split(',')
+NOTIFICATION_BACKENDS = {
+    'email': os.environ.get('NOTIFICATION_EMAIL_BACKEND', 'notifications.backends.ConsoleBackend'),
+    'sms': os.environ.get('NOTIFICATION_SMS_BACKEND', 'notifications.backends.ConsoleBackend'),
+}
+# Số lượt gửi đồng thời tối đa theo kênh
+NOTIFICATION_CONCURRENCY = {
+    'email': int(os.environ.get('NOTIFICATION_EMAIL_CONCURRENCY', 4)),
+    'sms': int(os.environ.get('NOTIFICATION_SMS_CONCURRENCY', 2)),
+}
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+NOTIFICATION_FILE_PATH = os.environ.get('NOTIFICATION_FILE_PATH', str(BASE_DIR / 'notifications.jsonl'))
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@localhost')
+
+# Inbox IPN thanh toán: worker `manage.py process_payment_events --loop` cập nhật đơn hàng
+# (IPN URL của VNPay đăng ký trên cổng merchant: /api/orders/vnpay_ipn/)
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENT_MAX_ATTEMPTS', 10))
+
+# Thời hạn của URL thanh toán đã tạo; trong thời hạn này khách bấm thanh toán lại
+# được trả về URL cũ, không gọi lại cổng thanh toán
+PAYMENT_ATTEMPT_TTL_MINUTES = int(os.environ.get('PAYMENT_ATTEMPT_TTL_MINUTES', 15))
+
+# Đối soát thanh toán (`manage.py reconcile_payments`, chạy định kỳ bằng cron / scheduler):
+# số truy vấn đồng thời, giới hạn truy vấn mỗi giây theo cổng, tuổi tối thiểu của đơn
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', 8))
+RECONCILE_RATE_LIMITS = {
+    'vnpay': float(os.environ.get('RECONCILE_VNPAY_RATE', 5)),
+    'momo': float(os.environ.get('RECONCILE_MOMO_RATE', 5)),
+}
+RECONCILE_MIN_AGE_MINUTES = int(os.environ.get('RECONCILE_MIN_AGE_MINUTES', 20))
+
+# Hoàn tiền đơn thanh toán online bị hủy / hoàn trả (worker `manage.py process_refunds --loop`):
+# số yêu cầu gửi đồng thời, giới hạn yêu cầu mỗi giây theo cổng, số lần thử lại khi lỗi kết nối
+REFUND_CONCURRENCY = int(os.environ.get('REFUND_CONCURRENCY', 4))
+REFUND_RATE_LIMITS = {
+    'vnpay': float(os.environ.get('REFUND_VNPAY_RATE', 2)),
+    'momo': float(os.environ.get('REFUND_MOMO_RATE', 2)),
+}
+REFUND_MAX_ATTEMPTS = int(os.environ.get('REFUND_MAX_ATTEMPTS', 8))
+
 # VNPay Settings
 import os
 from pathlib import Path
@@ -259,6 +381,7 @@ VNPAY_TMN_CODE = os.environ.get('VNPAY_TMN_CODE', '')  # Mã website của bạn
 VNPAY_HASH_SECRET = os.environ.get('VNPAY_HASH_SECRET', '')  # Secret key
 VNPAY_URL = os.environ.get('VNPAY_URL', 'https://sandbox.vnpayment.vn/paymentv2/vpcpay.html')  # URL thanh toán
 VNPAY_RETURN_URL = os.environ.get('VNPAY_RETURN_URL', 'http://localhost:3000/customer/payment/vnpay-return')  # URL callback
+VNPAY_API_URL = os.environ.get('VNPAY_API_URL', 'https://sandbox.vnpayment.vn/merchant_webapi/api/transaction')  # API truy vấn / hoàn tiền
 
 # MoMo Configuration
 MOMO_PARTNER_CODE = os.environ.get('MOMO_PARTNER_CODE', '')  # Partner Code từ MoMo
@@ -267,3 +390,12 @@ MOMO_SECRET_KEY = os.environ.get('MOMO_SECRET_KEY', '')  # Secret Key
 MOMO_API_URL = os.environ.get('MOMO_API_URL', 'https://test-payment.momo.vn/v2/gateway/api/create')  # API URL (test hoặc production)
 MOMO_RETURN_URL = os.environ.get('MOMO_RETURN_URL', 'http://localhost:3000/customer/payment/momo-return')  # URL callback
 MOMO_NOTIFY_URL = os.environ.get('MOMO_NOTIFY_URL', 'http://localhost:8000/api/orders/momo_ipn/')  # IPN webhook URL
+
+# HTTP client cổng thanh toán (pool kết nối, timeout, thử lại, circuit breaker)
+GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('GATEWAY_CONNECT_TIMEOUT', 3))
+GATEWAY_READ_TIMEOUT = float(os.environ.get('GATEWAY_READ_TIMEOUT', 10))
+GATEWAY_MAX_RETRIES = int(os.environ.get('GATEWAY_MAX_RETRIES', 2))
+GATEWAY_RETRY_BACKOFF = float(os.environ.get('GATEWAY_RETRY_BACKOFF', 0.2))
+GATEWAY_POOL_SIZE = int(os.environ.get('GATEWAY_POOL_SIZE', 10))
+GATEWAY_BREAKER_FAILURES = int(os.environ.get('GATEWAY_BREAKER_FAILURES', 5))
+GATEWAY_BREAKER_RESET_TIMEOUT = float(os.environ.get('GATEWAY_BREAKER_RESET_TIMEOUT', 30))
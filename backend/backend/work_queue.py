@@ -0,0 +1,86 @@
+"""
+Hàng đợi công việc lưu trong database
+
+Dùng chung cho outbox thông báo (notifications.OutboxMessage), inbox sự kiện
+thanh toán (orders.PaymentEvent) và yêu cầu hoàn tiền (orders.Refund). Các
+bảng này có chung các cột status ('pending' / 'processing' / ...), attempts,
+next_attempt_at và locked_at:
+
+- claim_batch: nhận một lô dòng đến hạn bằng SELECT ... FOR UPDATE SKIP
+  LOCKED (nhiều worker chạy song song không nhận trùng) và đánh dấu
+  processing; worker xử lý ngoài transaction.
+- Dòng ở trạng thái processing quá STALE_LOCK_TIMEOUT (worker chết giữa
+  chừng) được nhận lại.
+- backoff_delay / retry_fields: xử lý lỗi được thử lại với exponential
+  backoff + jitter, chuyển 'failed' khi hết số lần thử.
+"""
+import random
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Dòng ở trạng thái processing quá lâu (worker chết giữa chừng) được nhận lại
+STALE_LOCK_TIMEOUT = timedelta(minutes=10)
+
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 600
+
+
+def backoff_delay(attempts, base_seconds=BACKOFF_BASE_SECONDS, max_seconds=BACKOFF_MAX_SECONDS):
+    """Thời gian chờ trước lần thử thứ attempts + 1 (exponential backoff + jitter)"""
+    delay = min(base_seconds * (2 ** (attempts - 1)), max_seconds)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def retry_fields(attempts, max_attempts, now=None, **backoff):
+    """
+    Các field cập nhật cho dòng xử lý lỗi lần thứ attempts
+
+    Returns:
+        {'status': 'failed'} khi đã hết số lần thử, ngược lại trả dòng về
+        'pending' với next_attempt_at sau backoff_delay
+    """
+    if attempts >= max_attempts:
+        return {'status': 'failed'}
+    now = now or timezone.now()
+    return {'status': 'pending', 'next_attempt_at': now + backoff_delay(attempts, **backoff)}
+
+
+def due_filter(now):
+    """Điều kiện dòng đến hạn: pending đã tới giờ hoặc processing quá hạn khóa"""
+    return (
+        Q(status='pending', next_attempt_at__lte=now) |
+        Q(status='processing', locked_at__lt=now - STALE_LOCK_TIMEOUT)
+    )
+
+
+def claim_batch(queryset, batch_size, accept=None):
+    """
+    Nhận một lô dòng đến hạn (theo thứ tự id) và đánh dấu processing
+
+    Args:
+        queryset: Queryset của bảng công việc (có thể kèm select_related)
+        batch_size: Số dòng tối đa mỗi lô
+        accept: Hàm (rows, now) -> các dòng được nhận, gọi trong transaction
+            sau khi khóa (ví dụ bỏ qua dòng phải chờ dòng khác xử lý xong)
+
+    Returns:
+        List các dòng đã nhận
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(
+                skip_locked=connection.features.has_select_for_update_skip_locked
+            ).filter(due_filter(now)).order_by('id')[:batch_size]
+        )
+        if accept is not None:
+            rows = accept(rows, now)
+        if rows:
+            queryset.model.objects.filter(
+                id__in=[row.id for row in rows]
+            ).update(status='processing', locked_at=now)
+    return rows
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import Cart, CartItem
+
+
+class CartItemInline(admin.TabularInline):
+    """Inline cho CartItem trong Cart admin"""
+    model = CartItem
+    extra = 0
+    readonly_fields = ['product', 'quantity', 'unit_price', 'subtotal']
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    """Admin cho giỏ hàng"""
+    list_display = ['id', 'user', 'item_count', 'subtotal', 'updated_at']
+    search_fields = ['user__username', 'user__email', 'token']
+    readonly_fields = ['token', 'item_count', 'subtotal', 'created_at', 'updated_at']
+    inlines = [CartItemInline]
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CartsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'carts'
+
+    def ready(self):
+        # Đồng bộ giá trong giỏ hàng khi giá sản phẩm thay đổi
+        from . import signals  # noqa: F401
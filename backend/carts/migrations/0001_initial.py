@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:00
+
+import carts.models
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0002_remove_product_is_featured_alter_product_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=carts.models.generate_cart_token, max_length=64, unique=True, verbose_name='Mã giỏ hàng khách')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Tổng số lượng')),
+                ('subtotal', models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='Tạm tính')),
+                ('shipping_fee', models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='Phí vận chuyển')),
+                ('total', models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='Tổng cộng')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cart', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Giỏ hàng',
+                'verbose_name_plural': 'Giỏ hàng',
+                'db_table': 'carts',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Số lượng')),
+                ('unit_price', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='Đơn giá')),
+                ('subtotal', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='Thành tiền')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày thêm')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='carts.cart', verbose_name='Giỏ hàng')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='products.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Sản phẩm trong giỏ',
+                'verbose_name_plural': 'Sản phẩm trong giỏ',
+                'db_table': 'cart_items',
+                'ordering': ['id'],
+                'unique_together': {('cart', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='shipping_fee',
+        ),
+        migrations.RemoveField(
+            model_name='cart',
+            name='total',
+        ),
+    ]
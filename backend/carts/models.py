@@ -0,0 +1,103 @@
+import secrets
+
+from django.db import models
+from django.conf import settings
+from django.core.validators import MinValueValidator
+from products.models import Product
+
+
+def generate_cart_token():
+    return secrets.token_urlsafe(32)
+
+
+class Cart(models.Model):
+    """
+    Model giỏ hàng phía server
+    
+    Giỏ hàng thuộc về một user hoặc một khách vãng lai (xác định bằng token).
+    Tổng số lượng và tạm tính được lưu sẵn và cập nhật tăng dần mỗi khi dòng
+    hàng hoặc giá sản phẩm thay đổi. Phí vận chuyển phụ thuộc địa chỉ giao
+    hàng và khối lượng nên không lưu trong giỏ (báo giá qua
+    POST /api/shipping/quote/, tính lại khi đặt hàng).
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='cart',
+        verbose_name='Người dùng'
+    )
+    token = models.CharField(
+        max_length=64,
+        unique=True,
+        default=generate_cart_token,
+        verbose_name='Mã giỏ hàng khách'
+    )
+    
+    # Tổng tiền (lưu sẵn)
+    item_count = models.IntegerField(default=0, verbose_name='Tổng số lượng')
+    subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        verbose_name='Tạm tính'
+    )
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')
+    
+    class Meta:
+        db_table = 'carts'
+        verbose_name = 'Giỏ hàng'
+        verbose_name_plural = 'Giỏ hàng'
+        ordering = ['-updated_at']
+    
+    def __str__(self):
+        owner = self.user.username if self.user_id else 'Khách'
+        return f"Giỏ hàng #{self.id} - {owner}"
+
+
+class CartItem(models.Model):
+    """Model dòng hàng trong giỏ"""
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Giỏ hàng'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='cart_items',
+        verbose_name='Sản phẩm'
+    )
+    quantity = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name='Số lượng'
+    )
+    unit_price = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        verbose_name='Đơn giá'
+    )
+    subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        verbose_name='Thành tiền'
+    )
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày thêm')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')
+    
+    class Meta:
+        db_table = 'cart_items'
+        verbose_name = 'Sản phẩm trong giỏ'
+        verbose_name_plural = 'Sản phẩm trong giỏ'
+        ordering = ['id']
+        unique_together = ['cart', 'product']
+    
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity}"
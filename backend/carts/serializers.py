@@ -0,0 +1,35 @@
+from rest_framework import serializers
+from .models import Cart, CartItem
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    """Serializer cho dòng hàng trong giỏ"""
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_slug = serializers.CharField(source='product.slug', read_only=True)
+    product_image = serializers.ImageField(source='product.main_image', read_only=True)
+    product_unit = serializers.CharField(source='product.unit', read_only=True)
+    stock = serializers.IntegerField(source='product.stock', read_only=True)
+    
+    class Meta:
+        model = CartItem
+        fields = [
+            'id', 'product', 'product_name', 'product_slug', 'product_image',
+            'product_unit', 'stock', 'quantity', 'unit_price', 'subtotal'
+        ]
+
+
+class CartSerializer(serializers.ModelSerializer):
+    """Serializer cho giỏ hàng"""
+    items = CartItemSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Cart
+        fields = [
+            'id', 'token', 'items', 'item_count', 'subtotal', 'updated_at'
+        ]
+
+
+class CartItemWriteSerializer(serializers.Serializer):
+    """Serializer cho việc thêm/cập nhật sản phẩm trong giỏ"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
@@ -0,0 +1,231 @@
+"""
+Nghiệp vụ giỏ hàng
+
+Tạm tính của giỏ được cập nhật tăng dần: mỗi thao tác trên một dòng hàng
+chỉ cộng/trừ phần chênh lệch vào giỏ (đã khóa dòng), không tính lại toàn bộ.
+Khi giá sản phẩm thay đổi hoặc khi gộp giỏ, các giỏ bị ảnh hưởng được tính
+lại theo lô bằng một câu aggregate.
+"""
+from django.db import transaction
+from django.db.models import Sum, F
+
+from .models import Cart, CartItem
+
+
+# Khách vãng lai gửi token giỏ hàng qua header X-Cart-Token (hoặc tham số cart_token)
+CART_TOKEN_HEADER = 'HTTP_X_CART_TOKEN'
+
+
+class CartError(Exception):
+    """Lỗi nghiệp vụ giỏ hàng (trả về 400)"""
+
+
+def get_request_token(request):
+    """Lấy token giỏ hàng khách từ request"""
+    token = request.META.get(CART_TOKEN_HEADER) or request.query_params.get('cart_token')
+    if not token and hasattr(request.data, 'get'):
+        token = request.data.get('cart_token')
+    return token or None
+
+
+def get_cart(request, create=False):
+    """
+    Lấy giỏ hàng của request hiện tại
+
+    User đã đăng nhập dùng giỏ gắn với tài khoản, khách vãng lai dùng giỏ
+    theo token. Trả về None nếu chưa có giỏ và create=False.
+    """
+    if request.user.is_authenticated:
+        if create:
+            return Cart.objects.get_or_create(user=request.user)[0]
+        return Cart.objects.filter(user=request.user).first()
+
+    token = get_request_token(request)
+    cart = Cart.objects.filter(token=token, user__isnull=True).first() if token else None
+    if cart is None and create:
+        cart = Cart.objects.create()
+    return cart
+
+
+def get_checkout_cart(request, cart_id):
+    """Lấy giỏ hàng theo ID nếu thuộc về người đang đặt hàng"""
+    carts = Cart.objects.filter(id=cart_id)
+    if request.user.is_authenticated:
+        return carts.filter(user=request.user).first()
+
+    token = get_request_token(request)
+    if not token:
+        return None
+    return carts.filter(token=token, user__isnull=True).first()
+
+
+def _apply_totals(cart, item_count, subtotal):
+    cart.item_count = item_count
+    cart.subtotal = subtotal
+
+
+def _save_totals(cart):
+    cart.save(update_fields=['item_count', 'subtotal', 'updated_at'])
+
+
+def set_quantity(cart, product, quantity, delta=False):
+    """
+    Đặt số lượng một sản phẩm trong giỏ (quantity=0 để xóa)
+
+    delta=True: cộng quantity vào số lượng đang có. Số lượng mới được tính
+    sau khi khóa giỏ nên các lần thêm đồng thời không ghi đè nhau.
+
+    Raises:
+        CartError: sản phẩm ngừng bán hoặc không đủ tồn kho
+    """
+    with transaction.atomic():
+        # Khóa giỏ hàng để các thao tác đồng thời cộng dồn đúng
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        item = CartItem.objects.filter(cart=cart, product=product).first()
+
+        old_quantity = item.quantity if item else 0
+        old_subtotal = item.subtotal if item else 0
+        if delta:
+            quantity += old_quantity
+
+        if quantity > 0:
+            if product.status != 'active':
+                raise CartError(f"Sản phẩm '{product.name}' đã ngừng bán")
+            if product.stock < quantity:
+                raise CartError(
+                    f"Sản phẩm '{product.name}' chỉ còn {product.stock} {product.unit} trong kho"
+                )
+
+        if quantity <= 0:
+            if item:
+                item.delete()
+            new_subtotal = 0
+        else:
+            new_subtotal = product.price * quantity
+            if item:
+                item.quantity = quantity
+                item.unit_price = product.price
+                item.subtotal = new_subtotal
+                item.save(update_fields=['quantity', 'unit_price', 'subtotal', 'updated_at'])
+            else:
+                CartItem.objects.create(
+                    cart=cart,
+                    product=product,
+                    quantity=quantity,
+                    unit_price=product.price,
+                    subtotal=new_subtotal
+                )
+
+        _apply_totals(
+            cart,
+            cart.item_count + max(quantity, 0) - old_quantity,
+            cart.subtotal + new_subtotal - old_subtotal
+        )
+        _save_totals(cart)
+
+    return cart
+
+
+def add_item(cart, product, quantity):
+    """Thêm sản phẩm vào giỏ (cộng dồn nếu đã có)"""
+    return set_quantity(cart, product, quantity, delta=True)
+
+
+def clear(cart):
+    """Xóa toàn bộ sản phẩm trong giỏ"""
+    with transaction.atomic():
+        CartItem.objects.filter(cart=cart).delete()
+        _apply_totals(cart, 0, 0)
+        _save_totals(cart)
+    return cart
+
+
+def recalculate(cart_ids):
+    """Tính lại tổng tiền cho nhiều giỏ hàng bằng một câu aggregate"""
+    cart_ids = list(cart_ids)
+    if not cart_ids:
+        return
+
+    totals = {
+        row['cart_id']: row
+        for row in CartItem.objects.filter(cart_id__in=cart_ids).values('cart_id').annotate(
+            item_count=Sum('quantity'),
+            subtotal=Sum('subtotal')
+        ).order_by()
+    }
+
+    carts = list(Cart.objects.filter(id__in=cart_ids))
+    for cart in carts:
+        row = totals.get(cart.id)
+        _apply_totals(cart, row['item_count'] if row else 0, row['subtotal'] if row else 0)
+
+    Cart.objects.bulk_update(carts, ['item_count', 'subtotal'])
+
+
+def sync_product_price(product):
+    """
+    Cập nhật giá trong các giỏ hàng có chứa sản phẩm khi giá thay đổi
+
+    Chỉ một câu SELECT khi giá không đổi; ngược lại cập nhật các dòng hàng
+    bằng một câu UPDATE và tính lại các giỏ bị ảnh hưởng theo lô.
+    """
+    stale = CartItem.objects.filter(product=product).exclude(unit_price=product.price)
+    cart_ids = list(stale.values_list('cart_id', flat=True))
+    if not cart_ids:
+        return
+
+    with transaction.atomic():
+        CartItem.objects.filter(product=product, cart_id__in=cart_ids).update(
+            unit_price=product.price,
+            subtotal=F('quantity') * product.price
+        )
+        recalculate(cart_ids)
+
+
+def merge_guest_cart(token, user):
+    """
+    Gộp giỏ hàng khách (theo token) vào giỏ của user khi đăng nhập
+
+    Nếu user chưa có giỏ, giỏ khách được gán luôn cho user. Nếu cả hai
+    cùng có một sản phẩm, số lượng được cộng dồn (tối đa bằng tồn kho).
+    """
+    if not token:
+        return None
+
+    with transaction.atomic():
+        guest = Cart.objects.select_for_update().filter(token=token, user__isnull=True).first()
+        if guest is None:
+            return None
+
+        user_cart = Cart.objects.select_for_update().filter(user=user).first()
+        if user_cart is None:
+            guest.user = user
+            guest.save(update_fields=['user', 'updated_at'])
+            return guest
+
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=user_cart).select_related('product')
+        }
+        guest_items = list(CartItem.objects.filter(cart=guest))
+
+        merged = []
+        for item in guest_items:
+            target = existing.get(item.product_id)
+            if target is None:
+                continue
+            target.quantity = min(target.quantity + item.quantity, max(target.product.stock, target.quantity))
+            target.unit_price = target.product.price
+            target.subtotal = target.unit_price * target.quantity
+            merged.append(target)
+
+        if merged:
+            CartItem.objects.bulk_update(merged, ['quantity', 'unit_price', 'subtotal'])
+
+        # Chuyển các sản phẩm chỉ có trong giỏ khách sang giỏ của user
+        CartItem.objects.filter(cart=guest).exclude(product_id__in=existing.keys()).update(cart=user_cart)
+        guest.delete()
+        recalculate([user_cart.id])
+
+    user_cart.refresh_from_db()
+    return user_cart
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from . import services
+
+
+@receiver(post_save, sender=Product)
+def sync_cart_prices(sender, instance, created, update_fields=None, **kwargs):
+    """Đồng bộ đơn giá trong giỏ hàng khi sản phẩm được cập nhật giá"""
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    services.sync_product_price(instance)
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from categories.models import Category
+from products.models import Product
+from .models import Cart, CartItem
+from . import services
+
+
+class CartServiceTests(TestCase):
+    """carts.services: cộng dồn số lượng và tổng tiền lưu sẵn của giỏ"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Trái cây')
+        cls.product = Product.objects.create(name='Cam', category=category, price=20000, stock=5)
+
+    def setUp(self):
+        self.cart = Cart.objects.create()
+
+    def test_add_item_accumulates(self):
+        services.add_item(self.cart, self.product, 2)
+        cart = services.add_item(self.cart, self.product, 1)
+
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product).quantity, 3)
+        self.assertEqual((cart.item_count, cart.subtotal), (3, 60000))
+
+    def test_add_item_checks_stock_against_total_quantity(self):
+        services.add_item(self.cart, self.product, 4)
+        with self.assertRaises(services.CartError):
+            services.add_item(self.cart, self.product, 2)
+
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product).quantity, 4)
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (4, 80000))
+
+    def test_set_quantity_replaces_and_removes(self):
+        services.add_item(self.cart, self.product, 2)
+        cart = services.set_quantity(self.cart, self.product, 5)
+        self.assertEqual((cart.item_count, cart.subtotal), (5, 100000))
+
+        cart = services.set_quantity(self.cart, self.product, 0)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual((cart.item_count, cart.subtotal), (0, 0))
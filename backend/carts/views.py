@@ -0,0 +1,91 @@
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from products.models import Product
+from .models import Cart
+from .serializers import CartSerializer, CartItemWriteSerializer
+from . import services
+
+
+class CartViewSet(viewsets.ViewSet):
+    """
+    ViewSet cho giỏ hàng phía server
+    
+    User đã đăng nhập dùng giỏ gắn với tài khoản; khách vãng lai gửi token
+    giỏ hàng (nhận được ở lần thêm sản phẩm đầu tiên) qua header X-Cart-Token.
+    """
+    permission_classes = [AllowAny]
+    
+    def _cart_response(self, cart, status_code=status.HTTP_200_OK):
+        if cart is None:
+            return Response({
+                'id': None,
+                'token': None,
+                'items': [],
+                'item_count': 0,
+                'subtotal': 0
+            }, status=status_code)
+        
+        cart = Cart.objects.prefetch_related('items__product').get(pk=cart.pk)
+        return Response(CartSerializer(cart).data, status=status_code)
+    
+    def _change_item(self, request, add):
+        serializer = CartItemWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            product = Product.objects.get(id=serializer.validated_data['product_id'])
+        except Product.DoesNotExist:
+            return Response(
+                {'error': 'Không tìm thấy sản phẩm'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        quantity = serializer.validated_data['quantity']
+        cart = services.get_cart(request, create=quantity > 0)
+        if cart is None:
+            return self._cart_response(None)
+        
+        try:
+            if add:
+                cart = services.add_item(cart, product, quantity)
+            else:
+                cart = services.set_quantity(cart, product, quantity)
+        except services.CartError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return self._cart_response(cart)
+    
+    def list(self, request):
+        """Lấy giỏ hàng hiện tại"""
+        return self._cart_response(services.get_cart(request))
+    
+    @action(detail=False, methods=['post'])
+    def add_item(self, request):
+        """Thêm sản phẩm vào giỏ (cộng dồn số lượng)"""
+        return self._change_item(request, add=True)
+    
+    @action(detail=False, methods=['post'])
+    def update_item(self, request):
+        """Đặt số lượng sản phẩm trong giỏ (quantity=0 để xóa)"""
+        return self._change_item(request, add=False)
+    
+    @action(detail=False, methods=['post'])
+    def remove_item(self, request):
+        """Xóa sản phẩm khỏi giỏ"""
+        cart = services.get_cart(request)
+        product_id = request.data.get('product_id')
+        if cart is not None and product_id:
+            product = Product.objects.filter(id=product_id).first()
+            if product is not None:
+                cart = services.set_quantity(cart, product, 0)
+        return self._cart_response(cart)
+    
+    @action(detail=False, methods=['post'])
+    def clear(self, request):
+        """Xóa toàn bộ giỏ hàng"""
+        cart = services.get_cart(request)
+        if cart is not None:
+            cart = services.clear(cart)
+        return self._cart_response(cart)
@@ -0,0 +1,31 @@
+"""
+Cấu hình gunicorn
+
+Khi đặt PROMETHEUS_MULTIPROC_DIR (metrics tổng hợp từ nhiều worker, xem
+backend/metrics.py):
+- on_starting: xóa file metrics còn lại từ lần chạy trước
+- child_exit: đánh dấu worker đã dừng (mark_process_dead) để gauge dạng
+  live của worker đó không còn được tổng hợp
+"""
+import glob
+import os
+
+
+def _multiproc_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    path = _multiproc_dir()
+    if not path:
+        return
+    os.makedirs(path, exist_ok=True)
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        os.remove(filename)
+
+
+def child_exit(server, worker):
+    if not _multiproc_dir():
+        return
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    """Admin cho OutboxMessage"""
+    list_display = ['id', 'event_type', 'channel', 'recipient', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'channel', 'event_type']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = [
+        'event_type', 'channel', 'recipient', 'subject', 'body', 'payload',
+        'attempts', 'locked_at', 'last_error', 'created_at', 'sent_at'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,81 @@
+"""
+Backend gửi thông báo
+
+Mỗi backend có phương thức send(message) và raise exception khi gửi thất bại
+(worker sẽ thử lại với backoff). Cấu hình qua NOTIFICATION_BACKENDS.
+"""
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+class BaseBackend:
+    """Backend cơ sở"""
+
+    def send(self, message):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseBackend):
+    """Ghi thông báo ra log (dùng khi phát triển)"""
+
+    def send(self, message):
+        logger.info('notification.console', extra={
+            'channel': message.channel,
+            'recipient': message.recipient,
+            'subject': message.subject or message.body
+        })
+
+
+class FileBackend(BaseBackend):
+    """Ghi thông báo ra file JSON lines (dùng cho test và môi trường local)"""
+
+    _lock = threading.Lock()
+
+    def send(self, message):
+        record = {
+            'id': message.id,
+            'event_type': message.event_type,
+            'channel': message.channel,
+            'recipient': message.recipient,
+            'subject': message.subject,
+            'body': message.body,
+            'payload': message.payload,
+            'sent_at': timezone.now().isoformat(),
+        }
+        with self._lock:
+            with open(settings.NOTIFICATION_FILE_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class EmailBackend(BaseBackend):
+    """Gửi email qua EMAIL_BACKEND của Django"""
+
+    def send(self, message):
+        send_mail(
+            message.subject,
+            message.body,
+            settings.DEFAULT_FROM_EMAIL,
+            [message.recipient],
+            fail_silently=False
+        )
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(channel):
+    """Lấy backend cho kênh (khởi tạo một lần mỗi process)"""
+    with _backends_lock:
+        if channel not in _backends:
+            _backends[channel] = import_string(settings.NOTIFICATION_BACKENDS[channel])()
+        return _backends[channel]
@@ -0,0 +1,89 @@
+"""
+Worker gửi thông báo từ outbox
+
+Mỗi vòng: nhận một lô message đến hạn (khóa dòng, bỏ qua dòng đang bị
+worker khác khóa), gửi song song theo từng kênh với giới hạn đồng thời
+riêng, rồi cập nhật kết quả. Message lỗi được thử lại với exponential
+backoff + jitter cho tới NOTIFICATION_MAX_ATTEMPTS.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend import work_queue
+from .backends import get_backend
+from .models import OutboxMessage
+
+
+# Kênh gửi (email, SMS) lỗi thường kéo dài: chờ lâu hơn giữa các lần thử
+BACKOFF = {'base_seconds': 30, 'max_seconds': 3600}
+
+
+def claim_batch(batch_size):
+    """Nhận một lô message đến hạn và đánh dấu processing"""
+    return work_queue.claim_batch(OutboxMessage.objects.all(), batch_size)
+
+
+def _send(message):
+    try:
+        get_backend(message.channel).send(message)
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+
+class Dispatcher:
+    """Gửi message theo kênh, mỗi kênh một thread pool với giới hạn đồng thời riêng"""
+
+    def __init__(self):
+        self.executors = {
+            channel: ThreadPoolExecutor(
+                max_workers=settings.NOTIFICATION_CONCURRENCY.get(channel, 1),
+                thread_name_prefix=f'notify-{channel}'
+            )
+            for channel in settings.NOTIFICATION_BACKENDS
+        }
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+
+    def dispatch(self, messages):
+        """
+        Gửi một lô message và ghi kết quả
+
+        Returns:
+            (số message gửi thành công, số message lỗi)
+        """
+        futures = [
+            (message, self.executors[message.channel].submit(_send, message))
+            for message in messages
+        ]
+
+        now = timezone.now()
+        sent_ids = []
+        failed = 0
+        for message, future in futures:
+            error = future.result()
+            if error is None:
+                sent_ids.append(message.id)
+                continue
+
+            failed += 1
+            attempts = message.attempts + 1
+            OutboxMessage.objects.filter(id=message.id).update(
+                attempts=attempts,
+                last_error=error[:1000],
+                locked_at=None,
+                **work_queue.retry_fields(attempts, settings.NOTIFICATION_MAX_ATTEMPTS, now, **BACKOFF)
+            )
+
+        if sent_ids:
+            OutboxMessage.objects.filter(id__in=sent_ids).update(
+                status='sent',
+                sent_at=now,
+                locked_at=None
+            )
+
+        return len(sent_ids), failed
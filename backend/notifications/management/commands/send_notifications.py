@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.dispatcher import Dispatcher, claim_batch
+
+
+class Command(BaseCommand):
+    help = 'Gửi các thông báo (email/SMS) đang chờ trong outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Số thông báo mỗi lô')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như worker')
+        parser.add_argument('--interval', type=float, default=5, help='Số giây chờ khi outbox trống (với --loop)')
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                messages = claim_batch(options['batch_size'])
+                if messages:
+                    sent, failed = dispatcher.dispatch(messages)
+                    total_sent += sent
+                    total_failed += failed
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã gửi {total_sent} thông báo, {total_failed} lỗi'
+        ))
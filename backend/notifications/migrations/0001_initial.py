@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=50, verbose_name='Loại sự kiện')),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('sms', 'SMS')], max_length=10, verbose_name='Kênh')),
+                ('recipient', models.CharField(max_length=255, verbose_name='Người nhận')),
+                ('subject', models.CharField(blank=True, max_length=255, verbose_name='Tiêu đề')),
+                ('body', models.TextField(verbose_name='Nội dung')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Dữ liệu sự kiện')),
+                ('status', models.CharField(choices=[('pending', 'Chờ gửi'), ('processing', 'Đang gửi'), ('sent', 'Đã gửi'), ('failed', 'Gửi thất bại')], default='pending', max_length=20, verbose_name='Trạng thái')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Số lần gửi')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Lần gửi tiếp theo')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm nhận xử lý')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày gửi')),
+            ],
+            options={
+                'verbose_name': 'Thông báo chờ gửi',
+                'verbose_name_plural': 'Thông báo chờ gửi',
+                'db_table': 'notification_outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='notificatio_status_7f28bd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    """
+    Model outbox thông báo (email/SMS)
+    
+    Được ghi trong cùng transaction với thay đổi đơn hàng, sau đó worker
+    `send_notifications` gửi bất đồng bộ, request của khách không phải chờ.
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Chờ gửi'),
+        ('processing', 'Đang gửi'),
+        ('sent', 'Đã gửi'),
+        ('failed', 'Gửi thất bại'),
+    ]
+    
+    event_type = models.CharField(max_length=50, verbose_name='Loại sự kiện')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, verbose_name='Kênh')
+    recipient = models.CharField(max_length=255, verbose_name='Người nhận')
+    subject = models.CharField(max_length=255, blank=True, verbose_name='Tiêu đề')
+    body = models.TextField(verbose_name='Nội dung')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Dữ liệu sự kiện')
+    
+    # Trạng thái gửi
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Trạng thái'
+    )
+    attempts = models.IntegerField(default=0, verbose_name='Số lần gửi')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Lần gửi tiếp theo')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Thời điểm nhận xử lý')
+    last_error = models.TextField(blank=True, verbose_name='Lỗi gần nhất')
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày gửi')
+    
+    class Meta:
+        db_table = 'notification_outbox'
+        verbose_name = 'Thông báo chờ gửi'
+        verbose_name_plural = 'Thông báo chờ gửi'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} -> {self.recipient} ({self.channel})"
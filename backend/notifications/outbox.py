@@ -0,0 +1,81 @@
+"""
+Ghi thông báo vào outbox
+
+Các hàm ở đây chỉ INSERT vào bảng outbox và phải được gọi bên trong
+transaction của thay đổi đơn hàng: nếu transaction rollback thì thông báo
+cũng không tồn tại, nếu commit thì worker chắc chắn sẽ gửi.
+"""
+from django.conf import settings
+
+from .models import OutboxMessage
+
+
+# Nội dung thông báo theo loại sự kiện: (tiêu đề email, nội dung)
+TEMPLATES = {
+    'order_created': (
+        'Xác nhận đặt hàng #{order_number}',
+        'Xin chào {full_name}, đơn hàng #{order_number} trị giá {total:,.0f}đ '
+        'đã được đặt thành công. Cảm ơn bạn đã mua sắm!'
+    ),
+    'payment_succeeded': (
+        'Thanh toán thành công đơn hàng #{order_number}',
+        'Xin chào {full_name}, chúng tôi đã nhận được thanh toán {total:,.0f}đ '
+        'cho đơn hàng #{order_number}.'
+    ),
+    'order_status_changed': (
+        'Cập nhật đơn hàng #{order_number}',
+        'Xin chào {full_name}, đơn hàng #{order_number} đã chuyển sang trạng thái: {status_display}.'
+    ),
+}
+
+
+def order_messages(event_type, order_number, full_name, email, phone, **context):
+    """
+    Tạo các OutboxMessage (chưa lưu) cho một sự kiện đơn hàng
+
+    Mỗi kênh được bật trong NOTIFICATION_CHANNELS tạo một message
+    nếu đơn hàng có thông tin người nhận tương ứng.
+    """
+    subject_template, body_template = TEMPLATES[event_type]
+    values = dict(context, order_number=order_number, full_name=full_name)
+    subject = subject_template.format(**values)
+    body = body_template.format(**values)
+    payload = {
+        'order_number': order_number,
+        **{key: value for key, value in context.items() if isinstance(value, (str, int, float, bool))}
+    }
+
+    recipients = {'email': email, 'sms': phone}
+    return [
+        OutboxMessage(
+            event_type=event_type,
+            channel=channel,
+            recipient=recipients[channel],
+            subject=subject,
+            body=body,
+            payload=payload
+        )
+        for channel in settings.NOTIFICATION_CHANNELS
+        if recipients.get(channel)
+    ]
+
+
+def enqueue(messages):
+    """Ghi nhiều message vào outbox bằng một câu INSERT"""
+    if messages:
+        OutboxMessage.objects.bulk_create(messages)
+
+
+def enqueue_order_event(event_type, order, **context):
+    """Ghi thông báo cho một sự kiện của đơn hàng"""
+    enqueue(order_messages(
+        event_type,
+        order_number=order.order_number,
+        full_name=order.full_name,
+        email=order.email,
+        phone=order.phone,
+        total=float(order.total),
+        status=order.status,
+        status_display=order.get_status_display(),
+        **context
+    ))
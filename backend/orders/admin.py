@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from django.db import transaction
+from django.utils import timezone
+from .models import Order, OrderItem, OrderStatusHistory, ArchivedOrder, ArchivedOrderItem, ShippingRule, PaymentEvent, PaymentAttempt, Refund, DailySalesRollup, DailyProductSales
+from . import refunds, rollups
 
 
 class OrderItemInline(admin.TabularInline):
@@ -13,6 +16,18 @@ class OrderItemInline(admin.TabularInline):
         return False
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    """Inline cho lịch sử trạng thái trong Order admin"""
+    model = OrderStatusHistory
+    fk_name = 'order'
+    extra = 0
+    readonly_fields = ['from_status', 'status', 'changed_by', 'source', 'note', 'changed_at']
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Admin cho Order"""
@@ -24,10 +39,10 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_method', 'payment_status', 'created_at']
     search_fields = ['order_number', 'full_name', 'phone', 'email']
     readonly_fields = [
-        'order_number', 'user', 'subtotal', 'shipping_fee', 'total',
+        'order_number', 'user', 'subtotal', 'shipping_fee', 'discount', 'total', 'refunded_amount',
         'created_at', 'updated_at', 'confirmed_at', 'delivered_at'
     ]
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
     
     fieldsets = (
         ('Thông tin đơn hàng', {
@@ -37,7 +52,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('full_name', 'phone', 'email', 'address', 'district', 'city', 'note')
         }),
         ('Thông tin thanh toán', {
-            'fields': ('payment_method', 'payment_status', 'subtotal', 'shipping_fee', 'total')
+            'fields': ('payment_method', 'payment_status', 'subtotal', 'shipping_fee', 'discount', 'total', 'refunded_amount')
         }),
         ('Thời gian', {
             'fields': ('confirmed_at', 'delivered_at')
@@ -46,6 +61,21 @@ class OrderAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False
+    
+    def save_model(self, request, obj, form, change):
+        # Đổi trạng thái / thanh toán trong admin: cập nhật bảng tổng hợp doanh số
+        with rollups.tracking([obj.pk]):
+            super().save_model(request, obj, form, change)
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            rollups.record_deleted([obj.pk])
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            rollups.record_deleted(list(queryset.values_list('id', flat=True)))
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(OrderItem)
@@ -61,3 +91,175 @@ class OrderItemAdmin(admin.ModelAdmin):
     
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    """Inline cho ArchivedOrderItem trong ArchivedOrder admin"""
+    model = ArchivedOrderItem
+    extra = 0
+    readonly_fields = ['product', 'product_name', 'product_price', 'quantity', 'subtotal']
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Admin cho đơn hàng đã lưu trữ (chỉ xem)"""
+    list_display = [
+        'order_number', 'user', 'full_name', 'phone',
+        'total', 'status', 'payment_method', 'payment_status',
+        'created_at', 'archived_at'
+    ]
+    list_filter = ['status', 'payment_method', 'payment_status']
+    search_fields = ['order_number', 'full_name', 'phone', 'email']
+    inlines = [ArchivedOrderItemInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ShippingRule)
+class ShippingRuleAdmin(admin.ModelAdmin):
+    """Admin cho quy tắc phí vận chuyển"""
+    list_display = [
+        'name', 'city', 'district', 'min_subtotal', 'base_fee',
+        'per_kg_fee', 'valid_from', 'valid_to', 'priority', 'is_active'
+    ]
+    list_filter = ['is_active', 'city']
+    search_fields = ['name', 'city', 'district']
+    list_editable = ['is_active']
+    
+    fieldsets = (
+        ('Khu vực', {
+            'fields': ('name', 'city', 'district')
+        }),
+        ('Phí vận chuyển', {
+            'fields': ('min_subtotal', 'base_fee', 'included_weight_kg', 'per_kg_fee')
+        }),
+        ('Thời hạn và ưu tiên', {
+            'fields': ('valid_from', 'valid_to', 'priority', 'is_active')
+        }),
+    )
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    """
+    Admin cho inbox sự kiện thanh toán (chỉ xem)
+    
+    Sự kiện thất bại chặn các sự kiện đến sau của cùng đơn hàng cho tới khi
+    được xử lý lại hoặc bỏ qua.
+    """
+    list_display = [
+        'gateway', 'transaction_id', 'order_number', 'is_success',
+        'amount', 'status', 'attempts', 'received_at', 'processed_at'
+    ]
+    list_filter = ['gateway', 'status', 'is_success']
+    search_fields = ['order_number', 'transaction_id']
+    readonly_fields = [field.name for field in PaymentEvent._meta.fields]
+    actions = ['retry_events', 'ignore_events']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Xử lý lại các sự kiện thất bại đã chọn')
+    def retry_events(self, request, queryset):
+        updated = queryset.filter(status='failed').update(
+            status='pending',
+            attempts=0,
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'Đã đưa {updated} sự kiện vào hàng đợi xử lý lại')
+    
+    @admin.action(description='Bỏ qua các sự kiện thất bại đã chọn')
+    def ignore_events(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='ignored', processed_at=timezone.now())
+        self.message_user(request, f'Đã bỏ qua {updated} sự kiện')
+
+
+@admin.register(PaymentAttempt)
+class PaymentAttemptAdmin(admin.ModelAdmin):
+    """Admin cho các lần tạo thanh toán online (chỉ xem)"""
+    list_display = ['order', 'gateway', 'reference', 'amount', 'status', 'expires_at', 'created_at']
+    list_filter = ['gateway', 'status']
+    search_fields = ['order__order_number', 'reference']
+    raw_id_fields = ['order']
+    readonly_fields = [field.name for field in PaymentAttempt._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Refund)
+class RefundAdmin(admin.ModelAdmin):
+    """
+    Admin cho yêu cầu hoàn tiền (chỉ xem, tạo qua API / khi hủy đơn)
+    
+    Yêu cầu 'Cần kiểm tra' (không rõ cổng đã hoàn tiền chưa) không được gửi
+    lại tự động: kiểm tra trên trang quản trị của cổng rồi xác nhận hoặc gửi lại.
+    """
+    list_display = [
+        'reference', 'order_number', 'gateway', 'amount', 'refund_type',
+        'reason', 'status', 'attempts', 'created_at', 'processed_at'
+    ]
+    list_filter = ['gateway', 'status', 'refund_type', 'reason']
+    search_fields = ['order_number', 'reference', 'gateway_refund_id']
+    raw_id_fields = ['order']
+    readonly_fields = [field.name for field in Refund._meta.fields]
+    actions = ['confirm_refunds', 'requeue_refunds']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Xác nhận cổng đã hoàn tiền (yêu cầu cần kiểm tra)')
+    def confirm_refunds(self, request, queryset):
+        confirmed = refunds.confirm_refunds(
+            list(queryset.values_list('id', flat=True)),
+            note=f'Xác nhận bởi {request.user}'
+        )
+        self.message_user(request, f'Đã xác nhận {confirmed} yêu cầu hoàn tiền')
+    
+    @admin.action(description='Gửi lại yêu cầu hoàn tiền (cổng chưa hoàn tiền)')
+    def requeue_refunds(self, request, queryset):
+        updated = refunds.requeue_refunds(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f'Đã đưa {updated} yêu cầu hoàn tiền vào hàng đợi gửi lại')
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    """Admin cho bảng tổng hợp doanh số theo ngày (chỉ xem, tính lại bằng rebuild_sales_rollup)"""
+    list_display = ['date', 'status', 'payment_method', 'payment_status', 'slot', 'order_count', 'revenue', 'item_count']
+    list_filter = ['status', 'payment_method', 'payment_status']
+    date_hierarchy = 'date'
+    readonly_fields = [field.name for field in DailySalesRollup._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    """Admin cho doanh số sản phẩm theo ngày (chỉ xem, tính lại bằng rebuild_sales_rollup)"""
+    list_display = ['date', 'product', 'units', 'revenue', 'order_count']
+    list_filter = ['product__category']
+    search_fields = ['product__name']
+    date_hierarchy = 'date'
+    raw_id_fields = ['product']
+    readonly_fields = [field.name for field in DailyProductSales._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
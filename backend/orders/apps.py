@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        # Làm mới bảng quy tắc phí vận chuyển khi quy tắc thay đổi
+        from . import signals  # noqa: F401
@@ -0,0 +1,211 @@
+"""
+Lưu trữ đơn hàng cũ sang bảng lạnh (orders_archive, order_items_archive)
+
+Đơn hàng đã kết thúc (delivered/cancelled/returned) và cũ hơn mốc cấu hình
+được sao chép nguyên trạng (giữ nguyên id) sang bảng lưu trữ theo từng lô,
+sau đó xóa khỏi bảng chính để bảng chính luôn nhỏ.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from . import refunds
+
+
+ARCHIVABLE_STATUSES = ['delivered', 'cancelled', 'returned']
+
+# Cache mốc created_at lớn nhất trong bảng lưu trữ
+ARCHIVED_UNTIL_CACHE_KEY = 'orders:archived_until'
+ARCHIVED_UNTIL_CACHE_TIMEOUT = 3600
+
+ORDER_FIELDS = [
+    field.attname for field in ArchivedOrder._meta.concrete_fields
+    if field.name != 'archived_at'
+]
+ORDER_ITEM_FIELDS = [field.attname for field in ArchivedOrderItem._meta.concrete_fields]
+
+
+def archive_cutoff(days=None):
+    """Mốc thời gian: đơn hàng tạo trước mốc này sẽ được lưu trữ"""
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_batch(cutoff, batch_size=1000):
+    """
+    Lưu trữ một lô đơn hàng
+
+    Returns:
+        Số đơn hàng đã lưu trữ trong lô (0 nếu không còn đơn nào)
+    """
+    from reviews.models import Review
+
+    now = timezone.now()
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update().filter(
+                status__in=ARCHIVABLE_STATUSES,
+                created_at__lt=cutoff
+            ).exclude(
+                # Chờ hoàn tiền xong mới lưu trữ
+                refunds__status__in=refunds.OPEN_STATUSES
+            ).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(archived_at=now, **values)
+            for values in Order.objects.filter(id__in=order_ids).values(*ORDER_FIELDS)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**values)
+            for values in OrderItem.objects.filter(order_id__in=order_ids).values(*ORDER_ITEM_FIELDS)
+        ])
+
+        # Đánh giá vẫn được giữ, chỉ bỏ liên kết tới đơn hàng trong bảng chính
+        Review.objects.filter(order_id__in=order_ids).update(order=None)
+
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+
+    return len(order_ids)
+
+
+def archive_orders(days=None, batch_size=1000, max_batches=None):
+    """
+    Lưu trữ tất cả đơn hàng đủ điều kiện theo từng lô (mỗi lô một transaction)
+
+    Returns:
+        Tổng số đơn hàng đã lưu trữ
+    """
+    cutoff = archive_cutoff(days)
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        archived = archive_batch(cutoff, batch_size)
+        if not archived:
+            break
+        total += archived
+        batches += 1
+
+    cache.delete(ARCHIVED_UNTIL_CACHE_KEY)
+    return total
+
+
+def archived_until():
+    """Thời điểm tạo của đơn hàng mới nhất trong bảng lưu trữ (None nếu trống)"""
+    value = cache.get(ARCHIVED_UNTIL_CACHE_KEY)
+    if value is None:
+        value = ArchivedOrder.objects.aggregate(latest=Max('created_at'))['latest'] or ''
+        cache.set(ARCHIVED_UNTIL_CACHE_KEY, value, ARCHIVED_UNTIL_CACHE_TIMEOUT)
+    return value or None
+
+
+def touches_archive(start_date):
+    """Khoảng thời gian bắt đầu từ start_date có chạm tới dữ liệu đã lưu trữ không"""
+    if start_date is None or start_date < archive_cutoff():
+        return True
+    # Trường hợp job được chạy với mốc ngắn hơn cấu hình
+    latest = archived_until()
+    return latest is not None and start_date <= latest
+
+
+def order_sources(start_date=None):
+    """
+    Các cặp (model đơn hàng, model chi tiết) cần đọc cho một khoảng thời gian
+
+    Bảng lưu trữ chỉ được đọc khi khoảng thời gian chạm tới dữ liệu đã lưu trữ.
+    """
+    sources = [(Order, OrderItem)]
+    if touches_archive(start_date):
+        sources.append((ArchivedOrder, ArchivedOrderItem))
+    return sources
+
+
+def get_by_order_number(order_number):
+    """Tìm đơn hàng theo mã, tự động tìm trong bảng lưu trữ nếu không có ở bảng chính"""
+    order = Order.objects.filter(order_number=order_number).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(order_number=order_number).first()
+    return order
+
+
+class CombinedOrderList:
+    """
+    Danh sách đơn hàng ghép từ nhiều queryset (bảng chính rồi bảng lưu trữ)
+
+    Hỗ trợ count() và slicing để dùng trực tiếp với paginator của DRF,
+    mỗi trang chỉ truy vấn đúng phần dữ liệu cần thiết.
+    """
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def _get_counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self._get_counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            yield from queryset
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        result = []
+        for queryset, count in zip(self.querysets, self._get_counts()):
+            if stop <= 0:
+                break
+            if start < count:
+                result.extend(queryset[start:min(stop, count)])
+            start = max(start - count, 0)
+            stop -= count
+        return result
+
+
+def merge_grouped(rows, keys, sums, order_by=None, descending=True, limit=None):
+    """
+    Gộp kết quả GROUP BY của cùng một truy vấn trên nhiều bảng
+
+    Args:
+        rows: Các dict kết quả (từ tất cả các bảng)
+        keys: Các field dùng làm khóa nhóm
+        sums: Các field cần cộng dồn
+        order_by: Field dùng để sắp xếp kết quả (tùy chọn)
+        descending: Sắp xếp giảm dần
+        limit: Giới hạn số dòng trả về
+    """
+    merged = {}
+    for row in rows:
+        key = tuple(row[field] for field in keys)
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        for field in sums:
+            merged[key][field] = (merged[key][field] or 0) + (row[field] or 0)
+
+    result = list(merged.values())
+    if order_by:
+        result.sort(key=lambda row: row[order_by] or 0, reverse=descending)
+    if limit is not None:
+        result = result[:limit]
+    return result
@@ -0,0 +1,361 @@
+"""
+Đối soát chuyển khoản ngân hàng từ file sao kê
+
+Đơn hàng payment_method='banking' được xác nhận thanh toán từ file sao kê
+(CSV xuất từ internet banking hoặc MT940):
+
+- iter_csv / iter_mt940: đọc file theo dòng (generator), chỉ lấy giao dịch
+  ghi có, không nạp cả file vào bộ nhớ.
+- extract_order_numbers: tìm mã đơn hàng trong nội dung chuyển khoản bằng
+  regex biên dịch sẵn (ngân hàng thường bỏ dấu / khoảng trắng, đổi chữ hoa).
+- match_lines: so khớp với index trong bộ nhớ của các đơn chuyển khoản còn
+  chờ thanh toán (dict theo mã đơn hàng và số tiền). Mỗi đơn chỉ được khớp
+  với đúng một giao dịch; giao dịch chứa nhiều mã đơn, nhiều giao dịch cho
+  cùng một đơn được báo cáo là không rõ ràng.
+- apply_matches: ghi các đơn khớp duy nhất theo lô (một câu UPDATE có điều
+  kiện mỗi lô), xác nhận đơn hàng bằng state_machine.bulk_transition.
+"""
+import csv
+import re
+from collections import Counter, defaultdict, namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+
+from notifications import outbox
+from .models import Order
+from . import payments, refunds, rollups, state_machine, tracking
+
+
+# Mã đơn hàng: ORD + 14 chữ số thời gian + 6 chữ số ngẫu nhiên (xem Order.save);
+# đơn tạo trước khi thêm phần ngẫu nhiên chỉ có ORD + 14 chữ số
+ORDER_NUMBER_PATTERN = re.compile(r'ORD[\s._-]?(\d{14}(?:\d{6})?)(?!\d)', re.IGNORECASE)
+
+# :61:YYMMDD[MMDD](C|D|RC|RD)[ký tự loại tiền]số tiền(dấu phẩy thập phân)...[//mã GD ngân hàng]
+MT940_ENTRY_PATTERN = re.compile(
+    r'^:61:(?P<date>\d{6})(?:\d{4})?(?P<mark>R?[CD])[A-Z]?(?P<amount>\d+(?:,\d*)?)'
+    r'(?P<rest>.*?)(?://(?P<reference>.*))?$'
+)
+MT940_TAG_PATTERN = re.compile(r'^:\d{2}[A-Z]?:')
+
+# Tên cột thường gặp trong file CSV sao kê (so sánh không phân biệt hoa thường)
+CSV_COLUMNS = {
+    'date': ['ngày giao dịch', 'ngay giao dich', 'transaction date', 'date', 'ngày'],
+    'amount': ['số tiền ghi có', 'so tien ghi co', 'ghi có', 'credit', 'credit amount', 'số tiền', 'amount'],
+    'memo': ['nội dung', 'noi dung', 'diễn giải', 'mô tả', 'description', 'memo', 'remark'],
+    'reference': ['mã giao dịch', 'ma giao dich', 'số tham chiếu', 'reference', 'transaction id', 'ref'],
+}
+
+StatementLine = namedtuple('StatementLine', ['line_no', 'date', 'amount', 'memo', 'reference'])
+
+# result: 'matched' | 'ambiguous' | 'amount_mismatch' | 'unmatched' | 'no_code'
+LineMatch = namedtuple('LineMatch', ['line', 'result', 'order_numbers', 'order_id', 'detail'])
+
+
+class StatementError(Exception):
+    """File sao kê không đọc được"""
+
+
+def parse_amount(text):
+    """
+    Đọc số tiền theo định dạng ngân hàng Việt Nam (1.250.000 / 1,250,000 /
+    1250000,00); trả về None nếu không phải số
+    """
+    text = re.sub(r'[^\d.,\-]', '', str(text or ''))
+    if not text or text == '-':
+        return None
+
+    if '.' in text and ',' in text:
+        # Dấu xuất hiện sau cùng là dấu thập phân
+        decimal_sep = '.' if text.rfind('.') > text.rfind(',') else ','
+        thousands_sep = ',' if decimal_sep == '.' else '.'
+        text = text.replace(thousands_sep, '').replace(decimal_sep, '.')
+    else:
+        for sep in '.,':
+            if sep in text:
+                head, _, tail = text.rpartition(sep)
+                # Một dấu, sau đó không đúng 3 chữ số: dấu thập phân
+                if text.count(sep) == 1 and len(tail) != 3:
+                    text = f"{head}.{tail}"
+                else:
+                    text = text.replace(sep, '')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def _csv_fieldmap(header):
+    normalized = {name.strip().lower(): name for name in header if name}
+    fieldmap = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                fieldmap[field] = normalized[alias]
+                break
+    if 'amount' not in fieldmap or 'memo' not in fieldmap:
+        raise StatementError('File CSV cần có cột số tiền (ghi có) và nội dung chuyển khoản')
+    return fieldmap
+
+
+def iter_csv(stream, delimiter=None):
+    """Đọc giao dịch ghi có từ file CSV (stream dạng text)"""
+    first_line = stream.readline()
+    if delimiter is None:
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    header = next(csv.reader([first_line], delimiter=delimiter), [])
+    fieldmap = _csv_fieldmap(header)
+
+    reader = csv.DictReader(stream, fieldnames=header, delimiter=delimiter)
+    for line_no, row in enumerate(reader, start=2):
+        amount = parse_amount(row.get(fieldmap['amount']))
+        if amount is None or amount <= 0:
+            continue
+        yield StatementLine(
+            line_no=line_no,
+            date=(row.get(fieldmap['date']) or '').strip() if 'date' in fieldmap else '',
+            amount=amount,
+            memo=(row.get(fieldmap['memo']) or '').strip(),
+            reference=(row.get(fieldmap['reference']) or '').strip() if 'reference' in fieldmap else ''
+        )
+
+
+def iter_mt940(stream):
+    """Đọc giao dịch ghi có (:61: mark C) kèm nội dung (:86:) từ file MT940"""
+    entry = None
+    memo = None
+
+    def flush():
+        if entry is not None and entry['mark'] == 'C':
+            return StatementLine(
+                line_no=entry['line_no'],
+                date=entry['date'],
+                amount=entry['amount'],
+                memo=' '.join(memo or []),
+                reference=entry['reference']
+            )
+        return None
+
+    for line_no, raw in enumerate(stream, start=1):
+        line = raw.rstrip('\r\n')
+        if line.startswith(':61:'):
+            item = flush()
+            if item:
+                yield item
+            match = MT940_ENTRY_PATTERN.match(line)
+            entry = None
+            memo = None
+            if match:
+                entry = {
+                    'line_no': line_no,
+                    'date': match.group('date'),
+                    'mark': match.group('mark'),
+                    'amount': Decimal(match.group('amount').replace(',', '.').rstrip('.') or '0'),
+                    'reference': (match.group('reference') or '').strip()
+                }
+        elif line.startswith(':86:'):
+            memo = [line[4:].strip()]
+        elif MT940_TAG_PATTERN.match(line) or line.startswith('-}'):
+            item = flush()
+            if item:
+                yield item
+            entry = None
+            memo = None
+        elif memo is not None:
+            # Dòng tiếp theo của :86:
+            memo.append(line.strip())
+
+    item = flush()
+    if item:
+        yield item
+
+
+def iter_statement(stream, file_format):
+    """file_format: 'csv' hoặc 'mt940'"""
+    if file_format == 'mt940':
+        return iter_mt940(stream)
+    if file_format == 'csv':
+        return iter_csv(stream)
+    raise StatementError(f'Định dạng sao kê không được hỗ trợ: {file_format}')
+
+
+def detect_format(filename):
+    return 'mt940' if filename.lower().endswith(('.sta', '.mt940', '.940')) else 'csv'
+
+
+def extract_order_numbers(memo):
+    """Các mã đơn hàng (không trùng, giữ thứ tự) trong nội dung chuyển khoản"""
+    return list(dict.fromkeys(f"ORD{digits}" for digits in ORDER_NUMBER_PATTERN.findall(memo)))
+
+
+def pending_index():
+    """
+    Index các đơn chuyển khoản chờ thanh toán
+
+    Returns:
+        ({(order_number, total): order_id}, {order_number: total})
+    """
+    by_key = {}
+    totals = {}
+    rows = Order.objects.filter(
+        payment_method='banking',
+        payment_status__in=payments.PAYMENT_TRANSITIONS['paid']
+    ).exclude(
+        status__in=refunds.REFUND_STATUSES
+    ).values_list('id', 'order_number', 'total')
+    for order_id, order_number, total in rows.iterator(chunk_size=5000):
+        by_key[(order_number, total)] = order_id
+        totals[order_number] = total
+    return by_key, totals
+
+
+def match_lines(lines, index=None):
+    """
+    So khớp các giao dịch với đơn hàng chờ thanh toán
+
+    Returns:
+        list LineMatch theo thứ tự trong file
+    """
+    by_key, totals = index or pending_index()
+    results = []
+    claims = defaultdict(list)
+
+    for line in lines:
+        order_numbers = extract_order_numbers(line.memo)
+        if not order_numbers:
+            results.append(LineMatch(line, 'no_code', [], None, 'Không có mã đơn hàng'))
+            continue
+        if len(order_numbers) > 1:
+            results.append(LineMatch(line, 'ambiguous', order_numbers, None, 'Nhiều mã đơn hàng trong một giao dịch'))
+            continue
+
+        order_number = order_numbers[0]
+        order_id = by_key.get((order_number, line.amount))
+        if order_id is not None:
+            claims[order_id].append(len(results))
+            results.append(LineMatch(line, 'matched', order_numbers, order_id, ''))
+        elif order_number in totals:
+            results.append(LineMatch(
+                line, 'amount_mismatch', order_numbers, None,
+                f'Số tiền {line.amount} khác tổng đơn hàng {totals[order_number]}'
+            ))
+        else:
+            results.append(LineMatch(
+                line, 'unmatched', order_numbers, None,
+                'Không có đơn chuyển khoản chờ thanh toán với mã này'
+            ))
+
+    # Nhiều giao dịch cho cùng một đơn: không tự xác nhận, để kế toán kiểm tra
+    for order_id, positions in claims.items():
+        if len(positions) > 1:
+            for position in positions:
+                match = results[position]
+                results[position] = match._replace(
+                    result='ambiguous',
+                    order_id=None,
+                    detail=f'{len(positions)} giao dịch cho cùng một đơn hàng'
+                )
+    return results
+
+
+def apply_matches(matches, source='bank_statement', changed_by=None, batch_size=1000):
+    """
+    Ghi nhận thanh toán cho các giao dịch khớp duy nhất
+
+    Mỗi lô: khóa các đơn còn chờ thanh toán, một câu UPDATE ghi payment_status
+    và mã giao dịch ngân hàng, rồi bulk_transition sang 'confirmed'.
+
+    Returns:
+        Số đơn hàng đã ghi nhận thanh toán
+    """
+    matched = [match for match in matches if match.result == 'matched']
+    applied = 0
+    for start in range(0, len(matched), batch_size):
+        batch = {match.order_id: match.line for match in matched[start:start + batch_size]}
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                Order.objects.select_for_update().filter(
+                    id__in=list(batch),
+                    payment_method='banking',
+                    payment_status__in=payments.PAYMENT_TRANSITIONS['paid']
+                ).exclude(
+                    status__in=refunds.REFUND_STATUSES
+                ).order_by('id').values_list('id', 'order_number', 'status', 'full_name', 'email', 'phone', 'total')
+            )
+            if not rows:
+                continue
+            order_ids = [row[0] for row in rows]
+
+            with rollups.tracking(order_ids):
+                Order.objects.filter(id__in=order_ids).update(
+                    payment_status='paid',
+                    payment_version=F('payment_version') + 1,
+                    transaction_id=Case(
+                        *[When(id=order_id, then=Value(batch[order_id].reference[:100])) for order_id in order_ids],
+                        output_field=CharField()
+                    ),
+                    updated_at=now
+                )
+
+            confirm_ids = [row[0] for row in rows if state_machine.can_transition(row[2], 'confirmed')]
+            if confirm_ids:
+                state_machine.bulk_transition(
+                    confirm_ids,
+                    'confirmed',
+                    changed_by=changed_by,
+                    source=source,
+                    note='Đã nhận chuyển khoản',
+                    notify=False
+                )
+            # bulk_transition đã làm mới tracking cho các đơn được xác nhận
+            confirmed = set(confirm_ids)
+            tracking.refresh_on_commit([order_id for order_id in order_ids if order_id not in confirmed])
+
+            messages = []
+            for order_id, order_number, status, full_name, email, phone, total in rows:
+                messages.extend(outbox.order_messages(
+                    'payment_succeeded',
+                    order_number=order_number,
+                    full_name=full_name,
+                    email=email,
+                    phone=phone,
+                    total=float(total)
+                ))
+            outbox.enqueue(messages)
+        applied += len(order_ids)
+    return applied
+
+
+def reconcile(stream, file_format, dry_run=False, changed_by=None):
+    """
+    Đọc file sao kê, so khớp và ghi nhận thanh toán
+
+    Returns:
+        (list LineMatch, Counter thống kê)
+    """
+    matches = match_lines(iter_statement(stream, file_format))
+    stats = Counter(match.result for match in matches)
+    stats['lines'] = len(matches)
+    if not dry_run:
+        stats['applied'] = apply_matches(matches, changed_by=changed_by)
+    return matches, stats
+
+
+def issue_rows(matches):
+    """Các giao dịch không được ghi nhận tự động (để kế toán kiểm tra)"""
+    for match in matches:
+        if match.result == 'matched':
+            continue
+        yield {
+            'line_no': match.line.line_no,
+            'date': match.line.date,
+            'amount': str(match.line.amount),
+            'reference': match.line.reference,
+            'memo': match.line.memo,
+            'result': match.result,
+            'order_numbers': ' '.join(match.order_numbers),
+            'detail': match.detail,
+        }
@@ -0,0 +1,295 @@
+"""
+Benchmark đặt hàng đồng thời
+
+Tạo dữ liệu riêng cho mỗi lần chạy (danh mục, sản phẩm, user), bắn N lượt
+đặt hàng song song bằng thread qua OrderCreateSerializer (hoặc qua API
+POST /api/orders/), sau đó báo cáo throughput, độ trễ p50/p95/p99, số lần
+deadlock / thử lại và kiểm tra tồn kho cuối cùng có khớp với số lượng đã bán.
+
+Chỉ chạy trên database thử nghiệm (MySQL local hoặc SQLite).
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction, OperationalError
+from django.db.models import Sum
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from categories.models import Category
+from products.models import Product
+from .models import Order, OrderItem, OrderStatusHistory
+from .serializers import OrderCreateSerializer
+from . import rollups
+
+
+# Mã lỗi MySQL: 1213 deadlock, 1205 lock wait timeout
+DEADLOCK_CODES = {1213}
+LOCK_TIMEOUT_CODES = {1205}
+
+
+@dataclass
+class BenchmarkConfig:
+    orders: int = 200
+    concurrency: int = 8
+    products: int = 50
+    hot_products: int = 5
+    hot_ratio: float = 0.5
+    min_cart_size: int = 1
+    max_cart_size: int = 5
+    max_quantity: int = 3
+    stock: int = 100000
+    mode: str = 'serializer'
+    max_retries: int = 3
+    seed: int = None
+
+
+@dataclass
+class BenchmarkResult:
+    latencies: list = field(default_factory=list)
+    succeeded: int = 0
+    rejected: int = 0
+    errors: dict = field(default_factory=dict)
+    deadlocks: int = 0
+    lock_timeouts: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    stock_mismatches: list = field(default_factory=list)
+
+
+def percentile(values, percent):
+    """Percentile theo nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _classify_operational_error(error):
+    """Trả về 'deadlock', 'lock_timeout' hoặc None"""
+    code = error.args[0] if error.args and isinstance(error.args[0], int) else None
+    message = str(error).lower()
+    if code in DEADLOCK_CODES or 'deadlock' in message:
+        return 'deadlock'
+    if code in LOCK_TIMEOUT_CODES or 'database is locked' in message or 'lock wait timeout' in message:
+        return 'lock_timeout'
+    return None
+
+
+class CheckoutBenchmark:
+    """Một lần chạy benchmark (dữ liệu được gắn nhãn theo run_id)"""
+
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.result = BenchmarkResult()
+        self._lock = threading.Lock()
+        self.category = None
+        self.products = []
+        self.user = None
+
+    # Dữ liệu -----------------------------------------------------------
+
+    def seed(self):
+        """Tạo danh mục, sản phẩm và user cho lần chạy"""
+        self.category = Category.objects.create(name=f'Benchmark {self.run_id}')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark {self.run_id} #{index}',
+                slug=f'benchmark-{self.run_id}-{index}',
+                category=self.category,
+                price=10000 * (index % 20 + 1),
+                stock=self.config.stock,
+                weight='500g'
+            )
+            for index in range(self.config.products)
+        ])
+        self.products = list(Product.objects.filter(category=self.category).order_by('id'))
+        self.user = get_user_model().objects.create_user(
+            username=f'benchmark_{self.run_id}',
+            email=f'benchmark_{self.run_id}@example.com',
+            password=uuid.uuid4().hex
+        )
+
+    def cleanup(self):
+        """Xóa dữ liệu của lần chạy"""
+        order_ids = list(Order.objects.filter(user=self.user).values_list('id', flat=True))
+        with transaction.atomic():
+            rollups.record_deleted(order_ids)
+            OrderStatusHistory.objects.filter(order_id__in=order_ids).delete()
+            OrderItem.objects.filter(order_id__in=order_ids).delete()
+            Order.objects.filter(id__in=order_ids).delete()
+        Product.objects.filter(category=self.category).delete()
+        self.category.delete()
+        self.user.delete()
+
+    def make_carts(self):
+        """Sinh giỏ hàng: mỗi dòng lấy từ nhóm sản phẩm "nóng" với xác suất hot_ratio"""
+        config = self.config
+        hot = self.products[:config.hot_products]
+        cold = self.products[config.hot_products:] or hot
+
+        carts = []
+        for _ in range(config.orders):
+            size = self.random.randint(config.min_cart_size, config.max_cart_size)
+            chosen = {}
+            while len(chosen) < min(size, len(self.products)):
+                pool = hot if hot and self.random.random() < config.hot_ratio else cold
+                product = self.random.choice(pool)
+                chosen[product.id] = self.random.randint(1, config.max_quantity)
+            carts.append([
+                {'product_id': product_id, 'quantity': quantity}
+                for product_id, quantity in chosen.items()
+            ])
+        return carts
+
+    # Đặt hàng ----------------------------------------------------------
+
+    def _payload(self, items):
+        return {
+            'full_name': 'Benchmark',
+            'phone': '0900000000',
+            'address': f'Benchmark {self.run_id}',
+            'city': 'Hà Nội',
+            'payment_method': 'cod',
+            'items': items
+        }
+
+    def _checkout_serializer(self, items):
+        django_request = APIRequestFactory().post('/api/orders/')
+        request = Request(django_request)
+        request.user = self.user
+        serializer = OrderCreateSerializer(data=self._payload(items), context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def _checkout_api(self, client, items):
+        response = client.post('/api/orders/', self._payload(items), format='json')
+        if response.status_code == 400:
+            raise serializers.ValidationError(response.data)
+        if response.status_code != 201:
+            raise RuntimeError(f'HTTP {response.status_code}')
+
+    def _record(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                if name == 'latency':
+                    self.result.latencies.append(value)
+                elif name == 'error':
+                    self.result.errors[value] = self.result.errors.get(value, 0) + 1
+                else:
+                    setattr(self.result, name, getattr(self.result, name) + value)
+
+    def _worker(self, carts):
+        client = None
+        if self.config.mode == 'api':
+            client = APIClient()
+            client.force_authenticate(self.user)
+
+        try:
+            for items in carts:
+                started = time.perf_counter()
+                attempt = 0
+                while True:
+                    try:
+                        if client is not None:
+                            self._checkout_api(client, items)
+                        else:
+                            self._checkout_serializer(items)
+                        self._record(succeeded=1)
+                        break
+                    except serializers.ValidationError:
+                        self._record(rejected=1)
+                        break
+                    except OperationalError as e:
+                        kind = _classify_operational_error(e)
+                        if kind == 'deadlock':
+                            self._record(deadlocks=1)
+                        elif kind == 'lock_timeout':
+                            self._record(lock_timeouts=1)
+
+                        if kind is None or attempt >= self.config.max_retries:
+                            self._record(error=e.__class__.__name__)
+                            break
+                        attempt += 1
+                        self._record(retries=1)
+                        time.sleep(random.uniform(0.005, 0.02) * attempt)
+                    except Exception as e:
+                        self._record(error=e.__class__.__name__)
+                        break
+                self._record(latency=time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def run(self):
+        """Chạy benchmark (đã seed dữ liệu)"""
+        carts = self.make_carts()
+        concurrency = max(self.config.concurrency, 1)
+        chunks = [carts[index::concurrency] for index in range(concurrency)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(self._worker, chunks))
+        self.result.elapsed = time.perf_counter() - started
+
+        self.check_stock()
+        return self.result
+
+    def check_stock(self):
+        """Tồn kho + đã bán phải khớp với số lượng trong các đơn hàng đã tạo"""
+        sold = dict(
+            OrderItem.objects.filter(
+                product__category=self.category
+            ).values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+        )
+        for product in Product.objects.filter(category=self.category):
+            quantity = sold.get(product.id, 0)
+            if (
+                product.stock != self.config.stock - quantity or
+                product.sold_count != quantity or
+                product.stock < 0
+            ):
+                self.result.stock_mismatches.append({
+                    'product_id': product.id,
+                    'stock': product.stock,
+                    'sold_count': product.sold_count,
+                    'ordered': quantity
+                })
+
+    # Báo cáo -----------------------------------------------------------
+
+    def summary(self):
+        result = self.result
+        latencies = result.latencies
+        return {
+            'run_id': self.run_id,
+            'database': connection.vendor,
+            'mode': self.config.mode,
+            'orders': self.config.orders,
+            'concurrency': self.config.concurrency,
+            'succeeded': result.succeeded,
+            'rejected': result.rejected,
+            'errors': result.errors,
+            'elapsed_seconds': round(result.elapsed, 3),
+            'throughput_per_second': round(result.succeeded / result.elapsed, 2) if result.elapsed else 0,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 2),
+                'p95': round(percentile(latencies, 95) * 1000, 2),
+                'p99': round(percentile(latencies, 99) * 1000, 2),
+                'max': round(max(latencies, default=0) * 1000, 2),
+            },
+            'deadlocks': result.deadlocks,
+            'lock_timeouts': result.lock_timeouts,
+            'retries': result.retries,
+            'stock_consistent': not result.stock_mismatches,
+            'stock_mismatches': result.stock_mismatches[:20],
+        }
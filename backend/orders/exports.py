@@ -0,0 +1,274 @@
+"""
+Streaming export đơn hàng và chi tiết đơn hàng (CSV/XLSX)
+
+Dữ liệu được đọc theo từng lô bằng keyset pagination trên khóa chính
+(`values_list()` + `id < last_id`), nên bộ nhớ sử dụng không phụ thuộc
+vào số lượng đơn hàng. Không dùng OFFSET và không giữ toàn bộ kết quả
+(mysqlclient buffer toàn bộ result set phía client kể cả khi dùng iterator()).
+
+XLSX cũng được stream: file zip được ghi tuần tự (không seek, zipfile dùng
+data descriptor) và phần đã nén được gửi đi sau mỗi lô dòng, nên response
+bắt đầu ngay và không có file tạm.
+
+Chống chèn công thức (CSV injection): chuỗi do khách nhập (tên, địa chỉ,
+ghi chú...) bắt đầu bằng =, +, -, @, tab hoặc CR được thêm dấu ' phía trước
+trong CSV; XLSX ghi mọi chuỗi dưới dạng inline string (không bao giờ là
+công thức).
+"""
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Order
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Ký tự đầu khiến Excel / LibreOffice hiểu ô CSV là công thức
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+PAYMENT_METHOD_LABELS = dict(Order.PAYMENT_METHOD_CHOICES)
+PAYMENT_STATUS_LABELS = dict(Order.PAYMENT_STATUS_CHOICES)
+
+ORDER_COLUMNS = [
+    ('order_number', 'Mã đơn hàng'),
+    ('created_at', 'Ngày tạo'),
+    ('full_name', 'Họ và tên'),
+    ('phone', 'Số điện thoại'),
+    ('email', 'Email'),
+    ('address', 'Địa chỉ'),
+    ('district', 'Quận/Huyện'),
+    ('city', 'Tỉnh/Thành phố'),
+    ('status', 'Trạng thái'),
+    ('payment_method', 'Phương thức thanh toán'),
+    ('payment_status', 'Trạng thái thanh toán'),
+    ('subtotal', 'Tạm tính'),
+    ('shipping_fee', 'Phí vận chuyển'),
+    ('discount', 'Giảm giá'),
+    ('total', 'Tổng tiền'),
+    ('transaction_id', 'Mã giao dịch'),
+]
+
+ITEM_COLUMNS = [
+    ('order__order_number', 'Mã đơn hàng'),
+    ('order__created_at', 'Ngày tạo'),
+    ('order__status', 'Trạng thái'),
+    ('product_id', 'ID sản phẩm'),
+    ('product_name', 'Tên sản phẩm'),
+    ('product_price', 'Đơn giá'),
+    ('quantity', 'Số lượng'),
+    ('subtotal', 'Thành tiền'),
+]
+
+# Chuyển giá trị thô sang dạng hiển thị cho kế toán
+VALUE_FORMATTERS = {
+    'status': STATUS_LABELS.get,
+    'order__status': STATUS_LABELS.get,
+    'payment_method': PAYMENT_METHOD_LABELS.get,
+    'payment_status': PAYMENT_STATUS_LABELS.get,
+}
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'tzinfo'):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _iter_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Đọc queryset theo lô bằng keyset pagination trên id (giảm dần)
+
+    Yields:
+        Tuple giá trị đã định dạng cho từng dòng
+    """
+    fields = [field for field, _ in columns]
+    formatters = [VALUE_FORMATTERS.get(field) for field in fields]
+    queryset = queryset.order_by('-id')
+    last_id = None
+
+    while True:
+        batch = queryset if last_id is None else queryset.filter(id__lt=last_id)
+        rows = list(batch.values_list('id', *fields)[:chunk_size])
+        if not rows:
+            return
+
+        for row in rows:
+            yield tuple(
+                _format_value(formatter(value, value) if formatter else value)
+                for formatter, value in zip(formatters, row[1:])
+            )
+
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+class _Echo:
+    """Pseudo-buffer cho csv.writer: trả về dòng thay vì ghi vào file"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    """Chuỗi có thể bị hiểu là công thức được thêm ' phía trước"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _stream_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    # BOM để Excel nhận đúng UTF-8 (tiếng Việt)
+    yield '﻿'
+    yield writer.writerow([label for _, label in columns])
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+# Các phần cố định của file XLSX (một sheet, chuỗi inline, không style)
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={title} sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Ký tự điều khiển không được phép trong XML
+XML_ILLEGAL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _ChunkBuffer:
+    """File chỉ ghi, không seek: gom dữ liệu zip đã nén để yield theo từng phần"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c t="n"><v>{value}</v></c>'
+    # Inline string: Excel hiển thị nguyên văn, không tính như công thức
+    text = escape(XML_ILLEGAL_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, values):
+    return f'<row r="{number}">{"".join(_xlsx_cell(value) for value in values)}</row>'
+
+
+def _stream_xlsx(rows, columns, title, chunk_size=EXPORT_CHUNK_SIZE):
+    """Ghi XLSX (zip) tuần tự, yield phần đã nén sau mỗi chunk_size dòng"""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(title=quoteattr(title[:31])))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode('utf-8'))
+            sheet.write(_xlsx_row(1, [label for _, label in columns]).encode('utf-8'))
+            for number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(number, row).encode('utf-8'))
+                if number % chunk_size == 0:
+                    yield buffer.pop()
+            sheet.write(XLSX_SHEET_END.encode('utf-8'))
+    yield buffer.pop()
+
+
+def export_response(queryset, columns, filename, file_format='csv', title='Export'):
+    """
+    Tạo response export cho queryset
+
+    Args:
+        queryset: Order hoặc OrderItem queryset đã lọc
+        columns: Danh sách (field, label)
+        filename: Tên file không kèm phần mở rộng
+        file_format: 'csv' hoặc 'xlsx'
+        title: Tên sheet (xlsx)
+    """
+    rows = _iter_rows(queryset, columns)
+
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(
+            _stream_xlsx(rows, columns, title),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+        return response
+
+    response = StreamingHttpResponse(
+        _stream_csv(rows, columns),
+        content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def export_orders(queryset, file_format='csv'):
+    """Export danh sách đơn hàng"""
+    filename = f"orders_{timezone.localdate().strftime('%Y%m%d')}"
+    return export_response(queryset, ORDER_COLUMNS, filename, file_format, title='Orders')
+
+
+def export_order_items(queryset, file_format='csv'):
+    """Export chi tiết đơn hàng"""
+    filename = f"order_items_{timezone.localdate().strftime('%Y%m%d')}"
+    return export_response(queryset, ITEM_COLUMNS, filename, file_format, title='Order items')
@@ -0,0 +1,302 @@
+"""
+HTTP client cho cổng thanh toán
+
+- Mỗi cổng thanh toán dùng một requests.Session chung cho cả process
+  (giữ kết nối keep-alive, giới hạn pool) thay vì mở kết nối mới mỗi request.
+- Timeout kết nối / đọc ngắn, cấu hình qua settings.
+- Thử lại với backoff + jitter khi không kết nối được (request chưa tới cổng)
+  hoặc khi cổng trả 502/503/504; lỗi sau khi đã gửi request (timeout khi
+  đọc, mất kết nối giữa chừng) chỉ thử lại nếu idempotent.
+- GatewayUnreachableError: request chắc chắn chưa tới cổng thanh toán (không
+  kết nối được, circuit breaker đang mở), gửi lại sau là an toàn. Các
+  GatewayError khác: cổng có thể đã xử lý request.
+- Circuit breaker: sau N lỗi liên tiếp, các request bị từ chối ngay trong
+  một khoảng thời gian thay vì giữ worker chờ cổng thanh toán đang lỗi.
+
+AsyncGatewayClient (httpx, tùy chọn) dùng cho triển khai ASGI.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - chỉ cần khi dùng AsyncGatewayClient
+    httpx = None
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+class GatewayError(Exception):
+    """Lỗi khi gọi cổng thanh toán"""
+
+
+class GatewayUnreachableError(GatewayError):
+    """Request chưa tới được cổng thanh toán (gửi lại không bị xử lý trùng)"""
+
+
+class CircuitOpenError(GatewayUnreachableError):
+    """Circuit breaker đang mở: cổng thanh toán tạm thời bị coi là không khả dụng"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker đơn giản (closed -> open -> half-open)
+
+    - closed: cho phép mọi request, đếm lỗi liên tiếp
+    - open: từ chối ngay cho tới khi hết reset_timeout
+    - half-open: cho một request thử; thành công thì đóng lại, lỗi thì mở tiếp
+
+    Request thử kết thúc mà không ghi nhận kết quả (bị hủy, lỗi không phải
+    của cổng thanh toán) phải gọi abort(); request thử kéo dài quá
+    reset_timeout cũng được coi là đã bỏ, để breaker không từ chối mãi.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, name=''):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_started = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Request có được phép gửi hay không"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            now = time.monotonic()
+            if state == 'half_open' and (not self._probing or now - self._probe_started >= self.reset_timeout):
+                self._probing = True
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            opened = self._probing or self._failures >= self.failure_threshold
+            if opened:
+                self._opened_at = time.monotonic()
+            self._probing = False
+        if opened:
+            logger.error('gateway.circuit_opened', extra={'gateway': self.name, 'failures': self._failures})
+
+    def abort(self):
+        """Request kết thúc mà không có kết quả: cho phép request thử tiếp theo"""
+        with self._lock:
+            self._probing = False
+
+
+def _backoff(attempt):
+    """Thời gian chờ trước lần thử lại (exponential backoff + full jitter)"""
+    return random.uniform(0, settings.GATEWAY_RETRY_BACKOFF * (2 ** attempt))
+
+
+def _is_unreachable(error):
+    """Không mở được kết nối (timeout khi kết nối, bị từ chối, lỗi DNS): request chưa được gửi"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _is_retryable(error, idempotent):
+    if _is_unreachable(error):
+        return True
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout)):
+        # Mất kết nối / timeout sau khi đã gửi: cổng có thể đã xử lý request
+        return idempotent
+    return False
+
+
+class GatewayClient:
+    """Client đồng bộ dùng chung trong process cho một cổng thanh toán"""
+
+    def __init__(self, name):
+        self.name = name
+        self.timeout = (settings.GATEWAY_CONNECT_TIMEOUT, settings.GATEWAY_READ_TIMEOUT)
+        self.max_retries = settings.GATEWAY_MAX_RETRIES
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GATEWAY_BREAKER_FAILURES,
+            reset_timeout=settings.GATEWAY_BREAKER_RESET_TIMEOUT,
+            name=name
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.GATEWAY_POOL_SIZE,
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def post_json(self, url, payload, idempotent=False):
+        """
+        Gửi POST JSON và trả về body JSON
+
+        Raises:
+            CircuitOpenError: cổng thanh toán đang bị ngắt
+            GatewayUnreachableError: không kết nối được sau khi đã thử lại
+            GatewayError: lỗi mạng / lỗi HTTP sau khi đã thử lại (request có
+                thể đã tới cổng thanh toán)
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'Cổng thanh toán {self.name} tạm thời không khả dụng')
+
+        try:
+            return self._post_json(url, payload, idempotent)
+        except BaseException as e:
+            if not isinstance(e, GatewayError):
+                self.breaker.abort()
+            raise
+
+    def _post_json(self, url, payload, idempotent):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    attempt += 1
+                    logger.warning('gateway.retry', extra={
+                        'gateway': self.name, 'attempt': attempt, 'status_code': response.status_code
+                    })
+                    time.sleep(_backoff(attempt))
+                    continue
+                if response.status_code >= 500:
+                    raise GatewayError(f'{self.name} trả về HTTP {response.status_code}')
+                result = response.json()
+            except (GatewayError, ValueError) as e:
+                # ValueError: body không phải JSON (requests JSONDecodeError cũng là ValueError)
+                self.breaker.record_failure()
+                if isinstance(e, GatewayError):
+                    raise
+                raise GatewayError(f'{self.name} trả về dữ liệu không hợp lệ') from e
+            except requests.exceptions.RequestException as e:
+                if _is_retryable(e, idempotent) and attempt < self.max_retries:
+                    attempt += 1
+                    logger.warning('gateway.retry', extra={
+                        'gateway': self.name, 'attempt': attempt, 'error': e.__class__.__name__
+                    })
+                    time.sleep(_backoff(attempt))
+                    continue
+                self.breaker.record_failure()
+                error_class = GatewayUnreachableError if _is_unreachable(e) else GatewayError
+                raise error_class(f'Lỗi kết nối {self.name}: {e}') from e
+
+            self.breaker.record_success()
+            return result
+
+
+class AsyncGatewayClient:
+    """
+    Client bất đồng bộ (httpx.AsyncClient) cho triển khai ASGI
+
+    Dùng chung circuit breaker với client đồng bộ của cùng cổng thanh toán.
+    """
+
+    def __init__(self, name, breaker=None):
+        if httpx is None:
+            raise ImportError('AsyncGatewayClient cần thư viện httpx (pip install httpx)')
+
+        self.name = name
+        self.max_retries = settings.GATEWAY_MAX_RETRIES
+        self.breaker = breaker or get_client(name).breaker
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.GATEWAY_READ_TIMEOUT, connect=settings.GATEWAY_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.GATEWAY_POOL_SIZE),
+            headers={'Content-Type': 'application/json'}
+        )
+
+    async def post_json(self, url, payload, idempotent=False):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'Cổng thanh toán {self.name} tạm thời không khả dụng')
+
+        try:
+            return await self._post_json(url, payload, idempotent)
+        except BaseException as e:
+            # Gồm asyncio.CancelledError (request bị hủy giữa chừng)
+            if not isinstance(e, GatewayError):
+                self.breaker.abort()
+            raise
+
+    async def _post_json(self, url, payload, idempotent):
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.post(url, json=payload)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+                if response.status_code >= 500:
+                    raise GatewayError(f'{self.name} trả về HTTP {response.status_code}')
+                result = response.json()
+            except httpx.HTTPError as e:
+                unreachable = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                retryable = unreachable or (
+                    idempotent and isinstance(e, httpx.ReadTimeout)
+                )
+                if retryable and attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+                self.breaker.record_failure()
+                error_class = GatewayUnreachableError if unreachable else GatewayError
+                raise error_class(f'Lỗi kết nối {self.name}: {e}') from e
+            except (GatewayError, ValueError) as e:
+                self.breaker.record_failure()
+                if isinstance(e, GatewayError):
+                    raise
+                raise GatewayError(f'{self.name} trả về dữ liệu không hợp lệ') from e
+
+            self.breaker.record_success()
+            return result
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Lấy client dùng chung của process cho cổng thanh toán"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = GatewayClient(name)
+        return _clients[name]
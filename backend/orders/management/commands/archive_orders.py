@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Chuyển đơn hàng đã kết thúc (delivered/cancelled/returned) cũ sang bảng lưu trữ'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Lưu trữ đơn hàng tạo trước số ngày này (mặc định ORDER_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số đơn hàng mỗi lô')
+        parser.add_argument('--max-batches', type=int, default=None, help='Giới hạn số lô mỗi lần chạy')
+
+    def handle(self, *args, **options):
+        total = archive_orders(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Đã lưu trữ {total} đơn hàng'))
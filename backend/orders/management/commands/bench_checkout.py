@@ -0,0 +1,86 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.benchmark import BenchmarkConfig, CheckoutBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark đặt hàng đồng thời (ghi dữ liệu thật, chỉ chạy trên database thử nghiệm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200, help='Tổng số lượt đặt hàng')
+        parser.add_argument('--concurrency', type=int, default=8, help='Số thread đặt hàng song song')
+        parser.add_argument('--products', type=int, default=50, help='Số sản phẩm được tạo')
+        parser.add_argument('--hot-products', type=int, default=5, help='Số sản phẩm "nóng" (được nhiều đơn cùng mua)')
+        parser.add_argument('--hot-ratio', type=float, default=0.5, help='Xác suất mỗi dòng hàng là sản phẩm nóng (0-1)')
+        parser.add_argument('--cart-size', default='1-5', help='Số dòng hàng mỗi đơn, dạng MIN-MAX')
+        parser.add_argument('--max-quantity', type=int, default=3, help='Số lượng tối đa mỗi dòng hàng')
+        parser.add_argument('--stock', type=int, default=100000, help='Tồn kho ban đầu mỗi sản phẩm')
+        parser.add_argument('--mode', choices=['serializer', 'api'], default='serializer', help='Đặt hàng qua serializer hoặc qua API')
+        parser.add_argument('--max-retries', type=int, default=3, help='Số lần thử lại khi deadlock / hết thời gian chờ khóa')
+        parser.add_argument('--seed', type=int, default=None, help='Seed cho bộ sinh giỏ hàng')
+        parser.add_argument('--keep', action='store_true', help='Giữ lại dữ liệu benchmark sau khi chạy')
+        parser.add_argument('--json', action='store_true', help='In kết quả dạng JSON')
+        parser.add_argument('--force', action='store_true', help='Cho phép chạy khi DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Benchmark ghi dữ liệu vào database; dùng --force nếu DEBUG=False')
+
+        try:
+            min_size, max_size = (int(value) for value in options['cart_size'].split('-'))
+        except ValueError:
+            raise CommandError('--cart-size phải có dạng MIN-MAX, ví dụ 1-5')
+
+        config = BenchmarkConfig(
+            orders=options['orders'],
+            concurrency=options['concurrency'],
+            products=options['products'],
+            hot_products=min(options['hot_products'], options['products']),
+            hot_ratio=options['hot_ratio'],
+            min_cart_size=min_size,
+            max_cart_size=max_size,
+            max_quantity=options['max_quantity'],
+            stock=options['stock'],
+            mode=options['mode'],
+            max_retries=options['max_retries'],
+            seed=options['seed']
+        )
+
+        benchmark = CheckoutBenchmark(config)
+        benchmark.seed()
+        try:
+            benchmark.run()
+            summary = benchmark.summary()
+        finally:
+            if not options['keep']:
+                benchmark.cleanup()
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2, ensure_ascii=False))
+            return
+
+        latency = summary['latency_ms']
+        self.stdout.write(f"Run {summary['run_id']} ({summary['database']}, {summary['mode']})")
+        self.stdout.write(
+            f"  Đơn hàng: {summary['succeeded']} thành công, {summary['rejected']} bị từ chối, "
+            f"lỗi: {summary['errors'] or 0}"
+        )
+        self.stdout.write(
+            f"  Thời gian: {summary['elapsed_seconds']}s, throughput {summary['throughput_per_second']} đơn/s"
+        )
+        self.stdout.write(
+            f"  Độ trễ (ms): p50 {latency['p50']}, p95 {latency['p95']}, p99 {latency['p99']}, max {latency['max']}"
+        )
+        self.stdout.write(
+            f"  Deadlock: {summary['deadlocks']}, hết thời gian chờ khóa: {summary['lock_timeouts']}, "
+            f"thử lại: {summary['retries']}"
+        )
+        if summary['stock_consistent']:
+            self.stdout.write(self.style.SUCCESS('  Tồn kho nhất quán'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"  Tồn kho KHÔNG nhất quán: {summary['stock_mismatches']}"
+            ))
@@ -0,0 +1,45 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import bank_statements
+
+
+class Command(BaseCommand):
+    help = 'Đối soát file sao kê ngân hàng (CSV / MT940) với các đơn chuyển khoản chờ thanh toán'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Đường dẫn file sao kê')
+        parser.add_argument('--format', choices=['csv', 'mt940'], help='Mặc định: theo đuôi file')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ so khớp, không cập nhật đơn hàng')
+        parser.add_argument('--report', help='Ghi các giao dịch cần kiểm tra ra file CSV')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or bank_statements.detect_format(options['path'])
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                matches, stats = bank_statements.reconcile(stream, file_format, dry_run=options['dry_run'])
+        except (OSError, bank_statements.StatementError) as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            rows = list(bank_statements.issue_rows(matches))
+            with open(options['report'], 'w', encoding='utf-8-sig', newline='') as report:
+                writer = csv.DictWriter(report, fieldnames=[
+                    'line_no', 'date', 'amount', 'reference', 'memo', 'result', 'order_numbers', 'detail'
+                ])
+                writer.writeheader()
+                writer.writerows(rows)
+            self.stdout.write(f"Đã ghi {len(rows)} giao dịch cần kiểm tra vào {options['report']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['lines']} giao dịch ghi có trong {time.monotonic() - started:.2f}s: "
+            f"{stats['matched']} khớp, {stats['ambiguous']} không rõ ràng, "
+            f"{stats['amount_mismatch']} lệch số tiền, {stats['unmatched']} không tìm thấy đơn, "
+            f"{stats['no_code']} không có mã đơn"
+        ))
+        if not options['dry_run']:
+            self.stdout.write(f"Đã ghi nhận thanh toán {stats['applied']} đơn hàng")
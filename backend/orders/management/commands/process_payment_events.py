@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.payments import claim_batch, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Cập nhật đơn hàng từ các sự kiện thanh toán (IPN) đang chờ trong inbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Số sự kiện mỗi lô')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như worker')
+        parser.add_argument('--interval', type=float, default=1, help='Số giây chờ khi inbox trống (với --loop)')
+
+    def handle(self, *args, **options):
+        total_processed = total_failed = 0
+        try:
+            while True:
+                events = claim_batch(options['batch_size'])
+                if events:
+                    processed, failed = process_batch(events)
+                    total_processed += processed
+                    total_failed += failed
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã xử lý {total_processed} sự kiện thanh toán, {total_failed} lỗi'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.payment_providers import PROVIDER_CLASSES, FakeProvider
+from orders.refunds import RefundProcessor
+
+
+class Command(BaseCommand):
+    help = 'Gửi các yêu cầu hoàn tiền đang chờ tới API hoàn tiền của VNPay / MoMo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Số yêu cầu hoàn tiền mỗi lô')
+        parser.add_argument('--concurrency', type=int, default=settings.REFUND_CONCURRENCY)
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như worker')
+        parser.add_argument('--interval', type=float, default=5, help='Số giây chờ khi không còn yêu cầu (với --loop)')
+        parser.add_argument(
+            '--fake', action='store_true',
+            help='Dùng cổng thanh toán giả lập (chạy offline, không gọi VNPay / MoMo)'
+        )
+        parser.add_argument('--fake-latency', type=float, default=0.05, help='Độ trễ cổng giả lập (giây)')
+
+    def handle(self, *args, **options):
+        providers = None
+        if options['fake']:
+            providers = {
+                name: FakeProvider(name, latency=options['fake_latency'])
+                for name in PROVIDER_CLASSES
+            }
+
+        processor = RefundProcessor(providers=providers, concurrency=options['concurrency'])
+        try:
+            while True:
+                processor.run(batch_size=options['batch_size'])
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        stats = processor.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã hoàn tiền {stats['succeeded']} yêu cầu, {stats['failed']} bị từ chối, "
+            f"{stats['error']} lỗi gửi (thử lại sau); {stats['orders_refunded']} đơn đã hoàn đủ"
+        ))
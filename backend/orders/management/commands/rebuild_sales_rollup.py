@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.rollups import rebuild
+from orders.utils import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng tổng hợp doanh số theo ngày (song song theo khoảng ngày)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Ngày bắt đầu YYYY-MM-DD (mặc định: ngày có đơn hàng đầu tiên)')
+        parser.add_argument('--end', help='Ngày kết thúc YYYY-MM-DD (mặc định: hôm nay)')
+        parser.add_argument('--workers', type=int, default=4, help='Số thread chạy song song')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Số ngày mỗi transaction')
+
+    def _parse_day(self, value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'Ngày không hợp lệ: {value}')
+        return parsed.date()
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days phải lớn hơn 0')
+        chunks, rows = rebuild(
+            start_day=self._parse_day(options['start']),
+            end_day=self._parse_day(options['end']),
+            workers=options['workers'],
+            chunk_days=options['chunk_days']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Đã tính lại {chunks} đoạn, ghi {rows} dòng tổng hợp'))
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.payment_providers import PROVIDER_CLASSES, FakeProvider
+from orders.reconciliation import Reconciler
+
+
+class Command(BaseCommand):
+    help = (
+        'Đối soát đơn hàng VNPay / MoMo còn chờ thanh toán với API truy vấn '
+        'giao dịch của cổng thanh toán'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=settings.RECONCILE_MIN_AGE_MINUTES,
+            help='Chỉ đối soát đơn tạo trước ít nhất N phút'
+        )
+        parser.add_argument('--max-age', type=int, default=7, help='Bỏ qua đơn cũ hơn N ngày')
+        parser.add_argument('--limit', type=int, default=1000, help='Số đơn tối đa mỗi lần chạy')
+        parser.add_argument('--batch-size', type=int, default=100, help='Số đơn mỗi lô truy vấn / ghi')
+        parser.add_argument('--concurrency', type=int, default=settings.RECONCILE_CONCURRENCY)
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ truy vấn, không cập nhật đơn hàng')
+        parser.add_argument(
+            '--fake', action='store_true',
+            help='Dùng cổng thanh toán giả lập (chạy offline, không gọi VNPay / MoMo)'
+        )
+        parser.add_argument('--fake-latency', type=float, default=0.05, help='Độ trễ cổng giả lập (giây)')
+
+    def handle(self, *args, **options):
+        providers = None
+        if options['fake']:
+            providers = {
+                name: FakeProvider(name, latency=options['fake_latency'])
+                for name in PROVIDER_CLASSES
+            }
+
+        reconciler = Reconciler(
+            providers=providers,
+            concurrency=options['concurrency'],
+            dry_run=options['dry_run']
+        )
+        stats = reconciler.run(
+            min_age=timedelta(minutes=options['min_age']),
+            max_age=timedelta(days=options['max_age']),
+            limit=options['limit'],
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã đối soát {stats['selected']} đơn hàng: "
+            f"{stats['paid']} đã thanh toán, {stats['failed']} thất bại, "
+            f"{stats['pending']} đang chờ, {stats['error']} lỗi truy vấn, "
+            f"{stats['amount_mismatch']} lệch số tiền"
+        ))
+        if not options['dry_run']:
+            self.stdout.write(
+                f"Cập nhật: {stats['marked_paid']} đơn đã thanh toán, {stats['marked_failed']} đơn thất bại, "
+                f"{stats['attempts_expired']} URL thanh toán hết hạn"
+            )
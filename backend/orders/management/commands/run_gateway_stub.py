@@ -0,0 +1,134 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Chạy server giả lập cổng thanh toán MoMo cho môi trường local/test '
+        '(đặt MOMO_API_URL=http://127.0.0.1:<port>/v2/gateway/api/create)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0, help='Độ trễ mỗi response (giây)')
+        parser.add_argument('--fail-rate', type=float, default=0, help='Tỉ lệ trả HTTP 503 (0-1)')
+        parser.add_argument('--result-code', type=int, default=0, help='resultCode trả về khi tạo thanh toán')
+
+    def handle(self, *args, **options):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                stub.stdout.write(f"[stub] {self.address_string()} {format % args}")
+
+            def _send(self, status_code, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    data = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._send(400, {'resultCode': 99, 'message': 'Invalid JSON'})
+
+                if options['delay']:
+                    time.sleep(options['delay'])
+                if random.random() < options['fail_rate']:
+                    return self._send(503, {'resultCode': 99, 'message': 'Service unavailable'})
+
+                if self.path.endswith('/create'):
+                    return self._send(200, stub.create_response(data, options['result_code']))
+                if self.path.endswith('/query'):
+                    return self._send(200, stub.query_response(data))
+                if self.path.endswith('/refund'):
+                    return self._send(200, stub.refund_response(data))
+                return self._send(404, {'resultCode': 99, 'message': 'Not found'})
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub MoMo đang chạy tại http://{options['host']}:{options['port']}/v2/gateway/api/create"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def create_response(self, data, result_code):
+        order_id = data.get('orderId', '')
+        return {
+            'partnerCode': data.get('partnerCode', ''),
+            'requestId': data.get('requestId', ''),
+            'orderId': order_id,
+            'amount': data.get('amount', 0),
+            'responseTime': int(time.time() * 1000),
+            'message': 'Thành công.' if result_code == 0 else 'Lỗi giả lập',
+            'resultCode': result_code,
+            'payUrl': f"{data.get('redirectUrl', '')}?orderId={order_id}&stub=1",
+            'deeplink': f'momo://stub?orderId={order_id}',
+            'qrCodeUrl': f'momo://stub/qr?orderId={order_id}',
+        }
+
+    def order_amount(self, order_id):
+        """
+        Số tiền của đơn hàng theo orderId (mã đơn hàng), như MoMo trả về số
+        tiền của giao dịch đã tạo: job đối soát so sánh số tiền này với tổng
+        tiền đơn hàng
+        """
+        try:
+            total = Order.objects.filter(order_number=order_id).values_list('total', flat=True).first()
+        finally:
+            # Mỗi request chạy trên một thread riêng: đóng kết nối của thread
+            connection.close()
+        return int(total) if total is not None else 0
+
+    def query_response(self, data):
+        response = {
+            'partnerCode': data.get('partnerCode', ''),
+            'requestId': data.get('requestId', ''),
+            'orderId': data.get('orderId', ''),
+            'extraData': '',
+            'amount': self.order_amount(data.get('orderId', '')),
+            'transId': int(uuid.uuid4().int % 10 ** 10),
+            'payType': 'qr',
+            'resultCode': 0,
+            'refundTrans': [],
+            'message': 'Thành công.',
+            'responseTime': int(time.time() * 1000),
+        }
+        response['signature'] = hmac.new(
+            settings.MOMO_SECRET_KEY.encode('utf-8'),
+            json.dumps(response, sort_keys=True).encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return response
+
+    def refund_response(self, data):
+        return {
+            'partnerCode': data.get('partnerCode', ''),
+            'orderId': data.get('orderId', ''),
+            'requestId': data.get('requestId', ''),
+            'amount': data.get('amount', 0),
+            'transId': int(uuid.uuid4().int % 10 ** 10),
+            'resultCode': 0,
+            'message': 'Thành công.',
+            'responseTime': int(time.time() * 1000),
+        }
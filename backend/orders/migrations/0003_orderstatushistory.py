@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_bank_code_order_bank_transaction_no_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('pending', 'Chờ xác nhận'), ('confirmed', 'Đã xác nhận'), ('processing', 'Đang xử lý'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy'), ('returned', 'Đã trả hàng')], max_length=20, verbose_name='Trạng thái trước')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xác nhận'), ('confirmed', 'Đã xác nhận'), ('processing', 'Đang xử lý'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy'), ('returned', 'Đã trả hàng')], max_length=20, verbose_name='Trạng thái')),
+                ('source', models.CharField(blank=True, max_length=20, verbose_name='Nguồn thay đổi')),
+                ('note', models.CharField(blank=True, max_length=255, verbose_name='Ghi chú')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Thời điểm thay đổi')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_status_changes', to=settings.AUTH_USER_MODEL, verbose_name='Người thực hiện')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='orders.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Lịch sử trạng thái đơn hàng',
+                'verbose_name_plural': 'Lịch sử trạng thái đơn hàng',
+                'db_table': 'order_status_history',
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'changed_at'], name='order_statu_status_ad396f_idx'), models.Index(fields=['order', 'changed_at'], name='order_statu_order_i_623f54_idx')],
+            },
+        ),
+    ]
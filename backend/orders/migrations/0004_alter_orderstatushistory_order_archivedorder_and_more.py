@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:54
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_orderstatushistory'),
+        ('products', '0002_remove_product_is_featured_alter_product_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderstatushistory',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='status_history', to='orders.order', verbose_name='Đơn hàng'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('order_number', models.CharField(max_length=50, unique=True, verbose_name='Mã đơn hàng')),
+                ('full_name', models.CharField(max_length=255, verbose_name='Họ và tên')),
+                ('phone', models.CharField(max_length=15, verbose_name='Số điện thoại')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='Email')),
+                ('address', models.TextField(verbose_name='Địa chỉ')),
+                ('district', models.CharField(blank=True, max_length=100, verbose_name='Quận/Huyện')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='Tỉnh/Thành phố')),
+                ('note', models.TextField(blank=True, verbose_name='Ghi chú')),
+                ('subtotal', models.DecimalField(decimal_places=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Tạm tính')),
+                ('shipping_fee', models.DecimalField(decimal_places=0, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Phí vận chuyển')),
+                ('total', models.DecimalField(decimal_places=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Tổng tiền')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xác nhận'), ('confirmed', 'Đã xác nhận'), ('processing', 'Đang xử lý'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy'), ('returned', 'Đã trả hàng')], default='pending', max_length=20, verbose_name='Trạng thái')),
+                ('payment_method', models.CharField(choices=[('cod', 'Thanh toán khi nhận hàng'), ('vnpay', 'VNPay'), ('momo', 'Momo'), ('banking', 'Chuyển khoản ngân hàng')], default='cod', max_length=20, verbose_name='Phương thức thanh toán')),
+                ('payment_status', models.CharField(choices=[('pending', 'Chờ thanh toán'), ('paid', 'Đã thanh toán'), ('failed', 'Thanh toán thất bại'), ('refunded', 'Đã hoàn tiền')], default='pending', max_length=20, verbose_name='Trạng thái thanh toán')),
+                ('transaction_id', models.CharField(blank=True, max_length=100, verbose_name='Mã giao dịch')),
+                ('bank_code', models.CharField(blank=True, max_length=50, verbose_name='Mã ngân hàng')),
+                ('bank_transaction_no', models.CharField(blank=True, max_length=100, verbose_name='Mã giao dịch ngân hàng')),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày xác nhận')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày giao hàng')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(verbose_name='Ngày tạo')),
+                ('updated_at', models.DateTimeField(verbose_name='Ngày cập nhật')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ngày lưu trữ')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Đơn hàng lưu trữ',
+                'verbose_name_plural': 'Đơn hàng lưu trữ',
+                'db_table': 'orders_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('product_name', models.CharField(max_length=255, verbose_name='Tên sản phẩm (snapshot)')),
+                ('product_price', models.DecimalField(decimal_places=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Giá sản phẩm (snapshot)')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Số lượng')),
+                ('subtotal', models.DecimalField(decimal_places=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Thành tiền')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(verbose_name='Ngày tạo')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder', verbose_name='Đơn hàng')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_order_items', to='products.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Chi tiết đơn hàng lưu trữ',
+                'verbose_name_plural': 'Chi tiết đơn hàng lưu trữ',
+                'db_table': 'order_items_archive',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', '-created_at'], name='orders_arch_user_id_4bc502_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='orders_arch_created_66e297_idx'),
+        ),
+    ]
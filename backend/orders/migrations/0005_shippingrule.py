@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:03
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_orderstatushistory_order_archivedorder_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Tên quy tắc')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='Tỉnh/Thành phố')),
+                ('district', models.CharField(blank=True, max_length=100, verbose_name='Quận/Huyện')),
+                ('min_subtotal', models.DecimalField(decimal_places=0, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Tạm tính tối thiểu')),
+                ('base_fee', models.DecimalField(decimal_places=0, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Phí cơ bản')),
+                ('included_weight_kg', models.DecimalField(decimal_places=2, default=0, max_digits=8, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Khối lượng bao gồm (kg)')),
+                ('per_kg_fee', models.DecimalField(decimal_places=0, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Phí mỗi kg vượt')),
+                ('valid_from', models.DateTimeField(blank=True, null=True, verbose_name='Áp dụng từ')),
+                ('valid_to', models.DateTimeField(blank=True, null=True, verbose_name='Áp dụng đến')),
+                ('priority', models.IntegerField(default=0, verbose_name='Độ ưu tiên')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Đang áp dụng')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')),
+            ],
+            options={
+                'verbose_name': 'Quy tắc phí vận chuyển',
+                'verbose_name_plural': 'Quy tắc phí vận chuyển',
+                'db_table': 'shipping_rules',
+                'ordering': ['city', 'district', 'min_subtotal'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_archivedorder_discount_order_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(max_length=20, verbose_name='Cổng thanh toán')),
+                ('transaction_id', models.CharField(max_length=100, verbose_name='Mã giao dịch')),
+                ('order_number', models.CharField(db_index=True, max_length=50, verbose_name='Mã đơn hàng')),
+                ('is_success', models.BooleanField(default=False, verbose_name='Thanh toán thành công')),
+                ('amount', models.DecimalField(blank=True, decimal_places=0, max_digits=12, null=True, verbose_name='Số tiền')),
+                ('bank_code', models.CharField(blank=True, max_length=50, verbose_name='Mã ngân hàng')),
+                ('bank_transaction_no', models.CharField(blank=True, max_length=100, verbose_name='Mã GD ngân hàng')),
+                ('message', models.CharField(blank=True, max_length=255, verbose_name='Thông báo từ cổng')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Dữ liệu IPN')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xử lý'), ('processing', 'Đang xử lý'), ('processed', 'Đã xử lý'), ('ignored', 'Bỏ qua'), ('failed', 'Xử lý thất bại')], default='pending', max_length=20, verbose_name='Trạng thái')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Số lần xử lý')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Lần xử lý tiếp theo')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm nhận xử lý')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi / ghi chú')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày nhận')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày xử lý')),
+            ],
+            options={
+                'verbose_name': 'Sự kiện thanh toán',
+                'verbose_name_plural': 'Sự kiện thanh toán',
+                'db_table': 'payment_events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='payment_eve_status_c2bd39_idx')],
+                'constraints': [models.UniqueConstraint(fields=('gateway', 'transaction_id'), name='payment_event_unique_transaction')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_paymentevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_method', 'payment_status', 'created_at'], name='orders_payment_b01689_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_payment_reconcile_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Phiên bản thanh toán'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_payment_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(max_length=20, verbose_name='Cổng thanh toán')),
+                ('reference', models.CharField(max_length=100, verbose_name='Mã tham chiếu')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='Số tiền')),
+                ('payment_url', models.TextField(verbose_name='URL thanh toán')),
+                ('response', models.JSONField(blank=True, default=dict, verbose_name='Phản hồi từ cổng')),
+                ('status', models.CharField(choices=[('active', 'Còn hiệu lực'), ('expired', 'Hết hạn'), ('completed', 'Đã thanh toán')], default='active', max_length=20, verbose_name='Trạng thái')),
+                ('expires_at', models.DateTimeField(verbose_name='Hết hạn lúc')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_attempts', to='orders.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Lần tạo thanh toán',
+                'verbose_name_plural': 'Lần tạo thanh toán',
+                'db_table': 'payment_attempts',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['order', 'gateway', 'status', 'expires_at'], name='payment_att_order_i_c041d8_idx'), models.Index(fields=['status', 'expires_at'], name='payment_att_status_9aafe3_idx')],
+            },
+        ),
+    ]
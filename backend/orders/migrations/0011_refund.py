@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_paymentattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='refunded_amount',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='Số tiền đã hoàn'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='refunded_amount',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='Số tiền đã hoàn'),
+        ),
+        migrations.CreateModel(
+            name='Refund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(db_index=True, max_length=50, verbose_name='Mã đơn hàng')),
+                ('gateway', models.CharField(max_length=20, verbose_name='Cổng thanh toán')),
+                ('reference', models.CharField(max_length=100, unique=True, verbose_name='Mã yêu cầu hoàn tiền')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='Số tiền hoàn')),
+                ('refund_type', models.CharField(choices=[('full', 'Hoàn toàn bộ'), ('partial', 'Hoàn một phần')], max_length=10, verbose_name='Loại hoàn tiền')),
+                ('reason', models.CharField(choices=[('cancelled', 'Hủy đơn hàng'), ('returned', 'Hoàn trả hàng'), ('manual', 'Admin tạo')], max_length=20, verbose_name='Lý do')),
+                ('note', models.CharField(blank=True, max_length=255, verbose_name='Ghi chú')),
+                ('status', models.CharField(choices=[('pending', 'Chờ gửi'), ('processing', 'Đang gửi'), ('succeeded', 'Đã hoàn tiền'), ('failed', 'Thất bại')], default='pending', max_length=20, verbose_name='Trạng thái')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Số lần gửi')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Lần gửi tiếp theo')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm nhận xử lý')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('gateway_refund_id', models.CharField(blank=True, max_length=100, verbose_name='Mã hoàn tiền của cổng')),
+                ('response', models.JSONField(blank=True, default=dict, verbose_name='Phản hồi từ cổng')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày hoàn tiền')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='refunds', to='orders.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Hoàn tiền',
+                'verbose_name_plural': 'Hoàn tiền',
+                'db_table': 'refunds',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='refunds_status_e26b2b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_refund'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'status', 'payment_status', 'total'], name='orders_report_covering_idx'),
+        ),
+    ]
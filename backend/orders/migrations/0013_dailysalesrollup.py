@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_report_covering_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('status', models.CharField(max_length=20, verbose_name='Trạng thái')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Phương thức thanh toán')),
+                ('payment_status', models.CharField(max_length=20, verbose_name='Trạng thái thanh toán')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Số đơn hàng')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Doanh thu')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Số sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Doanh số theo ngày',
+                'verbose_name_plural': 'Doanh số theo ngày',
+                'db_table': 'daily_sales_rollup',
+                'ordering': ['date', 'status', 'payment_method', 'payment_status'],
+                'unique_together': {('date', 'status', 'payment_method', 'payment_status')},
+            },
+        ),
+    ]
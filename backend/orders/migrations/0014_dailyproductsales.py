@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_dailysalesrollup'),
+        ('products', '0002_remove_product_is_featured_alter_product_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('units', models.IntegerField(default=0, verbose_name='Số lượng bán')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Doanh thu')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Số đơn hàng')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Doanh số sản phẩm theo ngày',
+                'verbose_name_plural': 'Doanh số sản phẩm theo ngày',
+                'db_table': 'daily_product_sales',
+                'ordering': ['date', 'product'],
+                'unique_together': {('date', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='dailysalesrollup',
+            options={'ordering': ['date', 'status', 'payment_method', 'payment_status', 'slot'], 'verbose_name': 'Doanh số theo ngày', 'verbose_name_plural': 'Doanh số theo ngày'},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysalesrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailysalesrollup',
+            name='slot',
+            field=models.SmallIntegerField(default=0, verbose_name='Mảnh'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysalesrollup',
+            unique_together={('date', 'status', 'payment_method', 'payment_status', 'slot')},
+        ),
+    ]
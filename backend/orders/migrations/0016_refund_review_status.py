@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_dailysalesrollup_slot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refund',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Chờ gửi'), ('processing', 'Đang gửi'), ('succeeded', 'Đã hoàn tiền'), ('failed', 'Thất bại'), ('review', 'Cần kiểm tra')], default='pending', max_length=20, verbose_name='Trạng thái'),
+        ),
+    ]
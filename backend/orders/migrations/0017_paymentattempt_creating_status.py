@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_refund_review_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentattempt',
+            name='status',
+            field=models.CharField(choices=[('creating', 'Đang tạo'), ('active', 'Còn hiệu lực'), ('expired', 'Hết hạn'), ('completed', 'Đã thanh toán')], default='active', max_length=20, verbose_name='Trạng thái'),
+        ),
+    ]
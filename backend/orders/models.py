@@ -1,12 +1,13 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
 
-class Order(models.Model):
-    """Model đơn hàng"""
+class BaseOrder(models.Model):
+    """Các field chung của đơn hàng (dùng cho bảng chính và bảng lưu trữ)"""
     STATUS_CHOICES = [
         ('pending', 'Chờ xác nhận'),
         ('confirmed', 'Đã xác nhận'),
@@ -31,16 +32,6 @@ class Order(models.Model):
         ('refunded', 'Đã hoàn tiền'),
     ]
     
-    # Thông tin người dùng
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='orders',
-        null=True,
-        blank=True,
-        verbose_name='Người dùng'
-    )
-    
     # Mã đơn hàng
     order_number = models.CharField(
         max_length=50,
@@ -71,6 +62,13 @@ class Order(models.Model):
         default=0,
         verbose_name='Phí vận chuyển'
     )
+    discount = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        validators=[MinValueValidator(0)],
+        default=0,
+        verbose_name='Giảm giá'
+    )
     total = models.DecimalField(
         max_digits=12,
         decimal_places=0,
@@ -100,6 +98,13 @@ class Order(models.Model):
         verbose_name='Trạng thái thanh toán'
     )
     
+    refunded_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        verbose_name='Số tiền đã hoàn'
+    )
+    
     # Thông tin giao dịch thanh toán online
     transaction_id = models.CharField(
         max_length=100,
@@ -123,6 +128,25 @@ class Order(models.Model):
     confirmed_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày xác nhận')
     delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày giao hàng')
     
+    class Meta:
+        abstract = True
+
+
+class Order(BaseOrder):
+    """Model đơn hàng"""
+    # Thông tin người dùng
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='orders',
+        null=True,
+        blank=True,
+        verbose_name='Người dùng'
+    )
+    
+    # Tăng mỗi lần trạng thái thanh toán thay đổi (xem orders.payments.transition_payment)
+    payment_version = models.PositiveIntegerField(default=0, verbose_name='Phiên bản thanh toán')
+    
     class Meta:
         db_table = 'orders'
         verbose_name = 'Đơn hàng'
@@ -132,6 +156,13 @@ class Order(models.Model):
             models.Index(fields=['order_number']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status', '-created_at']),
+            # Đối soát thanh toán: đơn thanh toán online còn chờ thanh toán
+            models.Index(fields=['payment_method', 'payment_status', 'created_at']),
+            # Báo cáo: range scan theo created_at, đọc status / payment_status / total từ index
+            models.Index(
+                fields=['created_at', 'status', 'payment_status', 'total'],
+                name='orders_report_covering_idx'
+            ),
         ]
     
     def __str__(self):
@@ -139,26 +170,17 @@ class Order(models.Model):
     
     def save(self, *args, **kwargs):
         # Tự động tạo mã đơn hàng nếu chưa có
+        # (thêm 6 chữ số ngẫu nhiên để các đơn tạo trong cùng một giây không trùng mã)
         if not self.order_number:
             import datetime
+            import secrets
             timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-            self.order_number = f"ORD{timestamp}"
+            self.order_number = f"ORD{timestamp}{secrets.randbelow(10 ** 6):06d}"
         super().save(*args, **kwargs)
 
 
-class OrderItem(models.Model):
-    """Model chi tiết đơn hàng"""
-    order = models.ForeignKey(
-        Order,
-        on_delete=models.CASCADE,
-        related_name='items',
-        verbose_name='Đơn hàng'
-    )
-    product = models.ForeignKey(
-        Product,
-        on_delete=models.PROTECT,
-        verbose_name='Sản phẩm'
-    )
+class BaseOrderItem(models.Model):
+    """Các field chung của chi tiết đơn hàng (dùng cho bảng chính và bảng lưu trữ)"""
     product_name = models.CharField(
         max_length=255,
         verbose_name='Tên sản phẩm (snapshot)'
@@ -183,6 +205,24 @@ class OrderItem(models.Model):
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
     
+    class Meta:
+        abstract = True
+
+
+class OrderItem(BaseOrderItem):
+    """Model chi tiết đơn hàng"""
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Đơn hàng'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        verbose_name='Sản phẩm'
+    )
+    
     class Meta:
         db_table = 'order_items'
         verbose_name = 'Chi tiết đơn hàng'
@@ -196,3 +236,450 @@ class OrderItem(models.Model):
         # Tự động tính subtotal
         self.subtotal = Decimal(self.product_price) * self.quantity
         super().save(*args, **kwargs)
+
+
+class OrderStatusHistory(models.Model):
+    """Model lịch sử chuyển trạng thái đơn hàng (chỉ ghi thêm, không sửa)"""
+    # Không ràng buộc khóa ngoại: lịch sử được giữ lại khi đơn hàng
+    # được chuyển sang bảng lưu trữ (cùng id)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='status_history',
+        verbose_name='Đơn hàng'
+    )
+    from_status = models.CharField(
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+        blank=True,
+        verbose_name='Trạng thái trước'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+        verbose_name='Trạng thái'
+    )
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='order_status_changes',
+        null=True,
+        blank=True,
+        verbose_name='Người thực hiện'
+    )
+    source = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name='Nguồn thay đổi'
+    )
+    note = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Ghi chú'
+    )
+    changed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Thời điểm thay đổi'
+    )
+    
+    class Meta:
+        db_table = 'order_status_history'
+        verbose_name = 'Lịch sử trạng thái đơn hàng'
+        verbose_name_plural = 'Lịch sử trạng thái đơn hàng'
+        ordering = ['changed_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'changed_at']),
+            models.Index(fields=['order', 'changed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '-'} -> {self.status}"
+    
+    def save(self, *args, **kwargs):
+        # Lịch sử chỉ được ghi thêm, không cho phép chỉnh sửa bản ghi cũ
+        if not self._state.adding:
+            raise ValueError('Không thể chỉnh sửa lịch sử trạng thái đơn hàng')
+        super().save(*args, **kwargs)
+
+
+class ArchivedOrder(BaseOrder):
+    """Model đơn hàng đã lưu trữ (đơn cũ đã hoàn tất, giữ nguyên id)"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_orders',
+        null=True,
+        blank=True,
+        verbose_name='Người dùng'
+    )
+    # Giữ nguyên thời gian gốc khi sao chép (không dùng auto_now)
+    created_at = models.DateTimeField(verbose_name='Ngày tạo')
+    updated_at = models.DateTimeField(verbose_name='Ngày cập nhật')
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name='Ngày lưu trữ')
+    
+    class Meta:
+        db_table = 'orders_archive'
+        verbose_name = 'Đơn hàng lưu trữ'
+        verbose_name_plural = 'Đơn hàng lưu trữ'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Đơn hàng #{self.order_number} (lưu trữ)"
+
+
+class ArchivedOrderItem(BaseOrderItem):
+    """Model chi tiết đơn hàng đã lưu trữ (giữ nguyên id)"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Đơn hàng'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name='archived_order_items',
+        verbose_name='Sản phẩm'
+    )
+    created_at = models.DateTimeField(verbose_name='Ngày tạo')
+    
+    class Meta:
+        db_table = 'order_items_archive'
+        verbose_name = 'Chi tiết đơn hàng lưu trữ'
+        verbose_name_plural = 'Chi tiết đơn hàng lưu trữ'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+
+class ShippingRule(models.Model):
+    """
+    Model quy tắc tính phí vận chuyển
+    
+    Quy tắc áp dụng theo khu vực (tỉnh/thành, quận/huyện; để trống = mọi nơi)
+    và theo ngưỡng tạm tính. Quy tắc cụ thể nhất (quận/huyện > tỉnh/thành >
+    mặc định) được ưu tiên; trong cùng khu vực, quy tắc khuyến mãi có thời
+    hạn đang hiệu lực được ưu tiên hơn quy tắc thường.
+    """
+    name = models.CharField(max_length=255, verbose_name='Tên quy tắc')
+    city = models.CharField(max_length=100, blank=True, verbose_name='Tỉnh/Thành phố')
+    district = models.CharField(max_length=100, blank=True, verbose_name='Quận/Huyện')
+    
+    # Ngưỡng tạm tính áp dụng quy tắc (tạm tính >= min_subtotal)
+    min_subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Tạm tính tối thiểu'
+    )
+    
+    # Phí = base_fee + per_kg_fee * (khối lượng vượt quá included_weight_kg)
+    base_fee = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Phí cơ bản'
+    )
+    included_weight_kg = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Khối lượng bao gồm (kg)'
+    )
+    per_kg_fee = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Phí mỗi kg vượt'
+    )
+    
+    # Khuyến mãi có thời hạn (ví dụ miễn phí vận chuyển cuối tuần)
+    valid_from = models.DateTimeField(null=True, blank=True, verbose_name='Áp dụng từ')
+    valid_to = models.DateTimeField(null=True, blank=True, verbose_name='Áp dụng đến')
+    priority = models.IntegerField(default=0, verbose_name='Độ ưu tiên')
+    is_active = models.BooleanField(default=True, verbose_name='Đang áp dụng')
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')
+    
+    class Meta:
+        db_table = 'shipping_rules'
+        verbose_name = 'Quy tắc phí vận chuyển'
+        verbose_name_plural = 'Quy tắc phí vận chuyển'
+        ordering = ['city', 'district', 'min_subtotal']
+    
+    def __str__(self):
+        area = ' / '.join(part for part in [self.city, self.district] if part) or 'Mặc định'
+        return f"{self.name} ({area})"
+    
+    @property
+    def is_promotion(self):
+        return self.valid_from is not None or self.valid_to is not None
+
+
+class PaymentEvent(models.Model):
+    """
+    Model inbox sự kiện thanh toán (IPN từ cổng thanh toán)
+    
+    IPN được kiểm tra chữ ký, ghi vào đây và trả lời cổng thanh toán ngay;
+    worker `process_payment_events` cập nhật đơn hàng sau. Unique trên
+    (gateway, transaction_id) nên các lần gửi lại cùng một giao dịch chỉ
+    được ghi một lần.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Chờ xử lý'),
+        ('processing', 'Đang xử lý'),
+        ('processed', 'Đã xử lý'),
+        ('ignored', 'Bỏ qua'),
+        ('failed', 'Xử lý thất bại'),
+    ]
+    
+    gateway = models.CharField(max_length=20, verbose_name='Cổng thanh toán')
+    transaction_id = models.CharField(max_length=100, verbose_name='Mã giao dịch')
+    order_number = models.CharField(max_length=50, db_index=True, verbose_name='Mã đơn hàng')
+    is_success = models.BooleanField(default=False, verbose_name='Thanh toán thành công')
+    amount = models.DecimalField(max_digits=12, decimal_places=0, null=True, blank=True, verbose_name='Số tiền')
+    bank_code = models.CharField(max_length=50, blank=True, verbose_name='Mã ngân hàng')
+    bank_transaction_no = models.CharField(max_length=100, blank=True, verbose_name='Mã GD ngân hàng')
+    message = models.CharField(max_length=255, blank=True, verbose_name='Thông báo từ cổng')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Dữ liệu IPN')
+    
+    # Trạng thái xử lý
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Trạng thái'
+    )
+    attempts = models.IntegerField(default=0, verbose_name='Số lần xử lý')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Lần xử lý tiếp theo')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Thời điểm nhận xử lý')
+    last_error = models.TextField(blank=True, verbose_name='Lỗi / ghi chú')
+    
+    # Metadata
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày nhận')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày xử lý')
+    
+    class Meta:
+        db_table = 'payment_events'
+        verbose_name = 'Sự kiện thanh toán'
+        verbose_name_plural = 'Sự kiện thanh toán'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gateway', 'transaction_id'],
+                name='payment_event_unique_transaction'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.transaction_id} -> {self.order_number} ({self.status})"
+
+
+class PaymentAttempt(models.Model):
+    """
+    Model lần tạo yêu cầu thanh toán online
+    
+    Mỗi lần tạo URL thanh toán ở cổng được ghi lại kèm mã tham chiếu
+    (vnp_CreateDate của VNPay, requestId của MoMo), số tiền và thời hạn.
+    Khách bấm "thanh toán" nhiều lần thì dùng lại lần tạo còn hiệu lực thay
+    vì gọi lại cổng; đối soát truy vấn giao dịch theo mã tham chiếu này.
+    """
+    STATUS_CHOICES = [
+        # Đang gọi cổng thanh toán (giữ chỗ cho các lần bấm đồng thời)
+        ('creating', 'Đang tạo'),
+        ('active', 'Còn hiệu lực'),
+        ('expired', 'Hết hạn'),
+        ('completed', 'Đã thanh toán'),
+    ]
+    
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='payment_attempts',
+        verbose_name='Đơn hàng'
+    )
+    gateway = models.CharField(max_length=20, verbose_name='Cổng thanh toán')
+    reference = models.CharField(max_length=100, verbose_name='Mã tham chiếu')
+    amount = models.DecimalField(max_digits=12, decimal_places=0, verbose_name='Số tiền')
+    payment_url = models.TextField(verbose_name='URL thanh toán')
+    response = models.JSONField(default=dict, blank=True, verbose_name='Phản hồi từ cổng')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='active',
+        verbose_name='Trạng thái'
+    )
+    expires_at = models.DateTimeField(verbose_name='Hết hạn lúc')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    
+    class Meta:
+        db_table = 'payment_attempts'
+        verbose_name = 'Lần tạo thanh toán'
+        verbose_name_plural = 'Lần tạo thanh toán'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['order', 'gateway', 'status', 'expires_at']),
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.reference} -> {self.order_id} ({self.status})"
+
+
+class Refund(models.Model):
+    """
+    Model yêu cầu hoàn tiền cho đơn hàng thanh toán online
+    
+    Được ghi trong cùng transaction khi đơn đã thanh toán qua VNPay / MoMo
+    bị hủy hoặc hoàn trả; worker `process_refunds` gửi tới API hoàn tiền của
+    cổng thanh toán theo lô (có giới hạn tốc độ) và cập nhật đơn hàng.
+    reference là mã yêu cầu hoàn tiền gửi cho cổng, unique nên mỗi sự kiện
+    hủy / hoàn trả chỉ tạo một yêu cầu.
+    """
+    TYPE_CHOICES = [
+        ('full', 'Hoàn toàn bộ'),
+        ('partial', 'Hoàn một phần'),
+    ]
+    
+    REASON_CHOICES = [
+        ('cancelled', 'Hủy đơn hàng'),
+        ('returned', 'Hoàn trả hàng'),
+        ('manual', 'Admin tạo'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Chờ gửi'),
+        ('processing', 'Đang gửi'),
+        ('succeeded', 'Đã hoàn tiền'),
+        ('failed', 'Thất bại'),
+        # Không rõ cổng đã hoàn tiền chưa (timeout): admin kiểm tra rồi xác nhận / gửi lại
+        ('review', 'Cần kiểm tra'),
+    ]
+    
+    # Giữ yêu cầu hoàn tiền khi đơn hàng được chuyển sang bảng lưu trữ
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='refunds',
+        verbose_name='Đơn hàng'
+    )
+    order_number = models.CharField(max_length=50, db_index=True, verbose_name='Mã đơn hàng')
+    gateway = models.CharField(max_length=20, verbose_name='Cổng thanh toán')
+    reference = models.CharField(max_length=100, unique=True, verbose_name='Mã yêu cầu hoàn tiền')
+    amount = models.DecimalField(max_digits=12, decimal_places=0, verbose_name='Số tiền hoàn')
+    refund_type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name='Loại hoàn tiền')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name='Lý do')
+    note = models.CharField(max_length=255, blank=True, verbose_name='Ghi chú')
+    
+    # Trạng thái gửi
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Trạng thái'
+    )
+    attempts = models.IntegerField(default=0, verbose_name='Số lần gửi')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Lần gửi tiếp theo')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Thời điểm nhận xử lý')
+    last_error = models.TextField(blank=True, verbose_name='Lỗi gần nhất')
+    gateway_refund_id = models.CharField(max_length=100, blank=True, verbose_name='Mã hoàn tiền của cổng')
+    response = models.JSONField(default=dict, blank=True, verbose_name='Phản hồi từ cổng')
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày hoàn tiền')
+    
+    class Meta:
+        db_table = 'refunds'
+        verbose_name = 'Hoàn tiền'
+        verbose_name_plural = 'Hoàn tiền'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.reference} {self.amount} ({self.status})"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Model bảng tổng hợp doanh số theo ngày
+    
+    Mỗi dòng là số đơn, doanh thu (tổng total) và số sản phẩm của các đơn
+    tạo trong một ngày (giờ địa phương) theo (trạng thái, phương thức thanh
+    toán, trạng thái thanh toán). Được cập nhật trong cùng transaction khi
+    tạo đơn và khi đổi trạng thái / thanh toán (orders.rollups); tính lại
+    bằng lệnh `rebuild_sales_rollup`. Đơn đã lưu trữ vẫn được tính.
+    
+    Mỗi khóa được chia thành SALES_ROLLUP_SLOTS mảnh (slot) để các đơn tạo
+    đồng thời không cùng chờ khóa một dòng; số liệu của khóa là tổng các
+    mảnh (một mảnh có thể âm).
+    """
+    date = models.DateField(verbose_name='Ngày')
+    status = models.CharField(max_length=20, verbose_name='Trạng thái')
+    payment_method = models.CharField(max_length=20, verbose_name='Phương thức thanh toán')
+    payment_status = models.CharField(max_length=20, verbose_name='Trạng thái thanh toán')
+    slot = models.SmallIntegerField(default=0, verbose_name='Mảnh')
+    order_count = models.IntegerField(default=0, verbose_name='Số đơn hàng')
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='Doanh thu')
+    item_count = models.IntegerField(default=0, verbose_name='Số sản phẩm')
+    
+    class Meta:
+        db_table = 'daily_sales_rollup'
+        verbose_name = 'Doanh số theo ngày'
+        verbose_name_plural = 'Doanh số theo ngày'
+        ordering = ['date', 'status', 'payment_method', 'payment_status', 'slot']
+        unique_together = ['date', 'status', 'payment_method', 'payment_status', 'slot']
+    
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_method}/{self.payment_status}#{self.slot}: {self.order_count}"
+
+
+class DailyProductSales(models.Model):
+    """
+    Model doanh số theo ngày của từng sản phẩm
+    
+    Chỉ tính đơn đã giao và đã thanh toán (delivered + paid), theo ngày tạo
+    đơn (giờ địa phương); báo cáo theo danh mục được tổng hợp từ bảng này.
+    Cập nhật cùng bảng DailySalesRollup (orders.rollups).
+    """
+    date = models.DateField(verbose_name='Ngày')
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales',
+        verbose_name='Sản phẩm'
+    )
+    units = models.IntegerField(default=0, verbose_name='Số lượng bán')
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='Doanh thu')
+    order_count = models.IntegerField(default=0, verbose_name='Số đơn hàng')
+    
+    class Meta:
+        db_table = 'daily_product_sales'
+        verbose_name = 'Doanh số sản phẩm theo ngày'
+        verbose_name_plural = 'Doanh số sản phẩm theo ngày'
+        ordering = ['date', 'product']
+        unique_together = ['date', 'product']
+    
+    def __str__(self):
+        return f"{self.date} #{self.product_id}: {self.units}"
@@ -4,11 +4,15 @@ Documentation: https://developers.momo.vn/
 """
 import hashlib
 import hmac
-import json
-import requests
+import logging
 from typing import Dict, Optional
 import uuid
 
+from .gateway_client import get_client, CircuitOpenError, GatewayError
+
+
+logger = logging.getLogger(__name__)
+
 
 class MoMo:
     """MoMo Payment Gateway Handler"""
@@ -39,6 +43,15 @@ class MoMo:
         self.api_url = api_url
         self.return_url = return_url
         self.notify_url = notify_url or return_url
+        
+        # Secret key được encode một lần; mỗi chữ ký copy() từ HMAC đã khởi tạo
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+    
+    def sign(self, raw_signature: str) -> str:
+        """Tạo HMAC SHA256 cho chuỗi raw signature"""
+        mac = self._hmac.copy()
+        mac.update(raw_signature.encode('utf-8'))
+        return mac.hexdigest()
     
     def create_payment_url(
         self,
@@ -102,36 +115,27 @@ class MoMo:
         )
         
         # Tạo signature bằng HMAC SHA256
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            raw_signature.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        signature = self.sign(raw_signature)
         
         request_data['signature'] = signature
         
-        # Debug log
-        print("\n=== MOMO CREATE PAYMENT DEBUG ===")
-        print(f"Request ID: {request_id}")
-        print(f"Order ID: {order_id}")
-        print(f"Amount: {request_data['amount']}")
-        print(f"Raw signature: {raw_signature[:100]}...")
-        print(f"Signature: {signature}")
-        print("=" * 50)
+        logger.debug('momo.create_payment', extra={
+            'order_number': order_id,
+            'request_id': request_id,
+            'amount': request_data['amount']
+        })
         
         try:
-            # Gửi request tới MoMo
-            response = requests.post(
-                self.api_url,
-                json=request_data,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
+            # Gửi request tới MoMo qua client dùng chung (pool kết nối, timeout ngắn,
+            # circuit breaker); requestId cố định nên thử lại không tạo giao dịch trùng
+            result = get_client('momo').post_json(self.api_url, request_data, idempotent=True)
             
-            result = response.json()
-            
-            print(f"MoMo Response: {result}")
-            print("=" * 50)
+            logger.info('momo.create_payment_response', extra={
+                'order_number': order_id,
+                'request_id': request_id,
+                'result_code': result.get('resultCode'),
+                'response_message': result.get('message')
+            })
             
             if result.get('resultCode') == 0:
                 return {
@@ -148,14 +152,20 @@ class MoMo:
                     'result_code': result.get('resultCode')
                 }
                 
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling MoMo API: {str(e)}")
+        except CircuitOpenError:
+            logger.warning('momo.circuit_open', extra={'order_number': order_id})
+            return {
+                'success': False,
+                'error': 'Cổng thanh toán MoMo tạm thời không khả dụng, vui lòng thử lại sau'
+            }
+        except GatewayError as e:
+            logger.warning('momo.create_payment_failed', extra={'order_number': order_id, 'error': str(e)})
             return {
                 'success': False,
                 'error': f'Network error: {str(e)}'
             }
         except Exception as e:
-            print(f"Error creating MoMo payment: {str(e)}")
+            logger.exception('momo.create_payment_error', extra={'order_number': order_id})
             return {
                 'success': False,
                 'error': str(e)
@@ -193,22 +203,15 @@ class MoMo:
         )
         
         # Tính signature
-        calculated_signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            raw_signature.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Debug log
-        print("\n=== MOMO VALIDATE RESPONSE DEBUG ===")
-        print(f"Raw signature: {raw_signature[:100]}...")
-        print(f"Received signature:   {received_signature[:40]}...")
-        print(f"Calculated signature: {calculated_signature[:40]}...")
-        print(f"Match: {calculated_signature == received_signature}")
-        print("=" * 50)
+        calculated_signature = self.sign(raw_signature)
         
         # Validate signature
-        is_valid = calculated_signature == received_signature
+        is_valid = hmac.compare_digest(calculated_signature.encode(), str(received_signature).encode())
+        logger.debug('momo.validate_response', extra={
+            'order_number': data.get('orderId', ''),
+            'result_code': data.get('resultCode', ''),
+            'valid': is_valid
+        })
         
         # Parse result
         result_code = int(data.get('resultCode', -1))
@@ -303,29 +306,63 @@ class MoMo:
             f"&requestId={query_request_id}"
         )
         
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            raw_signature.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        signature = self.sign(raw_signature)
         
         request_data['signature'] = signature
         
         try:
             # Gọi API query (endpoint khác với create payment)
             query_url = self.api_url.replace('/create', '/query')
-            response = requests.post(
-                query_url,
-                json=request_data,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
-            
-            result = response.json()
-            return result
+            return get_client('momo').post_json(query_url, request_data, idempotent=True)
             
         except Exception as e:
-            print(f"Error querying transaction: {str(e)}")
+            logger.warning('momo.query_failed', extra={'order_number': order_id, 'error': str(e)})
+            return {
+                'resultCode': -1,
+                'message': str(e)
+            }
+    
+    def refund(self, refund_id: str, amount: float, trans_id: str, description: str = '') -> Dict[str, any]:
+        """
+        Hoàn tiền giao dịch
+        
+        Args:
+            refund_id: Mã yêu cầu hoàn tiền (orderId của giao dịch hoàn, unique)
+            amount: Số tiền hoàn (VNĐ)
+            trans_id: Mã giao dịch MoMo của lần thanh toán
+            description: Mô tả
+        
+        Returns:
+            Dict response của MoMo (resultCode -1 nếu không gửi được)
+        """
+        request_id = str(uuid.uuid4())
+        request_data = {
+            'partnerCode': self.partner_code,
+            'orderId': refund_id,
+            'requestId': request_id,
+            'amount': int(amount),
+            'transId': int(trans_id) if str(trans_id).isdigit() else trans_id,
+            'lang': 'vi',
+            'description': description
+        }
+        
+        raw_signature = (
+            f"accessKey={self.access_key}"
+            f"&amount={request_data['amount']}"
+            f"&description={description}"
+            f"&orderId={refund_id}"
+            f"&partnerCode={self.partner_code}"
+            f"&requestId={request_id}"
+            f"&transId={trans_id}"
+        )
+        request_data['signature'] = self.sign(raw_signature)
+        
+        try:
+            # orderId của giao dịch hoàn là unique nên MoMo không hoàn trùng khi thử lại
+            refund_url = self.api_url.replace('/create', '/refund')
+            return get_client('momo').post_json(refund_url, request_data, idempotent=True)
+        except (CircuitOpenError, GatewayError) as e:
+            logger.warning('momo.refund_failed', extra={'refund_id': refund_id, 'error': str(e)})
             return {
                 'resultCode': -1,
                 'message': str(e)
@@ -0,0 +1,369 @@
+"""
+Registry cổng thanh toán
+
+Mỗi cổng thanh toán (VNPay, MoMo...) được khởi tạo một lần cho mỗi process
+từ settings (secret key encode sẵn, HMAC khởi tạo sẵn) và dùng chung qua
+get_provider(). Các provider có chung interface:
+
+- create_payment(order, ip_address, expires_at): tạo yêu cầu thanh toán -> PaymentRequest
+- verify_callback(data): kiểm tra chữ ký return URL / IPN -> CallbackResult
+- query_transaction(order): truy vấn trạng thái giao dịch -> TransactionStatus
+- ipn_response(data, outcome): body trả về cho IPN theo định dạng của cổng
+- refund(order, refund, reference): gửi yêu cầu hoàn tiền -> RefundResult
+
+View chỉ gọi qua interface này; thêm cổng thanh toán mới là thêm một lớp
+provider và đăng ký vào PROVIDER_CLASSES.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .momo import MoMo
+from .vnpay import VNPay
+
+
+PaymentRequest = namedtuple('PaymentRequest', ['payment_url', 'reference', 'extra'])
+
+CallbackResult = namedtuple('CallbackResult', [
+    'is_valid', 'is_success', 'order_number', 'amount', 'transaction_id',
+    'bank_code', 'bank_transaction_no', 'message', 'data'
+])
+
+# status: 'paid' | 'pending' | 'failed' | 'error' (không truy vấn được)
+TransactionStatus = namedtuple('TransactionStatus', ['status', 'transaction_id', 'amount', 'message', 'data'])
+
+# status: 'succeeded' | 'failed' (cổng từ chối) | 'error' (không gửi được, thử lại sau)
+# | 'unknown' (không rõ cổng đã hoàn tiền chưa, không gửi lại)
+RefundResult = namedtuple('RefundResult', ['status', 'refund_id', 'message', 'data'])
+
+# Kết quả xử lý IPN (mỗi cổng tự đổi sang mã riêng)
+IPN_OK = 'ok'
+IPN_INVALID_SIGNATURE = 'invalid_signature'
+IPN_ORDER_NOT_FOUND = 'order_not_found'
+IPN_INVALID_AMOUNT = 'invalid_amount'
+IPN_ALREADY_CONFIRMED = 'already_confirmed'
+IPN_ERROR = 'error'
+
+
+class PaymentProviderError(Exception):
+    """Lỗi khi tạo / truy vấn giao dịch ở cổng thanh toán"""
+
+
+class PaymentProvider:
+    """Interface chung của cổng thanh toán"""
+    name = ''
+    label = ''
+
+    def create_payment(self, order, ip_address='127.0.0.1', expires_at=None):
+        raise NotImplementedError
+
+    def verify_callback(self, data):
+        raise NotImplementedError
+
+    def query_transaction(self, order, reference=None):
+        raise NotImplementedError
+
+    def ipn_response(self, data, outcome, message=''):
+        raise NotImplementedError
+
+    def refund(self, order, refund, reference=None):
+        raise NotImplementedError
+
+    def order_description(self, order):
+        return f"Thanh toan don hang {order.order_number}"
+
+
+class VNPayProvider(PaymentProvider):
+    name = 'vnpay'
+    label = 'VNPay'
+
+    IPN_CODES = {
+        IPN_OK: ('00', 'Confirm Success'),
+        IPN_ALREADY_CONFIRMED: ('02', 'Order already confirmed'),
+        IPN_ORDER_NOT_FOUND: ('01', 'Order not found'),
+        IPN_INVALID_AMOUNT: ('04', 'Invalid amount'),
+        IPN_INVALID_SIGNATURE: ('97', 'Invalid signature'),
+        IPN_ERROR: ('99', 'Unknown error'),
+    }
+
+    def __init__(self):
+        self.client = VNPay(
+            vnp_tmn_code=settings.VNPAY_TMN_CODE,
+            vnp_hash_secret=settings.VNPAY_HASH_SECRET,
+            vnp_url=settings.VNPAY_URL,
+            vnp_return_url=settings.VNPAY_RETURN_URL,
+            vnp_api_url=settings.VNPAY_API_URL
+        )
+
+    def create_payment(self, order, ip_address='127.0.0.1', expires_at=None):
+        # vnp_CreateDate được giữ lại làm reference để truy vấn giao dịch (querydr)
+        create_date = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        expire_date = timezone.localtime(expires_at).strftime('%Y%m%d%H%M%S') if expires_at else None
+        payment_url = self.client.create_payment_url(
+            order_id=order.order_number,
+            amount=float(order.total),
+            order_desc=self.order_description(order),
+            order_type='other',
+            language='vn',
+            ip_address=ip_address,
+            create_date=create_date,
+            expire_date=expire_date
+        )
+        return PaymentRequest(payment_url, create_date, {})
+
+    def verify_callback(self, data):
+        result = self.client.validate_response(data)
+        return CallbackResult(
+            is_valid=result['is_valid'],
+            is_success=result['is_success'],
+            order_number=result['order_id'],
+            amount=result['amount'],
+            transaction_id=result['transaction_no'],
+            bank_code=result['bank_code'],
+            bank_transaction_no=result.get('bank_tran_no', ''),
+            message=result['message'],
+            data=result
+        )
+
+    def query_transaction(self, order, reference=None):
+        """
+        Truy vấn giao dịch qua querydr
+
+        reference là vnp_CreateDate lúc tạo URL thanh toán; nếu không có thì
+        dùng thời gian tạo đơn hàng.
+        """
+        transaction_date = reference or timezone.localtime(order.created_at).strftime('%Y%m%d%H%M%S')
+        data = self.client.query_transaction(order.order_number, transaction_date)
+
+        response_code = data.get('vnp_ResponseCode')
+        message = data.get('vnp_Message', '')
+        if response_code == '-1':
+            return TransactionStatus('error', '', None, message, data)
+        if response_code != '00':
+            # 91: không tìm thấy giao dịch (khách chưa vào trang thanh toán)
+            status = 'pending' if response_code == '91' else 'error'
+            return TransactionStatus(status, '', None, message, data)
+
+        transaction_status = data.get('vnp_TransactionStatus')
+        if transaction_status == '00':
+            status = 'paid'
+        elif transaction_status == '01':
+            status = 'pending'
+        else:
+            status = 'failed'
+        amount = int(data.get('vnp_Amount') or 0) / 100
+        return TransactionStatus(status, data.get('vnp_TransactionNo', ''), amount, message, data)
+
+    def ipn_response(self, data, outcome, message=''):
+        code, default_message = self.IPN_CODES[outcome]
+        return {'RspCode': code, 'Message': message or default_message}
+
+    # -1: chưa tới VNPay, 94: yêu cầu trùng, 99: lỗi không xác định -> thử lại sau
+    REFUND_RETRY_CODES = {'-1', '94', '99'}
+
+    def refund(self, order, refund, reference=None):
+        """reference là vnp_CreateDate của lần thanh toán (mặc định: thời gian tạo đơn hàng)"""
+        transaction_date = reference or timezone.localtime(order.created_at).strftime('%Y%m%d%H%M%S')
+        data = self.client.refund(
+            order_id=order.order_number,
+            amount=float(refund.amount),
+            transaction_no=order.transaction_id,
+            transaction_date=transaction_date,
+            full=refund.refund_type == 'full'
+        )
+        response_code = data.get('vnp_ResponseCode')
+        message = data.get('vnp_Message', '')
+        if response_code == '00':
+            return RefundResult('succeeded', data.get('vnp_TransactionNo', ''), message, data)
+        if response_code == '-2':
+            return RefundResult('unknown', '', message, data)
+        status = 'error' if response_code in self.REFUND_RETRY_CODES or response_code is None else 'failed'
+        return RefundResult(status, '', message, data)
+
+
+class MoMoProvider(PaymentProvider):
+    name = 'momo'
+    label = 'MoMo'
+
+    PENDING_CODES = {1000, 7000, 7002, 8000, 9000}
+    IPN_CODES = {
+        IPN_OK: (0, 'Success'),
+        IPN_ALREADY_CONFIRMED: (0, 'Success'),
+        # Lỗi phía đơn hàng: vẫn xác nhận đã nhận IPN để MoMo không gửi lại
+        IPN_ORDER_NOT_FOUND: (0, 'Success'),
+        IPN_INVALID_AMOUNT: (0, 'Success'),
+        IPN_INVALID_SIGNATURE: (97, 'Invalid signature'),
+        IPN_ERROR: (99, 'Unknown error'),
+    }
+
+    def __init__(self):
+        self.client = MoMo(
+            partner_code=settings.MOMO_PARTNER_CODE,
+            access_key=settings.MOMO_ACCESS_KEY,
+            secret_key=settings.MOMO_SECRET_KEY,
+            api_url=settings.MOMO_API_URL,
+            return_url=settings.MOMO_RETURN_URL,
+            notify_url=settings.MOMO_NOTIFY_URL
+        )
+
+    def create_payment(self, order, ip_address='127.0.0.1', expires_at=None):
+        # URL MoMo có thời hạn riêng (dài hơn thời hạn của PaymentAttempt)
+        result = self.client.create_payment_url(
+            order_id=order.order_number,
+            amount=float(order.total),
+            order_info=self.order_description(order),
+            lang='vi'
+        )
+        if not result['success']:
+            raise PaymentProviderError(result.get('error', 'Lỗi tạo payment request'))
+
+        return PaymentRequest(result['payment_url'], result['request_id'], {
+            'deep_link': result.get('deep_link'),
+            'qr_code_url': result.get('qr_code_url')
+        })
+
+    def verify_callback(self, data):
+        result = self.client.validate_response(data)
+        return CallbackResult(
+            is_valid=result['is_valid'],
+            is_success=result['is_success'],
+            order_number=result['order_id'],
+            amount=result['amount'],
+            transaction_id=str(result['trans_id']),
+            bank_code='',
+            bank_transaction_no=result['request_id'],
+            message=result['error_message'],
+            data=result
+        )
+
+    def query_transaction(self, order, reference=None):
+        data = self.client.query_transaction_status(order.order_number, reference or '')
+        result_code = data.get('resultCode')
+        message = data.get('message', '')
+        if result_code == 0:
+            status = 'paid'
+        elif result_code in self.PENDING_CODES:
+            status = 'pending'
+        elif result_code == -1 or result_code is None:
+            status = 'error'
+        else:
+            status = 'failed'
+        return TransactionStatus(status, str(data.get('transId') or ''), data.get('amount'), message, data)
+
+    def ipn_response(self, data, outcome, message=''):
+        code, default_message = self.IPN_CODES[outcome]
+        return {
+            'partnerCode': self.client.partner_code,
+            'requestId': data.get('requestId', ''),
+            'orderId': data.get('orderId', ''),
+            'resultCode': code,
+            'message': message or default_message
+        }
+
+    def refund(self, order, refund, reference=None):
+        data = self.client.refund(
+            refund_id=refund.reference,
+            amount=float(refund.amount),
+            trans_id=order.transaction_id,
+            description=f"Hoan tien don hang {order.order_number}"
+        )
+        result_code = data.get('resultCode')
+        message = data.get('message', '')
+        if result_code == 0:
+            return RefundResult('succeeded', str(data.get('transId') or ''), message, data)
+        if result_code in (-1, 99, None) or result_code in self.PENDING_CODES:
+            return RefundResult('error', '', message, data)
+        return RefundResult('failed', '', message, data)
+
+
+class FakeProvider(PaymentProvider):
+    """
+    Cổng thanh toán giả lập chạy offline (đối soát / kiểm thử)
+
+    Kết quả truy vấn được suy ra cố định từ mã đơn hàng theo tỉ lệ
+    paid / failed / pending (còn lại), kết quả hoàn tiền từ mã yêu cầu hoàn
+    tiền theo refund_failed_ratio; có độ trễ giả lập.
+    """
+    label = 'Fake'
+
+    def __init__(self, name='fake', latency=0.05, paid_ratio=0.6, failed_ratio=0.2, refund_failed_ratio=0.0):
+        self.name = name
+        self.latency = latency
+        self.paid_ratio = paid_ratio
+        self.failed_ratio = failed_ratio
+        self.refund_failed_ratio = refund_failed_ratio
+
+    def _bucket(self, value):
+        return int(hashlib.sha256(value.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+    def _outcome(self, order_number):
+        bucket = self._bucket(order_number)
+        if bucket < self.paid_ratio:
+            return 'paid'
+        if bucket < self.paid_ratio + self.failed_ratio:
+            return 'failed'
+        return 'pending'
+
+    def create_payment(self, order, ip_address='127.0.0.1', expires_at=None):
+        return PaymentRequest(f'https://fake-gateway.local/pay/{order.order_number}', order.order_number, {})
+
+    def verify_callback(self, data):
+        return CallbackResult(
+            is_valid=True,
+            is_success=data.get('status') == 'paid',
+            order_number=data.get('order_number', ''),
+            amount=data.get('amount'),
+            transaction_id=data.get('transaction_id', ''),
+            bank_code='',
+            bank_transaction_no='',
+            message='',
+            data=data
+        )
+
+    def query_transaction(self, order, reference=None):
+        time.sleep(self.latency)
+        status = self._outcome(order.order_number)
+        transaction_id = f'FAKE{order.order_number[-10:]}' if status == 'paid' else ''
+        return TransactionStatus(status, transaction_id, order.total, 'Fake gateway', {})
+
+    def ipn_response(self, data, outcome, message=''):
+        return {'outcome': outcome, 'message': message}
+
+    def refund(self, order, refund, reference=None):
+        time.sleep(self.latency)
+        if self._bucket(refund.reference) < self.refund_failed_ratio:
+            return RefundResult('failed', '', 'Fake gateway từ chối hoàn tiền', {})
+        return RefundResult('succeeded', f'FAKERF{refund.reference[-12:]}', 'Fake gateway', {})
+
+
+PROVIDER_CLASSES = {
+    VNPayProvider.name: VNPayProvider,
+    MoMoProvider.name: MoMoProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    """
+    Lấy provider dùng chung của process
+
+    Raises:
+        PaymentProviderError: cổng thanh toán không được hỗ trợ
+    """
+    provider = _providers.get(name)
+    if provider is not None:
+        return provider
+
+    if name not in PROVIDER_CLASSES:
+        raise PaymentProviderError(f'Cổng thanh toán {name} không được hỗ trợ')
+
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = PROVIDER_CLASSES[name]()
+        return _providers[name]
@@ -0,0 +1,403 @@
+"""
+Cập nhật trạng thái thanh toán của đơn hàng
+
+- transition_payment: mọi thay đổi payment_status đi qua câu UPDATE có
+  điều kiện (WHERE payment_status = trạng thái trước hợp lệ), tăng
+  payment_version và cho biết lần gọi này có thắng hay không. Return URL
+  và IPN tới cùng lúc không ghi đè nhau, không cần khóa dòng.
+- mark_paid / mark_failed: dùng chung cho return URL, IPN và đối soát
+- get_or_create_attempt: khách bấm thanh toán nhiều lần được dùng lại URL
+  thanh toán (PaymentAttempt) còn hiệu lực, không gọi lại cổng thanh toán;
+  gọi cổng ngoài transaction (dòng 'creating' giữ chỗ cho lần tạo đang
+  chạy); expire_attempts đánh dấu hết hạn theo lô
+- Inbox sự kiện thanh toán (PaymentEvent): IPN chỉ được kiểm tra chữ ký và
+  ghi lại (record_event), worker `process_payment_events` nhận từng lô sự
+  kiện và cập nhật đơn hàng. Sự kiện của cùng một đơn hàng được xử lý tuần
+  tự theo thứ tự nhận; đơn đã thanh toán không bị sự kiện đến sau (trùng,
+  thất bại) ghi đè.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from backend import work_queue
+from notifications import outbox
+from .models import Order, PaymentAttempt, PaymentEvent
+from .payment_providers import PaymentProviderError
+from . import refunds, rollups, state_machine, tracking
+
+
+# Sự kiện chưa xử lý xong: chặn các sự kiện đến sau của cùng đơn hàng
+OPEN_EVENT_STATUSES = ['pending', 'processing', 'failed']
+
+# Không dùng lại URL thanh toán sắp hết hạn (khách cần thời gian nhập thông tin)
+ATTEMPT_REUSE_MARGIN = timedelta(minutes=2)
+
+# Lần tạo đang gọi cổng thanh toán quá thời gian này (process chết giữa
+# chừng) không còn chặn lần tạo mới
+ATTEMPT_CREATING_TIMEOUT = timedelta(minutes=1)
+ATTEMPT_POLL_INTERVAL = 0.2
+
+
+# Trạng thái thanh toán mới -> các trạng thái trước được phép
+PAYMENT_TRANSITIONS = {
+    'paid': ['pending', 'failed'],
+    'failed': ['pending'],
+    'refunded': ['paid'],
+}
+
+PAYMENT_FIELDS = ['payment_status', 'payment_version', 'transaction_id', 'bank_code', 'bank_transaction_no']
+
+
+def transition_payment(order, new_status, expected_version=None, **fields):
+    """
+    Chuyển trạng thái thanh toán bằng câu UPDATE có điều kiện
+
+    Chỉ cập nhật khi payment_status hiện tại là trạng thái trước hợp lệ
+    (và payment_version bằng expected_version nếu có truyền), chỉ ghi
+    payment_status, payment_version, updated_at và các field truyền vào.
+
+    Returns:
+        True nếu lần gọi này đã chuyển trạng thái; False nếu thua (instance
+        được nạp lại các field thanh toán hiện tại)
+    """
+    filters = {'pk': order.pk}
+    if expected_version is not None:
+        filters['payment_version'] = expected_version
+
+    now = timezone.now()
+    # Một câu UPDATE cho mỗi trạng thái trước hợp lệ: biết trạng thái cũ để
+    # chuyển số liệu trong bảng tổng hợp doanh số mà không cần khóa đọc trước
+    with transaction.atomic():
+        for previous_status in PAYMENT_TRANSITIONS[new_status]:
+            updated = Order.objects.filter(payment_status=previous_status, **filters).update(
+                payment_status=new_status,
+                payment_version=F('payment_version') + 1,
+                updated_at=now,
+                **fields
+            )
+            if updated:
+                rollups.record_payment_change([order.pk], previous_status)
+                break
+    if not updated:
+        order.refresh_from_db(fields=PAYMENT_FIELDS)
+        return False
+
+    order.payment_status = new_status
+    order.payment_version = (order.payment_version if expected_version is None else expected_version) + 1
+    order.updated_at = now
+    for field, value in fields.items():
+        setattr(order, field, value)
+    return True
+
+
+def mark_paid(order, result, source):
+    """
+    Ghi thông tin giao dịch và xác nhận đơn hàng đã thanh toán
+
+    Args:
+        result: CallbackResult (hoặc object có transaction_id, bank_code, bank_transaction_no)
+
+    Returns:
+        True nếu lần gọi này ghi nhận thanh toán (False: đã được ghi nhận trước đó)
+    """
+    fields = {
+        'transaction_id': result.transaction_id,
+        'bank_transaction_no': result.bank_transaction_no,
+    }
+    if result.bank_code:
+        fields['bank_code'] = result.bank_code
+
+    with transaction.atomic():
+        if not transition_payment(order, 'paid', **fields):
+            return False
+
+        # Đọc lại trạng thái đơn (dòng đã bị khóa bởi UPDATE ở trên): đơn có thể
+        # vừa bị hủy trong lúc chờ thanh toán
+        order.status = Order.objects.filter(pk=order.pk).values_list('status', flat=True).get()
+
+        if state_machine.can_transition(order.status, 'confirmed'):
+            state_machine.transition(
+                order,
+                'confirmed',
+                source=source,
+                note='Thanh toán online thành công',
+                notify=False,
+                update_fields=[]
+            )
+        else:
+            tracking.refresh_on_commit([order.pk])
+            # Đơn đã bị hủy trong lúc chờ thanh toán: hoàn lại tiền
+            if order.status in refunds.REFUND_STATUSES:
+                refunds.enqueue_for_orders([order.pk], order.status)
+
+        PaymentAttempt.objects.filter(order_id=order.pk, status='active').update(status='completed')
+        outbox.enqueue_order_event('payment_succeeded', order)
+    return True
+
+
+def mark_failed(order):
+    """
+    Ghi nhận thanh toán thất bại (không ghi đè đơn đã thanh toán)
+
+    Returns:
+        True nếu trạng thái thanh toán đã được chuyển sang failed
+    """
+    if not transition_payment(order, 'failed'):
+        return False
+    tracking.refresh_on_commit([order.pk])
+    return True
+
+
+# Lần tạo thanh toán -----------------------------------------------------
+
+
+def _reserve_attempt(order, provider, expires_at):
+    """
+    Tìm lần tạo dùng lại được hoặc giữ chỗ cho lần tạo mới (transaction ngắn)
+
+    Dòng đơn hàng chỉ bị khóa trong lúc kiểm tra, không trong lúc gọi cổng.
+
+    Returns:
+        (PaymentAttempt, trạng thái): 'active' (dùng lại được), 'creating'
+        (lần gọi này giữ chỗ, cần gọi cổng) hoặc 'waiting' (request khác đang tạo)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Order.objects.select_for_update().only('id').get(pk=order.pk)
+
+        attempts = PaymentAttempt.objects.filter(order_id=order.pk, gateway=provider.name)
+        attempt = attempts.filter(
+            status='active',
+            amount=order.total,
+            expires_at__gt=now + ATTEMPT_REUSE_MARGIN
+        ).order_by('-created_at').first()
+        if attempt is not None:
+            return attempt, 'active'
+
+        attempt = attempts.filter(
+            status='creating',
+            created_at__gt=now - ATTEMPT_CREATING_TIMEOUT
+        ).order_by('-created_at').first()
+        if attempt is not None:
+            return attempt, 'waiting'
+
+        attempt = PaymentAttempt.objects.create(
+            order=order,
+            gateway=provider.name,
+            amount=order.total,
+            payment_url='',
+            status='creating',
+            expires_at=expires_at
+        )
+        return attempt, 'creating'
+
+
+def get_or_create_attempt(order, provider, ip_address='127.0.0.1'):
+    """
+    Lấy URL thanh toán còn hiệu lực của đơn hàng, hoặc tạo mới qua provider
+
+    Không giữ transaction / khóa dòng đơn hàng trong lúc gọi cổng thanh toán
+    (IPN, return URL và đổi trạng thái đơn không phải chờ): lần tạo mới được
+    giữ chỗ bằng một dòng 'creating' rồi mới gọi cổng. Các lần bấm đồng thời
+    chờ dòng này xong và dùng chung kết quả. Lần tạo cũ (khác số tiền, sắp
+    hết hạn) được đánh dấu hết hạn.
+
+    Returns:
+        (PaymentAttempt, created)
+
+    Raises:
+        PaymentProviderError: cổng thanh toán từ chối tạo giao dịch, hoặc
+            request khác vẫn đang tạo sau ATTEMPT_CREATING_TIMEOUT
+    """
+    expires_at = timezone.now() + timedelta(minutes=settings.PAYMENT_ATTEMPT_TTL_MINUTES)
+    deadline = time.monotonic() + ATTEMPT_CREATING_TIMEOUT.total_seconds()
+    while True:
+        attempt, state = _reserve_attempt(order, provider, expires_at)
+        if state == 'active':
+            return attempt, False
+        if state == 'creating':
+            break
+        if time.monotonic() >= deadline:
+            raise PaymentProviderError('Đang tạo yêu cầu thanh toán, vui lòng thử lại sau')
+        time.sleep(ATTEMPT_POLL_INTERVAL)
+
+    try:
+        payment = provider.create_payment(order, ip_address=ip_address, expires_at=expires_at)
+    except BaseException:
+        PaymentAttempt.objects.filter(pk=attempt.pk, status='creating').delete()
+        raise
+
+    attempt.reference = str(payment.reference)[:100]
+    attempt.payment_url = payment.payment_url
+    attempt.response = payment.extra
+    attempt.status = 'active'
+    with transaction.atomic():
+        PaymentAttempt.objects.filter(
+            order_id=order.pk, gateway=provider.name, status='active'
+        ).update(status='expired')
+        PaymentAttempt.objects.filter(pk=attempt.pk, status='creating').update(
+            reference=attempt.reference,
+            payment_url=attempt.payment_url,
+            response=attempt.response,
+            status='active'
+        )
+    return attempt, True
+
+
+def expire_attempts():
+    """
+    Đánh dấu hết hạn mọi lần tạo thanh toán đã quá hạn, kể cả dòng 'creating'
+    bị bỏ dở (process chết khi đang gọi cổng)
+    """
+    now = timezone.now()
+    return PaymentAttempt.objects.filter(
+        Q(status='active', expires_at__lte=now) |
+        Q(status='creating', created_at__lte=now - ATTEMPT_CREATING_TIMEOUT)
+    ).update(status='expired')
+
+
+def latest_references(order_ids):
+    """Mã tham chiếu của lần tạo thanh toán gần nhất theo đơn hàng: {order_id: reference}"""
+    references = {}
+    rows = PaymentAttempt.objects.filter(
+        order_id__in=order_ids
+    ).exclude(status='creating').order_by('order_id', '-created_at').values_list('order_id', 'reference')
+    for order_id, reference in rows:
+        references.setdefault(order_id, reference)
+    return references
+
+
+# Inbox sự kiện ----------------------------------------------------------
+
+
+def _event_key(result, data):
+    """
+    Khóa chống trùng của sự kiện: mã giao dịch của cổng thanh toán
+
+    Giao dịch thất bại có thể không có mã (VNPay trả vnp_TransactionNo=0),
+    khi đó dùng mã đơn hàng + hash nội dung IPN.
+    """
+    if result.transaction_id and result.transaction_id != '0':
+        return str(result.transaction_id)[:100]
+    digest = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{result.order_number}:{digest[:32]}"[:100]
+
+
+def _to_amount(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('1'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def record_event(gateway, result, data):
+    """
+    Ghi sự kiện IPN đã kiểm tra chữ ký vào inbox
+
+    Returns:
+        True nếu là sự kiện mới, False nếu trùng với sự kiện đã nhận
+    """
+    try:
+        with transaction.atomic():
+            PaymentEvent.objects.create(
+                gateway=gateway,
+                transaction_id=_event_key(result, data),
+                order_number=result.order_number[:50],
+                is_success=result.is_success,
+                amount=_to_amount(result.amount),
+                bank_code=result.bank_code[:50],
+                bank_transaction_no=str(result.bank_transaction_no)[:100],
+                message=str(result.message)[:255],
+                payload=dict(data)
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def claim_batch(batch_size):
+    """
+    Nhận một lô sự kiện đến hạn và đánh dấu processing
+
+    Mỗi đơn hàng chỉ nhận sự kiện sớm nhất chưa xử lý xong (OPEN_EVENT_STATUSES):
+    sự kiện đến sau phải chờ sự kiện trước được xử lý, kể cả khi sự kiện trước
+    đang chờ thử lại (backoff) hoặc đã thất bại (admin xử lý lại / bỏ qua),
+    nên các sự kiện của một đơn hàng không bị áp dụng song song hay sai thứ tự.
+    """
+    def accept(events, now):
+        first_open = dict(
+            PaymentEvent.objects.filter(
+                order_number__in={event.order_number for event in events},
+                status__in=OPEN_EVENT_STATUSES
+            ).values('order_number').annotate(first_id=Min('id')).values_list('order_number', 'first_id')
+        )
+        return [event for event in events if first_open.get(event.order_number) == event.id]
+
+    return work_queue.claim_batch(PaymentEvent.objects.all(), batch_size, accept)
+
+
+def apply_event(event):
+    """
+    Áp dụng một sự kiện lên đơn hàng (idempotent, qua UPDATE có điều kiện)
+
+    Returns:
+        (trạng thái sự kiện, ghi chú)
+    """
+    order = Order.objects.filter(order_number=event.order_number).first()
+    if order is None:
+        return 'ignored', 'Không tìm thấy đơn hàng'
+    if order.payment_method != event.gateway:
+        return 'ignored', f'Đơn hàng không thanh toán qua {event.gateway}'
+
+    if not event.is_success:
+        if not mark_failed(order):
+            return 'ignored', f'Trạng thái thanh toán hiện tại: {order.payment_status}'
+        return 'processed', event.message
+
+    if event.amount is not None and event.amount != order.total.quantize(Decimal('1')):
+        return 'ignored', f'Số tiền không khớp: {event.amount} != {order.total}'
+
+    if not mark_paid(order, event, source=event.gateway):
+        return 'ignored', 'Đơn hàng đã được thanh toán'
+    return 'processed', ''
+
+
+def process_batch(events):
+    """
+    Xử lý một lô sự kiện, tuần tự theo thứ tự nhận
+
+    Returns:
+        (số sự kiện đã xử lý, số sự kiện lỗi)
+    """
+    processed = failed = 0
+    for event in events:
+        try:
+            event_status, note = apply_event(event)
+        except Exception as e:
+            failed += 1
+            attempts = event.attempts + 1
+            PaymentEvent.objects.filter(id=event.id).update(
+                attempts=attempts,
+                last_error=(str(e) or e.__class__.__name__)[:1000],
+                locked_at=None,
+                **work_queue.retry_fields(attempts, settings.PAYMENT_EVENT_MAX_ATTEMPTS)
+            )
+            continue
+
+        processed += 1
+        PaymentEvent.objects.filter(id=event.id).update(
+            status=event_status,
+            attempts=event.attempts + 1,
+            last_error=note[:1000],
+            locked_at=None,
+            processed_at=timezone.now()
+        )
+    return processed, failed
@@ -0,0 +1,152 @@
+"""
+Đối soát thanh toán online
+
+Đơn hàng VNPay / MoMo có thể nằm mãi ở payment_status='pending' nếu khách
+đóng trình duyệt trước khi return URL được gọi và IPN không tới. Lệnh
+`reconcile_payments` chọn các đơn này (index payment_method, payment_status,
+created_at), truy vấn trạng thái giao dịch ở cổng thanh toán song song qua
+một thread pool có giới hạn, mỗi cổng có giới hạn tốc độ riêng, rồi ghi kết
+quả theo lô.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order
+from . import payment_providers, payments, rollups, tracking
+
+
+class RateLimiter:
+    """Giới hạn số request mỗi giây (chia đều thời điểm gửi giữa các thread)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def pending_orders(methods, min_age, max_age, limit):
+    """Đơn thanh toán online còn chờ thanh toán, cũ hơn min_age và mới hơn max_age"""
+    now = timezone.now()
+    return list(
+        Order.objects.filter(
+            payment_method__in=methods,
+            payment_status='pending',
+            created_at__gte=now - max_age,
+            created_at__lte=now - min_age
+        ).exclude(
+            status__in=['cancelled', 'returned']
+        ).order_by('created_at')[:limit]
+    )
+
+
+class Reconciler:
+    """
+    Một lần đối soát
+
+    Args:
+        providers: dict phương thức thanh toán -> provider (mặc định: registry)
+    """
+
+    def __init__(self, providers=None, concurrency=None, rate_limits=None, dry_run=False):
+        self.providers = providers or {
+            name: payment_providers.get_provider(name)
+            for name in payment_providers.PROVIDER_CLASSES
+        }
+        self.concurrency = concurrency or settings.RECONCILE_CONCURRENCY
+        rate_limits = rate_limits if rate_limits is not None else settings.RECONCILE_RATE_LIMITS
+        self.limiters = {name: RateLimiter(rate_limits.get(name, 0)) for name in self.providers}
+        self.dry_run = dry_run
+        self.references = {}
+        self.stats = Counter()
+
+    def _query(self, order):
+        self.limiters[order.payment_method].acquire()
+        try:
+            return order, self.providers[order.payment_method].query_transaction(
+                order, reference=self.references.get(order.id)
+            )
+        except Exception as e:
+            return order, payment_providers.TransactionStatus('error', '', None, str(e), {})
+        finally:
+            connection.close()
+
+    def query_all(self, orders):
+        """Truy vấn song song; trả về list (order, TransactionStatus)"""
+        # Truy vấn theo mã tham chiếu của lần tạo thanh toán gần nhất
+        self.references = payments.latest_references([order.id for order in orders])
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1), thread_name_prefix='reconcile') as executor:
+            return list(executor.map(self._query, orders))
+
+    def apply(self, results):
+        """Ghi kết quả: đơn thất bại cập nhật bằng một câu UPDATE, đơn đã thanh toán qua UPDATE có điều kiện"""
+        paid = []
+        failed_ids = []
+        for order, result in results:
+            self.stats[result.status] += 1
+            if result.status == 'failed':
+                failed_ids.append(order.id)
+            elif result.status == 'paid':
+                if result.amount is not None and Decimal(str(result.amount)) != order.total:
+                    self.stats['amount_mismatch'] += 1
+                    continue
+                paid.append((order, result))
+
+        if self.dry_run:
+            return
+
+        if failed_ids:
+            # Chỉ đơn vẫn còn pending (IPN có thể đã tới trong lúc truy vấn)
+            with rollups.tracking(failed_ids):
+                updated = Order.objects.filter(
+                    id__in=failed_ids,
+                    payment_status__in=payments.PAYMENT_TRANSITIONS['failed']
+                ).update(
+                    payment_status='failed',
+                    payment_version=F('payment_version') + 1,
+                    updated_at=timezone.now()
+                )
+            self.stats['marked_failed'] += updated
+            tracking.refresh_on_commit(failed_ids)
+
+        for order, result in paid:
+            won = payments.mark_paid(order, payment_providers.CallbackResult(
+                is_valid=True,
+                is_success=True,
+                order_number=order.order_number,
+                amount=result.amount,
+                transaction_id=result.transaction_id,
+                bank_code='',
+                bank_transaction_no='',
+                message=result.message,
+                data=result.data
+            ), source='reconcile')
+            if won:
+                self.stats['marked_paid'] += 1
+
+    def run(self, min_age, max_age, limit, batch_size=100):
+        """Đối soát tối đa `limit` đơn hàng, truy vấn và ghi theo từng lô"""
+        if not self.dry_run:
+            self.stats['attempts_expired'] = payments.expire_attempts()
+        orders = pending_orders(list(self.providers), min_age, max_age, limit)
+        self.stats['selected'] = len(orders)
+        for start in range(0, len(orders), batch_size):
+            self.apply(self.query_all(orders[start:start + batch_size]))
+        return self.stats
@@ -0,0 +1,282 @@
+"""
+Hoàn tiền đơn hàng thanh toán online
+
+- enqueue_for_orders: khi đơn đã thanh toán qua VNPay / MoMo bị hủy hoặc
+  hoàn trả, ghi yêu cầu hoàn tiền (Refund) trong cùng transaction bằng một
+  câu SELECT và một câu INSERT, nên hủy hàng loạt (hết hàng) không phải chờ
+  cổng thanh toán.
+- create_refund: admin tạo yêu cầu hoàn một phần / toàn bộ.
+- RefundProcessor: worker `process_refunds` nhận từng lô yêu cầu, gửi tới API
+  hoàn tiền của cổng song song (giới hạn tốc độ theo cổng) rồi cập nhật yêu
+  cầu hoàn tiền và số tiền đã hoàn của đơn hàng theo lô. Đơn được hoàn đủ
+  chuyển payment_status sang 'refunded'. Chỉ gửi lại khi chắc chắn yêu cầu
+  chưa tới cổng; không rõ kết quả (timeout) thì chuyển 'review' chờ admin
+  kiểm tra (confirm_refunds / requeue_refunds).
+"""
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend import work_queue
+from .models import Order, Refund
+from . import payment_providers, payments, reconciliation, rollups, tracking
+
+
+# Trạng thái đơn hàng cần hoàn tiền nếu đã thanh toán online
+REFUND_STATUSES = ['cancelled', 'returned']
+
+# Yêu cầu chưa có kết quả cuối cùng (review: có thể cổng đã hoàn tiền)
+OPEN_STATUSES = ['pending', 'processing', 'review']
+
+
+class RefundError(Exception):
+    """Yêu cầu hoàn tiền không hợp lệ"""
+
+
+def _with_queued(queryset):
+    """Annotate queued: tổng tiền các yêu cầu hoàn tiền chưa xử lý xong"""
+    return queryset.annotate(
+        queued=Coalesce(
+            Sum('refunds__amount', filter=Q(refunds__status__in=OPEN_STATUSES)),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=0)
+        )
+    )
+
+
+def enqueue_for_orders(order_ids, reason):
+    """
+    Ghi yêu cầu hoàn phần tiền còn lại của các đơn đã thanh toán online
+
+    Mỗi (đơn hàng, lý do) chỉ tạo một yêu cầu (reference unique).
+
+    Returns:
+        Số yêu cầu hoàn tiền đã ghi
+    """
+    rows = _with_queued(
+        Order.objects.filter(
+            id__in=order_ids,
+            payment_method__in=list(payment_providers.PROVIDER_CLASSES),
+            payment_status='paid'
+        )
+    ).values_list('id', 'order_number', 'payment_method', 'total', 'refunded_amount', 'queued')
+
+    refunds = []
+    for order_id, order_number, gateway, total, refunded_amount, queued in rows:
+        amount = total - refunded_amount - queued
+        if amount <= 0:
+            continue
+        refunds.append(Refund(
+            order_id=order_id,
+            order_number=order_number,
+            gateway=gateway,
+            reference=f"{order_number}-{reason}",
+            amount=amount,
+            refund_type='full' if amount == total else 'partial',
+            reason=reason
+        ))
+
+    if refunds:
+        Refund.objects.bulk_create(refunds, ignore_conflicts=True)
+    return len(refunds)
+
+
+def create_refund(order, amount=None, note=''):
+    """
+    Admin tạo yêu cầu hoàn tiền (một phần hoặc toàn bộ)
+
+    amount=None: hoàn toàn bộ phần chưa hoàn / chưa xếp hàng hoàn.
+
+    Raises:
+        RefundError: đơn hàng không hoàn tiền được hoặc số tiền không hợp lệ
+    """
+    if order.payment_method not in payment_providers.PROVIDER_CLASSES or order.payment_status != 'paid':
+        raise RefundError('Chỉ hoàn tiền được cho đơn đã thanh toán online')
+
+    with transaction.atomic():
+        queued = _with_queued(
+            Order.objects.select_for_update().filter(pk=order.pk)
+        ).values_list('refunded_amount', 'queued').first()
+        if queued is None:
+            raise RefundError('Không tìm thấy đơn hàng')
+
+        refundable = order.total - queued[0] - queued[1]
+        if amount is None:
+            amount = refundable
+        if amount <= 0 or amount > refundable:
+            raise RefundError(f'Số tiền hoàn phải lớn hơn 0 và không quá {refundable}')
+
+        return Refund.objects.create(
+            order=order,
+            order_number=order.order_number,
+            gateway=order.payment_method,
+            reference=f"{order.order_number}-{uuid.uuid4().hex[:8]}",
+            amount=amount,
+            refund_type='full' if amount == order.total else 'partial',
+            reason='manual',
+            note=note[:255]
+        )
+
+
+def _add_refunded(refunded, now):
+    """
+    Cộng số tiền đã hoàn {order_id: số tiền} vào đơn hàng (gọi trong transaction)
+
+    Returns:
+        Số đơn được hoàn đủ (chuyển payment_status sang 'refunded')
+    """
+    if not refunded:
+        return 0
+    Order.objects.filter(id__in=list(refunded)).update(
+        refunded_amount=F('refunded_amount') + Case(
+            *[When(id=order_id, then=Value(amount)) for order_id, amount in refunded.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=0)
+        ),
+        updated_at=now
+    )
+    # Đơn đã hoàn đủ: chuyển trạng thái thanh toán (UPDATE có điều kiện như transition_payment)
+    with rollups.tracking(list(refunded)):
+        updated = Order.objects.filter(
+            id__in=list(refunded),
+            payment_status__in=payments.PAYMENT_TRANSITIONS['refunded'],
+            refunded_amount__gte=F('total')
+        ).update(
+            payment_status='refunded',
+            payment_version=F('payment_version') + 1,
+            updated_at=now
+        )
+    tracking.refresh_on_commit(list(refunded))
+    return updated
+
+
+def confirm_refunds(refund_ids, note=''):
+    """
+    Admin xác nhận các yêu cầu 'review' đã được cổng hoàn tiền (đã kiểm tra
+    trên trang quản trị của cổng)
+
+    Returns:
+        Số yêu cầu đã xác nhận
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        refunds = list(Refund.objects.select_for_update().filter(id__in=refund_ids, status='review'))
+        refunded = defaultdict(Decimal)
+        for refund in refunds:
+            refund.status = 'succeeded'
+            refund.last_error = note[:1000]
+            refund.processed_at = now
+            if refund.order_id:
+                refunded[refund.order_id] += refund.amount
+        Refund.objects.bulk_update(refunds, ['status', 'last_error', 'processed_at'])
+        _add_refunded(refunded, now)
+    return len(refunds)
+
+
+def requeue_refunds(refund_ids):
+    """
+    Admin gửi lại các yêu cầu 'review' / 'failed' (đã kiểm tra cổng chưa hoàn tiền)
+
+    Returns:
+        Số yêu cầu được đưa lại vào hàng đợi
+    """
+    return Refund.objects.filter(id__in=refund_ids, status__in=['review', 'failed']).update(
+        status='pending',
+        attempts=0,
+        next_attempt_at=timezone.now(),
+        processed_at=None
+    )
+
+
+def claim_batch(batch_size):
+    """Nhận một lô yêu cầu hoàn tiền đến hạn và đánh dấu processing"""
+    return work_queue.claim_batch(Refund.objects.select_related('order'), batch_size)
+
+
+class RefundProcessor:
+    """
+    Gửi các lô yêu cầu hoàn tiền
+
+    Args:
+        providers: dict cổng thanh toán -> provider (mặc định: registry)
+    """
+
+    def __init__(self, providers=None, concurrency=None, rate_limits=None):
+        self.providers = providers or {
+            name: payment_providers.get_provider(name)
+            for name in payment_providers.PROVIDER_CLASSES
+        }
+        self.concurrency = concurrency or settings.REFUND_CONCURRENCY
+        rate_limits = rate_limits if rate_limits is not None else settings.REFUND_RATE_LIMITS
+        self.limiters = {name: reconciliation.RateLimiter(rate_limits.get(name, 0)) for name in self.providers}
+        self.references = {}
+        self.stats = Counter()
+
+    def _submit(self, refund):
+        if refund.order is None:
+            return refund, payment_providers.RefundResult('failed', '', 'Không tìm thấy đơn hàng', {})
+        self.limiters[refund.gateway].acquire()
+        try:
+            return refund, self.providers[refund.gateway].refund(
+                refund.order, refund, reference=self.references.get(refund.order_id)
+            )
+        except Exception as e:
+            return refund, payment_providers.RefundResult('error', '', str(e), {})
+        finally:
+            connection.close()
+
+    def submit_all(self, refunds):
+        """Gửi song song; trả về list (refund, RefundResult)"""
+        self.references = payments.latest_references([refund.order_id for refund in refunds])
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1), thread_name_prefix='refund') as executor:
+            return list(executor.map(self._submit, refunds))
+
+    def apply(self, results):
+        """Ghi kết quả của một lô: một câu UPDATE cho yêu cầu hoàn tiền, hai câu cho đơn hàng"""
+        now = timezone.now()
+        refunded = defaultdict(Decimal)
+        for refund, result in results:
+            self.stats[result.status] += 1
+            refund.attempts += 1
+            refund.locked_at = None
+            refund.response = result.data
+            refund.last_error = '' if result.status == 'succeeded' else str(result.message)[:1000]
+
+            if result.status == 'succeeded':
+                refund.status = 'succeeded'
+                refund.gateway_refund_id = str(result.refund_id)[:100]
+                refund.processed_at = now
+                refunded[refund.order_id] += refund.amount
+            elif result.status == 'unknown':
+                refund.status = 'review'
+            elif result.status == 'error' and refund.attempts < settings.REFUND_MAX_ATTEMPTS:
+                refund.status = 'pending'
+                refund.next_attempt_at = now + work_queue.backoff_delay(refund.attempts)
+            else:
+                refund.status = 'failed'
+                refund.processed_at = now
+
+        with transaction.atomic():
+            Refund.objects.bulk_update(
+                [refund for refund, _ in results],
+                ['status', 'attempts', 'next_attempt_at', 'locked_at', 'last_error',
+                 'gateway_refund_id', 'response', 'processed_at']
+            )
+            self.stats['orders_refunded'] += _add_refunded(refunded, now)
+
+    def run(self, batch_size=50, max_batches=None):
+        """Xử lý các lô đến khi không còn yêu cầu đến hạn (hoặc đủ max_batches)"""
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            refunds = claim_batch(batch_size)
+            if not refunds:
+                break
+            self.apply(self.submit_all(refunds))
+            batches += 1
+        return self.stats
@@ -0,0 +1,145 @@
+"""
+Cache kết quả báo cáo (ReportViewSet)
+
+Khóa cache gồm tên báo cáo, các tham số đã chuẩn hóa (start_date / end_date
+quy về thời điểm theo giờ địa phương) và "generation" hiện tại:
+
+- Khoảng thời gian đã đóng (end_date trước hôm nay) được giữ lâu
+  (REPORT_CACHE_CLOSED_TIMEOUT); khi dữ liệu của một ngày đã qua thay đổi
+  (đổi trạng thái / thanh toán đơn cũ, tính lại bảng tổng hợp) generation
+  được đổi sau khi commit nên mọi kết quả cũ không còn được dùng.
+- Khoảng thời gian chạm tới hôm nay (hoặc không có end_date) chỉ được giữ
+  REPORT_CACHE_LIVE_TIMEOUT giây.
+
+Single-flight: khi chưa có kết quả, chỉ một request (giữ khóa cache.add)
+tính báo cáo; các request đồng thời cùng khóa chờ kết quả trong cache thay
+vì chạy lại cùng truy vấn.
+"""
+import functools
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .utils import parse_date
+
+
+GENERATION_KEY = 'reports:generation'
+DATE_PARAMS = ['start_date', 'end_date']
+
+# Khóa tính báo cáo hết hạn sau thời gian này (process tính bị chết giữa chừng)
+LOCK_TIMEOUT = 60
+# Thời gian tối đa chờ request khác tính xong trước khi tự tính
+WAIT_TIMEOUT = 15
+POLL_INTERVAL = 0.05
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        value = uuid.uuid4().hex
+        # add() để các process cùng dùng một generation
+        if not cache.add(GENERATION_KEY, value, None):
+            value = cache.get(GENERATION_KEY, value)
+    return value
+
+
+def invalidate():
+    """Bỏ toàn bộ kết quả báo cáo đã cache"""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_on_commit():
+    transaction.on_commit(invalidate)
+
+
+def _normalize(params):
+    """
+    Chuẩn hóa tham số truy vấn
+
+    Returns:
+        (list (tên, giá trị) đã sắp xếp, True nếu khoảng thời gian đã đóng)
+    """
+    normalized = {}
+    for name in sorted(params):
+        value = params.get(name)
+        if name in DATE_PARAMS:
+            parsed = parse_date(value)
+            value = timezone.localtime(parsed).isoformat() if parsed else ''
+        normalized[name] = value
+
+    end_date = parse_date(params.get('end_date'))
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    closed = end_date is not None and end_date < today
+    return sorted(normalized.items()), closed
+
+
+def cache_key(name, params):
+    """Khóa cache và thời gian giữ của một báo cáo"""
+    normalized, closed = _normalize(params)
+    digest = hashlib.sha1(repr(normalized).encode('utf-8')).hexdigest()
+    key = f'reports:{generation()}:{name}:{digest}'
+    timeout = settings.REPORT_CACHE_CLOSED_TIMEOUT if closed else settings.REPORT_CACHE_LIVE_TIMEOUT
+    return key, timeout
+
+
+def get_or_compute(key, timeout, compute):
+    """
+    Lấy kết quả trong cache hoặc tính (một request cho mỗi khóa)
+
+    compute() trả về (dữ liệu, có lưu cache hay không).
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while not locked and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+
+    try:
+        data, cacheable = compute()
+        if cacheable:
+            cache.set(key, data, timeout)
+        return data
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def cached(view):
+    """
+    Decorator cho action báo cáo: chỉ cache response 200 của người có quyền
+
+    Kết quả lỗi (403, 500) không được cache.
+    """
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        if not self._check_permission(request):
+            return view(self, request, *args, **kwargs)
+
+        responses = []
+
+        def compute():
+            response = view(self, request, *args, **kwargs)
+            responses.append(response)
+            return response.data, response.status_code == 200
+
+        key, timeout = cache_key(view.__name__, request.query_params)
+        data = get_or_compute(key, timeout, compute)
+        if responses:
+            return responses[0]
+        return Response(data)
+
+    return wrapper
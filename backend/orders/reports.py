@@ -1,21 +1,45 @@
 """
 API endpoints for reports and statistics
+
+Kết quả được cache theo báo cáo và tham số (orders.report_cache).
 """
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Avg, F, Q
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDay, Coalesce
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
-import django.db.models
 
-from orders.models import Order, OrderItem
+from orders.models import DailySalesRollup, DailyProductSales
+from orders.utils import parse_date
+from orders import archive, report_cache, timeseries
 from products.models import Product
 from users.models import User
-from categories.models import Category
+
+
+logger = logging.getLogger(__name__)
+
+
+def _rollup(start_date, end_date=None, model=DailySalesRollup):
+    """
+    Các dòng tổng hợp theo ngày (giờ địa phương) của khoảng thời gian
+    (DailySalesRollup hoặc DailyProductSales)
+
+    Báo cáo đọc theo ngày: ngày đầu và ngày cuối được tính trọn ngày.
+    Không lọc từng dòng theo số đơn: một mảnh của DailySalesRollup có thể âm
+    (đơn được cộng vào mảnh này, chuyển trạng thái ở mảnh khác), chỉ tổng
+    các mảnh mới đúng. Báo cáo nhóm theo khóa lọc trên giá trị đã tổng
+    hợp (HAVING).
+    """
+    queryset = model.objects.filter(date__gte=timezone.localdate(start_date))
+    if end_date is not None:
+        queryset = queryset.filter(date__lte=timezone.localdate(end_date))
+    return queryset
 
 
 class ReportViewSet(viewsets.ViewSet):
@@ -30,24 +54,10 @@ class ReportViewSet(viewsets.ViewSet):
     
     def _parse_date(self, date_str, default=None):
         """Parse date string safely"""
-        if not date_str:
-            return default
-        try:
-            # Remove timezone indicator and parse
-            date_str = date_str.replace('Z', '').replace('+00:00', '')
-            if 'T' in date_str:
-                dt = datetime.strptime(date_str.split('.')[0], '%Y-%m-%dT%H:%M:%S')
-            else:
-                dt = datetime.strptime(date_str, '%Y-%m-%d')
-            # Make timezone aware
-            if timezone.is_naive(dt):
-                dt = timezone.make_aware(dt)
-            return dt
-        except Exception as e:
-            print(f"Error parsing date {date_str}: {e}")
-            return default
+        return parse_date(date_str, default)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def dashboard(self, request):
         """Thống kê tổng quan cho dashboard"""
         if not self._check_permission(request):
@@ -81,90 +91,69 @@ class ReportViewSet(viewsets.ViewSet):
             prev_start_date = (start_date - timedelta(days=1)).replace(day=1)
             prev_end_date = start_date - timedelta(days=1)
         
-        # Thống kê doanh thu khoảng thời gian hiện tại
-        current_revenue = Order.objects.filter(
-            status='delivered',
-            payment_status='paid',
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).aggregate(total=Coalesce(Sum('total'), Decimal('0')))['total']
-        
-        # Doanh thu khoảng thời gian trước
-        prev_revenue = Order.objects.filter(
-            status='delivered',
-            payment_status='paid',
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).aggregate(total=Coalesce(Sum('total'), Decimal('0')))['total']
+        # Toàn bộ chỉ số đơn hàng của hai khoảng thời gian: một aggregate trên
+        # khoảng hợp (index created_at, status, payment_status, total)
+        current = Q(created_at__gte=start_date, created_at__lte=end_date)
+        previous = Q(created_at__gte=prev_start_date, created_at__lte=prev_end_date)
+        revenue = Q(status='delivered', payment_status='paid')
+        delivered = Q(status='delivered')
+        metrics = {
+            'current_revenue': Coalesce(Sum('total', filter=current & revenue), Decimal('0')),
+            'prev_revenue': Coalesce(Sum('total', filter=previous & revenue), Decimal('0')),
+            'current_orders': Count('id', filter=current),
+            'prev_orders': Count('id', filter=previous),
+            'current_completed': Count('id', filter=current & delivered),
+            'prev_completed': Count('id', filter=previous & delivered),
+        }
+        union_start = min(start_date, prev_start_date)
+        union_end = max(end_date, prev_end_date)
+        totals = dict.fromkeys(metrics, 0)
+        for model, _ in archive.order_sources(union_start):
+            row = model.objects.filter(
+                created_at__gte=union_start,
+                created_at__lte=union_end
+            ).aggregate(**metrics)
+            for key, value in row.items():
+                totals[key] += value
+        
+        current_revenue = totals['current_revenue']
+        prev_revenue = totals['prev_revenue']
+        current_orders = totals['current_orders']
+        prev_orders = totals['prev_orders']
         
         # Tính % thay đổi doanh thu
         revenue_change = 0
         if prev_revenue and prev_revenue > 0:
             revenue_change = float((current_revenue - prev_revenue) / prev_revenue * 100)
         
-        # Số đơn hàng
-        current_orders = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).count()
-        
-        prev_orders = Order.objects.filter(
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).count()
-        
         orders_change = 0
         if prev_orders > 0:
             orders_change = float((current_orders - prev_orders) / prev_orders * 100)
         
-        # Khách hàng mới
-        current_customers = User.objects.filter(
-            role='customer',
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).count()
-        
-        prev_customers = User.objects.filter(
+        # Khách hàng mới của hai khoảng thời gian trong một truy vấn
+        customers = User.objects.filter(
             role='customer',
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).count()
+            created_at__gte=union_start,
+            created_at__lte=union_end
+        ).aggregate(
+            current=Count('id', filter=current),
+            previous=Count('id', filter=previous)
+        )
+        current_customers = customers['current']
+        prev_customers = customers['previous']
         
         customers_change = 0
         if prev_customers > 0:
             customers_change = float((current_customers - prev_customers) / prev_customers * 100)
         
         # Tỷ lệ hoàn thành
-        total_orders = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).count()
-        
-        completed_orders = Order.objects.filter(
-            status='delivered',
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).count()
-        
         completion_rate = 0
-        if total_orders > 0:
-            completion_rate = float(completed_orders / total_orders * 100)
-        
-        # Tỷ lệ hoàn thành khoảng thời gian trước
-        prev_total_orders = Order.objects.filter(
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).count()
-        
-        prev_completed_orders = Order.objects.filter(
-            status='delivered',
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).count()
+        if current_orders > 0:
+            completion_rate = float(totals['current_completed'] / current_orders * 100)
         
         prev_completion_rate = 0
-        if prev_total_orders > 0:
-            prev_completion_rate = float(prev_completed_orders / prev_total_orders * 100)
+        if prev_orders > 0:
+            prev_completion_rate = float(totals['prev_completed'] / prev_orders * 100)
         
         completion_rate_change = completion_rate - prev_completion_rate
         
@@ -192,6 +181,7 @@ class ReportViewSet(viewsets.ViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def revenue_by_month(self, request):
         """Doanh thu theo tháng"""
         try:
@@ -219,39 +209,27 @@ class ReportViewSet(viewsets.ViewSet):
                 start_date = timezone.now() - timedelta(days=30 * months)
                 end_date = timezone.now()
             
-            # Use raw SQL to avoid MySQL timezone issues
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        DATE_FORMAT(created_at, '%%Y-%%m-01') as month,
-                        SUM(total) as total
-                    FROM orders
-                    WHERE status = 'delivered'
-                        AND payment_status = 'paid'
-                        AND created_at >= %s
-                        AND created_at <= %s
-                    GROUP BY DATE_FORMAT(created_at, '%%Y-%%m')
-                    ORDER BY month
-                """, [start_date, end_date])
-                
-                columns = [col[0] for col in cursor.description]
-                revenue_data = [
-                    dict(zip(columns, row))
-                    for row in cursor.fetchall()
-                ]
+            # Đủ các tháng trong khoảng (tháng không có doanh thu = 0)
+            revenue_data = [
+                {'month': row['bucket'], 'total': row['total']}
+                for row in timeseries.series(
+                    _rollup(start_date, end_date).filter(status='delivered', payment_status='paid'),
+                    'date', 'month',
+                    timezone.localdate(start_date), timezone.localdate(end_date),
+                    total=Sum('revenue')
+                )
+            ]
             
             return Response(revenue_data)
         except Exception as e:
-            print(f"Error in revenue_by_month: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('reports.revenue_by_month_error')
             return Response(
                 {'error': f'Internal server error: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def orders_by_week(self, request):
         """Số đơn hàng theo tuần"""
         try:
@@ -279,60 +257,31 @@ class ReportViewSet(viewsets.ViewSet):
                 start_date = timezone.now() - timedelta(weeks=weeks)
                 end_date = timezone.now()
             
-            # Tính số tuần trong khoảng thời gian
-            delta_days = (end_date - start_date).days
-            num_weeks = (delta_days // 7) + 1
-            
-            # Tạo danh sách tất cả các tuần trong khoảng thời gian
-            from django.db import connection
-            import datetime
-            
-            # Lấy dữ liệu đơn hàng theo tuần
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        DATE(DATE_SUB(created_at, INTERVAL WEEKDAY(created_at) DAY)) as week_start,
-                        COUNT(id) as count
-                    FROM orders
-                    WHERE created_at >= %s
-                        AND created_at <= %s
-                    GROUP BY week_start
-                    ORDER BY week_start
-                """, [start_date, end_date])
-                
-                result = cursor.fetchall()
-                orders_by_week_dict = {row[0]: row[1] for row in result}
-            
-            # Tạo danh sách đầy đủ các tuần (bao gồm cả tuần không có đơn hàng)
-            orders_data = []
-            current_date = start_date.date() if hasattr(start_date, 'date') else start_date
-            
-            # Điều chỉnh về thứ 2 đầu tuần
-            while current_date.weekday() != 0:  # 0 = Monday
-                current_date -= timedelta(days=1)
-            
-            week_num = 1
-            while current_date <= (end_date.date() if hasattr(end_date, 'date') else end_date):
-                count = orders_by_week_dict.get(current_date, 0)
-                orders_data.append({
-                    'week': current_date.isoformat(),
-                    'week_number': week_num,
-                    'count': count
-                })
-                current_date += timedelta(days=7)
-                week_num += 1
+            # Đủ các tuần trong khoảng (bao gồm cả tuần không có đơn hàng)
+            orders_data = [
+                {
+                    'week': row['bucket'].isoformat(),
+                    'week_number': week_number,
+                    'count': row['count']
+                }
+                for week_number, row in enumerate(timeseries.series(
+                    _rollup(start_date, end_date),
+                    'date', 'week',
+                    timezone.localdate(start_date), timezone.localdate(end_date),
+                    count=Sum('order_count')
+                ), start=1)
+            ]
             
             return Response(orders_data)
         except Exception as e:
-            print(f"Error in orders_by_week: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('reports.orders_by_week_error')
             return Response(
                 {'error': f'Internal server error: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def revenue_by_category(self, request):
         """Doanh thu theo danh mục"""
         if not self._check_permission(request):
@@ -349,20 +298,19 @@ class ReportViewSet(viewsets.ViewSet):
         start_date = self._parse_date(start_date_str, timezone.now().replace(day=1))
         end_date = self._parse_date(end_date_str, timezone.now())
         
-        category_data = OrderItem.objects.filter(
-            order__status='delivered',
-            order__payment_status='paid',
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date
-        ).values(
-            category_name=F('product__category__name')
-        ).annotate(
-            total=Sum('subtotal')
-        ).order_by('-total')[:5]  # Top 5 danh mục
-        
-        return Response(list(category_data))
+        # Tổng hợp từ doanh số sản phẩm theo ngày (đơn đã giao + đã thanh toán)
+        category_data = list(
+            _rollup(start_date, end_date, model=DailyProductSales).values(
+                category_name=F('product__category__name')
+            ).annotate(
+                total=Sum('revenue')
+            ).filter(total__gt=0).order_by('-total')[:5]  # Top 5 danh mục
+        )
+        
+        return Response(category_data)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def top_products(self, request):
         """Top sản phẩm bán chạy"""
         if not self._check_permission(request):
@@ -385,18 +333,17 @@ class ReportViewSet(viewsets.ViewSet):
         start_date = self._parse_date(start_date_str, timezone.now().replace(day=1))
         end_date = self._parse_date(end_date_str, timezone.now())
         
-        top_products = OrderItem.objects.filter(
-            order__status='delivered',
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date
-        ).values(
-            'product_id',
-            'product__name',
-            category_name=F('product__category__name')
-        ).annotate(
-            sold=Sum('quantity'),
-            revenue=Sum('subtotal')
-        ).order_by('-revenue')[:limit]
+        # Doanh số sản phẩm theo ngày: cùng điều kiện đã giao + đã thanh toán
+        # với revenue_by_category
+        top_products = list(
+            _rollup(start_date, end_date, model=DailyProductSales).values('product_id').annotate(
+                sold=Sum('units'),
+                revenue=Sum('revenue')
+            ).filter(sold__gt=0).order_by('-revenue', 'product_id')[:limit]
+        )
+        products = Product.objects.select_related('category').in_bulk(
+            [item['product_id'] for item in top_products]
+        )
         
         # Thêm rank
         result = []
@@ -404,8 +351,8 @@ class ReportViewSet(viewsets.ViewSet):
             result.append({
                 'rank': idx,
                 'product_id': item['product_id'],
-                'name': item['product__name'],
-                'category': item['category_name'],
+                'name': products[item['product_id']].name,
+                'category': products[item['product_id']].category.name,
                 'sold': item['sold'],
                 'revenue': float(item['revenue'])
             })
@@ -413,6 +360,7 @@ class ReportViewSet(viewsets.ViewSet):
         return Response(result)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def order_status_stats(self, request):
         """Thống kê theo trạng thái đơn hàng"""
         if not self._check_permission(request):
@@ -429,16 +377,16 @@ class ReportViewSet(viewsets.ViewSet):
         start_date = self._parse_date(start_date_str, timezone.now().replace(day=1))
         end_date = self._parse_date(end_date_str, timezone.now())
         
-        status_stats = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).values('status').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        status_stats = list(
+            _rollup(start_date, end_date).values('status').annotate(
+                count=Sum('order_count')
+            ).filter(count__gt=0).order_by('-count')
+        )
         
-        return Response(list(status_stats))
+        return Response(status_stats)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def payment_method_stats(self, request):
         """Thống kê theo phương thức thanh toán"""
         if not self._check_permission(request):
@@ -455,17 +403,17 @@ class ReportViewSet(viewsets.ViewSet):
         start_date = self._parse_date(start_date_str, timezone.now().replace(day=1))
         end_date = self._parse_date(end_date_str, timezone.now())
         
-        payment_stats = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).values('payment_method').annotate(
-            count=Count('id'),
-            total=Sum('total')
-        ).order_by('-count')
+        payment_stats = list(
+            _rollup(start_date, end_date).values('payment_method').annotate(
+                count=Sum('order_count'),
+                total=Sum('revenue')
+            ).filter(count__gt=0).order_by('-count')
+        )
         
-        return Response(list(payment_stats))
+        return Response(payment_stats)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def daily_revenue(self, request):
         """Doanh thu theo ngày (30 ngày gần nhất)"""
         if not self._check_permission(request):
@@ -482,20 +430,26 @@ class ReportViewSet(viewsets.ViewSet):
         
         start_date = timezone.now() - timedelta(days=days)
         
-        daily_data = Order.objects.filter(
-            status='delivered',
-            payment_status='paid',
-            created_at__gte=start_date
-        ).annotate(
-            day=TruncDay('created_at')
-        ).values('day').annotate(
-            revenue=Sum('total'),
-            orders_count=Count('id')
-        ).order_by('day')
-        
-        return Response(list(daily_data))
+        # Đủ các ngày đến hôm nay (ngày không có doanh thu = 0)
+        daily_data = [
+            {
+                'day': timezone.make_aware(datetime.combine(row['bucket'], datetime.min.time())),
+                'revenue': row['revenue'],
+                'orders_count': row['orders_count']
+            }
+            for row in timeseries.series(
+                _rollup(start_date).filter(status='delivered', payment_status='paid'),
+                'date', 'day',
+                timezone.localdate(start_date), timezone.localdate(),
+                revenue=Sum('revenue'),
+                orders_count=Sum('order_count')
+            )
+        ]
+        
+        return Response(daily_data)
     
     @action(detail=False, methods=['get'])
+    @report_cache.cached
     def customer_stats(self, request):
         """Thống kê khách hàng"""
         if not self._check_permission(request):
@@ -507,21 +461,37 @@ class ReportViewSet(viewsets.ViewSet):
         # Tổng số khách hàng
         total_customers = User.objects.filter(role='customer').count()
         
-        # Khách hàng có đơn hàng
+        # Khách hàng có đơn hàng (kể cả đơn hàng đã lưu trữ)
         customers_with_orders = User.objects.filter(
-            role='customer',
-            orders__isnull=False
+            Q(orders__isnull=False) | Q(archived_orders__isnull=False),
+            role='customer'
         ).distinct().count()
         
         # Top khách hàng chi tiêu nhiều nhất
-        top_customers = User.objects.filter(
-            role='customer'
-        ).annotate(
-            total_spent=Sum('orders__total', filter=Q(orders__status='delivered')),
-            total_orders=Count('orders', filter=Q(orders__status='delivered'))
-        ).filter(
-            total_spent__isnull=False
-        ).order_by('-total_spent')[:10]
+        spending = archive.merge_grouped(
+            [
+                row
+                for model, _ in archive.order_sources()
+                for row in model.objects.filter(
+                    user__role='customer',
+                    status='delivered'
+                ).values('user_id').annotate(
+                    total_spent=Sum('total'),
+                    total_orders=Count('id')
+                ).order_by()
+            ],
+            keys=['user_id'],
+            sums=['total_spent', 'total_orders'],
+            order_by='total_spent',
+            limit=10
+        )
+        customers = User.objects.in_bulk([row['user_id'] for row in spending])
+        top_customers = []
+        for row in spending:
+            customer = customers[row['user_id']]
+            customer.total_spent = row['total_spent']
+            customer.total_orders = row['total_orders']
+            top_customers.append(customer)
         
         top_customers_data = [
             {
@@ -0,0 +1,334 @@
+"""
+Bảng tổng hợp doanh số theo ngày (DailySalesRollup, DailyProductSales)
+
+- record_created: cộng đơn mới vào dòng tổng hợp trong transaction tạo đơn
+- tracking: bao quanh các câu UPDATE đổi trạng thái / thanh toán (có thể
+  theo lô): đọc khóa (ngày, trạng thái, phương thức, trạng thái thanh toán)
+  của các đơn trước và sau khi ghi rồi chuyển số liệu giữa các dòng tổng
+  hợp trong cùng transaction. Không lồng các khối tracking cho cùng đơn.
+- record_payment_change: sau câu UPDATE có điều kiện của transition_payment
+  (dòng đã bị khóa bởi câu UPDATE, không cần đọc trước)
+- DailyProductSales (doanh số theo sản phẩm, chỉ đơn đã giao + đã thanh
+  toán) được ghi cùng lúc khi đơn vào / ra trạng thái này
+- rebuild_range / rebuild: tính lại các ngày trong một khoảng từ bảng đơn
+  hàng và bảng lưu trữ (lệnh `rebuild_sales_rollup` chạy song song theo
+  khoảng ngày)
+
+Mỗi dòng tổng hợp được ghi bằng UPDATE F(); dòng chưa có được INSERT trong
+savepoint (hai transaction cùng INSERT thì bên thua UPDATE lại). Các dòng
+được ghi theo thứ tự khóa để tránh deadlock.
+
+DailySalesRollup được chia mảnh (slot): mỗi lần ghi chọn ngẫu nhiên một
+mảnh nên các checkout đồng thời không cùng chờ khóa dòng (ngày, pending,
+phương thức, pending). prepare_day tạo sẵn các mảnh của đơn mới ngoài
+transaction checkout, để checkout chỉ UPDATE dòng đã có (không INSERT giữ
+gap lock trên MySQL REPEATABLE READ).
+"""
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySalesRollup, DailyProductSales
+from . import report_cache
+
+
+KEY_FIELDS = ['status', 'payment_method', 'payment_status']
+
+SOURCES = [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]
+
+# Các ngày process này đã tạo sẵn mảnh tổng hợp cho đơn mới (xem prepare_day)
+_prepared_days = set()
+
+
+def _rows(order_ids, lock=False):
+    """{order_id: (ngày, total, status, payment_method, payment_status)}"""
+    queryset = Order.objects.filter(id__in=order_ids)
+    if lock:
+        queryset = queryset.select_for_update().order_by('id')
+    return {
+        order_id: (timezone.localdate(created_at), total, *key)
+        for order_id, created_at, total, *key in queryset.values_list('id', 'created_at', 'total', *KEY_FIELDS)
+    }
+
+
+def _items(order_ids):
+    """{order_id: [(product_id, số lượng, thành tiền)]}"""
+    items = defaultdict(list)
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values('order_id', 'product_id').annotate(
+        quantity=Sum('quantity'),
+        subtotal=Sum('subtotal')
+    ).order_by()
+    for row in rows:
+        items[row['order_id']].append((row['product_id'], row['quantity'], row['subtotal']))
+    return items
+
+
+def _is_sold(row):
+    """Đơn được tính vào doanh số sản phẩm: đã giao và đã thanh toán"""
+    return row[2] == 'delivered' and row[4] == 'paid'
+
+
+def _upsert(model, key_fields, value_fields, deltas):
+    """Cộng các delta {khóa: [giá trị...]} vào bảng tổng hợp (theo thứ tự khóa)"""
+    for key in sorted(deltas):
+        values = deltas[key]
+        if not any(values):
+            continue
+        filters = dict(zip(key_fields, key))
+        changes = {field: F(field) + value for field, value in zip(value_fields, values)}
+        if model.objects.filter(**filters).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**filters, **dict(zip(value_fields, values)))
+        except IntegrityError:
+            model.objects.filter(**filters).update(**changes)
+
+
+def _apply(deltas, product_deltas=None):
+    """
+    Ghi các delta
+
+    Args:
+        deltas: {(ngày, status, payment_method, payment_status): [số đơn, doanh thu, số sản phẩm]}
+        product_deltas: {(ngày, product_id): [số lượng, doanh thu, số đơn]}
+    """
+    # Dữ liệu của ngày đã qua thay đổi: bỏ các báo cáo đã cache (kể cả khoảng đã đóng)
+    today = timezone.localdate()
+    if any(key[0] < today for key in deltas):
+        report_cache.invalidate_on_commit()
+
+    slot = random.randrange(settings.SALES_ROLLUP_SLOTS)
+    _upsert(
+        DailySalesRollup,
+        ['date', *KEY_FIELDS, 'slot'],
+        ['order_count', 'revenue', 'item_count'],
+        {(*key, slot): values for key, values in deltas.items()}
+    )
+    if product_deltas:
+        _upsert(DailyProductSales, ['date', 'product_id'], ['units', 'revenue', 'order_count'], product_deltas)
+
+
+def _move(before, after):
+    """Delta chuyển các đơn từ khóa cũ (before) sang khóa mới (after)"""
+    items = _items(list({*before, *after}))
+    deltas = defaultdict(lambda: [0, Decimal('0'), 0])
+    product_deltas = defaultdict(lambda: [0, Decimal('0'), 0])
+    for sign, rows, other in [(-1, before, after), (1, after, before)]:
+        for order_id, row in rows.items():
+            day, total, *key = row
+            delta = deltas[(day, *key)]
+            delta[0] += sign
+            delta[1] += sign * total
+            delta[2] += sign * sum(quantity for _, quantity, _ in items[order_id])
+
+            # Doanh số sản phẩm chỉ đổi khi đơn vào / ra trạng thái đã giao + đã thanh toán
+            if _is_sold(row) and not (order_id in other and _is_sold(other[order_id])):
+                for product_id, quantity, subtotal in items[order_id]:
+                    product_delta = product_deltas[(day, product_id)]
+                    product_delta[0] += sign * quantity
+                    product_delta[1] += sign * subtotal
+                    product_delta[2] += sign
+    _apply(deltas, product_deltas)
+
+
+def prepare_day(day=None):
+    """
+    Tạo sẵn (nếu chưa có) các mảnh tổng hợp của đơn mới trong ngày: trạng
+    thái pending, mọi phương thức thanh toán
+
+    Gọi trước transaction checkout (autocommit, INSERT IGNORE); mỗi process
+    chỉ chạy một lần mỗi ngày. Dòng bị xóa sau đó (rebuild) được tạo lại
+    trong _upsert như bình thường.
+    """
+    day = day or timezone.localdate()
+    if day in _prepared_days:
+        return
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(date=day, status='pending', payment_method=payment_method, payment_status='pending', slot=slot)
+        for payment_method, _ in Order.PAYMENT_METHOD_CHOICES
+        for slot in range(settings.SALES_ROLLUP_SLOTS)
+    ], ignore_conflicts=True)
+    _prepared_days.clear()
+    _prepared_days.add(day)
+
+
+def record_created(order, item_count):
+    """Cộng đơn hàng mới (gọi trong transaction tạo đơn, sau prepare_day)"""
+    _apply({
+        (timezone.localdate(order.created_at), order.status, order.payment_method, order.payment_status):
+            [1, order.total, item_count]
+    })
+
+
+def record_payment_change(order_ids, previous_status):
+    """
+    Chuyển các đơn vừa được UPDATE từ payment_status previous_status
+
+    Gọi ngay sau câu UPDATE, trong cùng transaction (dòng đơn hàng đang bị
+    khóa nên trạng thái đọc lại là trạng thái sau khi ghi).
+    """
+    after = _rows(order_ids)
+    before = {
+        order_id: (day, total, status, payment_method, previous_status)
+        for order_id, (day, total, status, payment_method, _) in after.items()
+    }
+    _move(before, after)
+
+
+def record_deleted(order_ids):
+    """Trừ các đơn sắp bị xóa (gọi trước khi xóa, trong cùng transaction)"""
+    before = _rows(order_ids, lock=True)
+    if before:
+        _move(before, {})
+
+
+@contextmanager
+def tracking(order_ids):
+    """
+    Cập nhật bảng tổng hợp cho các thay đổi đơn hàng trong khối with
+
+    Khóa và đọc các đơn trước khi ghi, đọc lại sau khi ghi; chỉ các đơn
+    có khóa tổng hợp hoặc total thay đổi mới được ghi.
+    """
+    with transaction.atomic():
+        before = _rows(order_ids, lock=True)
+        yield
+        after = _rows(list(before))
+        changed = [order_id for order_id, row in before.items() if after.get(order_id) != row]
+        if changed:
+            _move(
+                {order_id: before[order_id] for order_id in changed},
+                {order_id: after[order_id] for order_id in changed if order_id in after}
+            )
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_range(start_day, end_day):
+    """
+    Tính lại các ngày từ start_day đến end_day (bao gồm)
+
+    Xóa các dòng tổng hợp trong khoảng trước rồi mới đọc đơn hàng, trong
+    cùng transaction: đơn đang được ghi đồng thời hoặc đã commit (và đã
+    được đếm), hoặc phải chờ transaction này để cộng delta của mình.
+
+    Returns:
+        Số dòng DailySalesRollup đã ghi
+    """
+    with transaction.atomic():
+        DailySalesRollup.objects.filter(date__gte=start_day, date__lte=end_day).delete()
+        DailyProductSales.objects.filter(date__gte=start_day, date__lte=end_day).delete()
+
+        totals = defaultdict(lambda: [0, Decimal('0'), 0])
+        product_totals = defaultdict(lambda: [0, Decimal('0'), 0])
+        day = start_day
+        while day <= end_day:
+            # Mỗi ngày một range scan theo created_at (không chuyển múi giờ trong SQL)
+            day_start, day_end = _local_midnight(day), _local_midnight(day + timedelta(days=1))
+            for order_model, item_model in SOURCES:
+                rows = order_model.objects.filter(
+                    created_at__gte=day_start,
+                    created_at__lt=day_end
+                ).values(*KEY_FIELDS).annotate(
+                    orders=Count('id'),
+                    revenue=Sum('total')
+                ).order_by()
+                for row in rows:
+                    entry = totals[(day, *(row[field] for field in KEY_FIELDS))]
+                    entry[0] += row['orders']
+                    entry[1] += row['revenue'] or 0
+
+                items = item_model.objects.filter(
+                    order__created_at__gte=day_start,
+                    order__created_at__lt=day_end
+                ).values(*[f'order__{field}' for field in KEY_FIELDS]).annotate(
+                    quantity=Sum('quantity')
+                ).order_by()
+                for row in items:
+                    totals[(day, *(row[f'order__{field}'] for field in KEY_FIELDS))][2] += row['quantity'] or 0
+
+                products = item_model.objects.filter(
+                    order__created_at__gte=day_start,
+                    order__created_at__lt=day_end,
+                    order__status='delivered',
+                    order__payment_status='paid'
+                ).values('product_id').annotate(
+                    units=Sum('quantity'),
+                    revenue=Sum('subtotal'),
+                    orders=Count('order_id', distinct=True)
+                ).order_by()
+                for row in products:
+                    entry = product_totals[(day, row['product_id'])]
+                    entry[0] += row['units']
+                    entry[1] += row['revenue']
+                    entry[2] += row['orders']
+            day += timedelta(days=1)
+
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                order_count=order_count,
+                revenue=revenue,
+                item_count=item_count,
+                **dict(zip(['date', *KEY_FIELDS], key))
+            )
+            for key, (order_count, revenue, item_count) in sorted(totals.items())
+            if order_count
+        ], batch_size=1000)
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=day, product_id=product_id, units=units, revenue=revenue, order_count=order_count)
+            for (day, product_id), (units, revenue, order_count) in sorted(product_totals.items())
+        ], batch_size=1000)
+    return sum(1 for entry in totals.values() if entry[0])
+
+
+def _rebuild_chunk(days):
+    try:
+        return rebuild_range(*days)
+    finally:
+        connection.close()
+
+
+def first_order_date():
+    """Ngày tạo đơn hàng sớm nhất (kể cả đơn đã lưu trữ), None nếu chưa có đơn"""
+    dates = [
+        model.objects.aggregate(first=Min('created_at'))['first']
+        for model, _ in SOURCES
+    ]
+    dates = [value for value in dates if value is not None]
+    return timezone.localdate(min(dates)) if dates else None
+
+
+def rebuild(start_day=None, end_day=None, workers=4, chunk_days=7):
+    """
+    Tính lại bảng tổng hợp: chia khoảng ngày thành các đoạn chunk_days ngày,
+    mỗi đoạn một transaction, chạy song song trên `workers` thread
+
+    Returns:
+        (số đoạn, số dòng tổng hợp đã ghi)
+    """
+    start_day = start_day or first_order_date()
+    end_day = end_day or timezone.localdate()
+    if start_day is None or start_day > end_day:
+        return 0, 0
+
+    chunks = []
+    while start_day <= end_day:
+        chunk_end = min(start_day + timedelta(days=chunk_days - 1), end_day)
+        chunks.append((start_day, chunk_end))
+        start_day = chunk_end + timedelta(days=1)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='rollup') as executor:
+        rows = sum(executor.map(_rebuild_chunk, chunks))
+    report_cache.invalidate()
+    return len(chunks), rows
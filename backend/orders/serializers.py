@@ -1,6 +1,20 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
+from django.db.models import F
+from .models import Order, OrderItem, OrderStatusHistory, ArchivedOrder, ArchivedOrderItem
+from carts import services as cart_services
+from notifications import outbox
 from products.models import Product
+from promotions import engine as promotions
+from .shipping import calculate_shipping_fee, parse_weight_kg
+from . import refunds, rollups, state_machine
+
+
+def _sum_quantities(items):
+    """Gộp số lượng theo sản phẩm (một sản phẩm có thể xuất hiện nhiều dòng)"""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -15,6 +29,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'subtotal', 'created_at']
 
 
+class OrderStatusHistorySerializer(serializers.ModelSerializer):
+    """Serializer cho lịch sử trạng thái đơn hàng"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = OrderStatusHistory
+        fields = ['from_status', 'status', 'status_display', 'source', 'note', 'changed_at']
+        read_only_fields = fields
+
+
 class OrderItemCreateSerializer(serializers.Serializer):
     """Serializer cho việc tạo OrderItem"""
     product_id = serializers.IntegerField()
@@ -24,6 +48,7 @@ class OrderItemCreateSerializer(serializers.Serializer):
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer cho Order (read)"""
     items = OrderItemSerializer(many=True, read_only=True)
+    status_history = OrderStatusHistorySerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
     payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
@@ -33,19 +58,45 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order_number', 'user',
             'full_name', 'phone', 'email', 'address', 'district', 'city', 'note',
-            'subtotal', 'shipping_fee', 'total',
+            'subtotal', 'shipping_fee', 'discount', 'total',
             'status', 'status_display',
             'payment_method', 'payment_method_display',
-            'payment_status', 'payment_status_display',
-            'items',
+            'payment_status', 'payment_status_display', 'refunded_amount',
+            'items', 'status_history',
             'created_at', 'updated_at', 'confirmed_at', 'delivered_at'
         ]
         read_only_fields = [
-            'id', 'order_number', 'user', 'subtotal', 'total',
+            'id', 'order_number', 'user', 'subtotal', 'discount', 'total', 'refunded_amount',
             'created_at', 'updated_at', 'confirmed_at', 'delivered_at'
         ]
 
 
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    """Serializer cho chi tiết đơn hàng đã lưu trữ"""
+    
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Serializer cho đơn hàng đã lưu trữ (cùng định dạng với OrderSerializer)"""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    status_history = serializers.SerializerMethodField()
+    is_archived = serializers.SerializerMethodField()
+    
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields + ['is_archived', 'archived_at']
+    
+    def get_status_history(self, obj):
+        # Lịch sử trạng thái được giữ lại theo id đơn hàng khi lưu trữ
+        history = OrderStatusHistory.objects.filter(order_id=obj.id)
+        return OrderStatusHistorySerializer(history, many=True).data
+    
+    def get_is_archived(self, obj):
+        return True
+
+
 class OrderCreateSerializer(serializers.Serializer):
     """Serializer cho việc tạo đơn hàng"""
     # Thông tin giao hàng
@@ -63,8 +114,12 @@ class OrderCreateSerializer(serializers.Serializer):
         default='cod'
     )
     
-    # Danh sách sản phẩm
-    items = OrderItemCreateSerializer(many=True)
+    # Danh sách sản phẩm: truyền trực tiếp hoặc đặt hàng từ giỏ hàng phía server
+    items = OrderItemCreateSerializer(many=True, required=False)
+    cart_id = serializers.IntegerField(required=False)
+    
+    # Mã giảm giá
+    coupon_code = serializers.CharField(max_length=50, required=False, allow_blank=True)
     
     def validate_items(self, items):
         """Validate items"""
@@ -72,22 +127,68 @@ class OrderCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("Đơn hàng phải có ít nhất một sản phẩm")
         return items
     
+    def validate_coupon_code(self, value):
+        """Kiểm tra mã giảm giá tồn tại (tra trong bộ nhớ, không truy vấn)"""
+        if value and promotions.get_coupon(value) is None:
+            raise serializers.ValidationError(
+                f"Mã giảm giá {promotions.normalize_code(value)} không tồn tại"
+            )
+        return promotions.normalize_code(value)
+    
     def validate(self, data):
         """Validate dữ liệu đơn hàng"""
-        # Kiểm tra tồn kho cho từng sản phẩm
-        for item in data['items']:
-            try:
-                product = Product.objects.get(id=item['product_id'], status='active')
-                
-                if product.stock < item['quantity']:
-                    raise serializers.ValidationError(
-                        f"Sản phẩm '{product.name}' chỉ còn {product.stock} {product.unit} trong kho"
-                    )
-            except Product.DoesNotExist:
+        if data.get('cart_id') is not None:
+            return self._validate_cart(data)
+        
+        if not data.get('items'):
+            raise serializers.ValidationError({'items': "Đơn hàng phải có ít nhất một sản phẩm"})
+        
+        # Kiểm tra tồn kho cho toàn bộ sản phẩm bằng một truy vấn
+        quantities = _sum_quantities(data['items'])
+        products = Product.objects.filter(status='active').in_bulk(quantities.keys())
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise serializers.ValidationError(
+                    f"Sản phẩm với ID {product_id} không tồn tại hoặc đã ngừng bán"
+                )
+            if product.stock < quantity:
+                raise serializers.ValidationError(
+                    f"Sản phẩm '{product.name}' chỉ còn {product.stock} {product.unit} trong kho"
+                )
+        
+        return data
+    
+    def _validate_cart(self, data):
+        """Dùng trạng thái đã tính sẵn của giỏ hàng (một truy vấn cho toàn bộ dòng hàng)"""
+        cart = cart_services.get_checkout_cart(self.context['request'], data['cart_id'])
+        if cart is None:
+            raise serializers.ValidationError({'cart_id': "Không tìm thấy giỏ hàng"})
+        
+        lines = list(cart.items.select_related('product'))
+        if not lines:
+            raise serializers.ValidationError({'cart_id': "Giỏ hàng đang trống"})
+        
+        for line in lines:
+            product = line.product
+            if product.status != 'active':
+                raise serializers.ValidationError(
+                    f"Sản phẩm '{product.name}' đã ngừng bán, vui lòng xóa khỏi giỏ hàng"
+                )
+            if product.stock < line.quantity:
                 raise serializers.ValidationError(
-                    f"Sản phẩm với ID {item['product_id']} không tồn tại hoặc đã ngừng bán"
+                    f"Sản phẩm '{product.name}' chỉ còn {product.stock} {product.unit} trong kho"
+                )
+            if line.unit_price != product.price:
+                raise serializers.ValidationError(
+                    f"Giá sản phẩm '{product.name}' đã thay đổi, vui lòng kiểm tra lại giỏ hàng"
                 )
         
+        data['cart'] = cart
+        data['items'] = [
+            {'product_id': line.product_id, 'quantity': line.quantity}
+            for line in lines
+        ]
         return data
     
     def create(self, validated_data):
@@ -96,24 +197,35 @@ class OrderCreateSerializer(serializers.Serializer):
         from django.db import transaction
         
         items_data = validated_data.pop('items')
+        cart = validated_data.pop('cart', None)
         user = self.context['request'].user if self.context['request'].user.is_authenticated else None
         
+        # Tạo sẵn các mảnh tổng hợp doanh số của ngày (ngoài transaction checkout)
+        rollups.prepare_day()
+        
         with transaction.atomic():
-            # Tính toán giá
+            # Khóa toàn bộ sản phẩm trong một truy vấn (theo thứ tự ID để tránh deadlock)
+            quantities = _sum_quantities(items_data)
+            products = Product.objects.select_for_update().order_by('id').in_bulk(quantities.keys())
+            
+            # Kiểm tra lại tồn kho
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                if product is None or product.stock < quantity:
+                    raise serializers.ValidationError(
+                        f"Sản phẩm '{product.name if product else product_id}' không đủ số lượng trong kho"
+                    )
+            
+            # Tính toán giá và khối lượng
             subtotal = Decimal('0')
+            weight_kg = Decimal('0')
             order_items = []
             
             for item_data in items_data:
-                product = Product.objects.select_for_update().get(id=item_data['product_id'])
-                
-                # Kiểm tra lại tồn kho
-                if product.stock < item_data['quantity']:
-                    raise serializers.ValidationError(
-                        f"Sản phẩm '{product.name}' không đủ số lượng trong kho"
-                    )
-                
+                product = products[item_data['product_id']]
                 item_subtotal = product.price * item_data['quantity']
                 subtotal += item_subtotal
+                weight_kg += parse_weight_kg(product.weight) * item_data['quantity']
                 
                 order_items.append({
                     'product': product,
@@ -123,9 +235,29 @@ class OrderCreateSerializer(serializers.Serializer):
                     'subtotal': item_subtotal
                 })
             
-            # Tính phí vận chuyển (miễn phí nếu đơn hàng >= 500k)
-            shipping_fee = Decimal('0') if subtotal >= Decimal('500000') else Decimal('30000')
-            total = subtotal + shipping_fee
+            # Phí vận chuyển theo quy tắc đã biên dịch (không truy vấn thêm)
+            shipping_fee = calculate_shipping_fee(
+                subtotal,
+                city=validated_data.get('city', ''),
+                district=validated_data.get('district', ''),
+                weight_kg=weight_kg
+            )
+            
+            # Giảm giá theo mã khuyến mãi (tính trong bộ nhớ theo giá đã khóa)
+            discount = None
+            if validated_data.get('coupon_code'):
+                try:
+                    discount = promotions.evaluate(
+                        validated_data['coupon_code'],
+                        [(item['product'].category_id, item['subtotal']) for item in order_items],
+                        subtotal,
+                        shipping_fee
+                    )
+                except promotions.CouponError as e:
+                    raise serializers.ValidationError({'coupon_code': [str(e)]})
+            
+            discount_amount = discount.amount if discount else Decimal('0')
+            total = subtotal + shipping_fee - discount_amount
             
             # Tạo đơn hàng
             order = Order.objects.create(
@@ -139,6 +271,7 @@ class OrderCreateSerializer(serializers.Serializer):
                 note=validated_data.get('note', ''),
                 subtotal=subtotal,
                 shipping_fee=shipping_fee,
+                discount=discount_amount,
                 total=total,
                 payment_method=validated_data.get('payment_method', 'cod'),
                 payment_status='pending' if validated_data.get('payment_method', 'cod') != 'cod' else 'pending',
@@ -146,25 +279,50 @@ class OrderCreateSerializer(serializers.Serializer):
             )
             
             # Tạo các OrderItem và cập nhật kho
-            for item_data in order_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item_data['product'],
-                    product_name=item_data['product_name'],
-                    product_price=item_data['product_price'],
-                    quantity=item_data['quantity'],
-                    subtotal=item_data['subtotal']
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, **item_data)
+                for item_data in order_items
+            ])
+            
+            # Giảm số lượng tồn kho và tăng số lượng đã bán
+            for product_id, quantity in quantities.items():
+                Product.objects.filter(id=product_id).update(
+                    stock=F('stock') - quantity,
+                    sold_count=F('sold_count') + quantity
                 )
-                
-                # Giảm số lượng tồn kho và tăng số lượng đã bán
-                product = item_data['product']
-                product.stock -= item_data['quantity']
-                product.sold_count += item_data['quantity']
-                product.save()
+            
+            # Ghi lượt dùng mã giảm giá (UPDATE có điều kiện trên một mảnh bộ đếm)
+            if discount is not None:
+                try:
+                    promotions.apply_to_order(order, discount)
+                except promotions.CouponError as e:
+                    raise serializers.ValidationError({'coupon_code': [str(e)]})
+            
+            # Đặt hàng từ giỏ: làm trống giỏ trong cùng transaction
+            if cart is not None:
+                cart_services.clear(cart)
+            
+            # Ghi lịch sử trạng thái ban đầu
+            state_machine.record_created(order, changed_by=user)
+            
+            # Cộng vào bảng tổng hợp doanh số (dòng nóng: ghi cuối transaction)
+            rollups.record_created(order, sum(quantities.values()))
+            
+            # Thông báo xác nhận đặt hàng (worker gửi sau khi commit)
+            outbox.enqueue_order_event('order_created', order)
             
             return order
 
 
+class ShippingQuoteSerializer(serializers.Serializer):
+    """Serializer cho yêu cầu báo giá phí vận chuyển"""
+    city = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    district = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    # Không truyền items: báo giá cho giỏ hàng hiện tại
+    items = OrderItemCreateSerializer(many=True, required=False)
+    coupon_code = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+
 class OrderUpdateStatusSerializer(serializers.Serializer):
     """Serializer cho việc cập nhật trạng thái đơn hàng"""
     status = serializers.ChoiceField(
@@ -176,48 +334,71 @@ class OrderUpdateStatusSerializer(serializers.Serializer):
         order = self.context.get('order')
         current_status = order.status
         
-        # Định nghĩa các chuyển trạng thái hợp lệ
-        valid_transitions = {
-            'pending': ['confirmed', 'cancelled'],
-            'confirmed': ['processing', 'cancelled'],
-            'processing': ['shipping', 'cancelled'],
-            'shipping': ['delivered', 'returned'],
-            'delivered': [],
-            'cancelled': [],
-            'returned': []
-        }
-        
-        if value not in valid_transitions.get(current_status, []):
+        if not state_machine.can_transition(current_status, value):
             raise serializers.ValidationError(
-                f"Không thể chuyển từ trạng thái '{current_status}' sang '{value}'"
+                str(state_machine.InvalidTransition(current_status, value))
             )
         
         return value
     
     def update(self, instance, validated_data):
         """Cập nhật trạng thái đơn hàng"""
-        from django.utils import timezone
-        from django.db import transaction
+        request = self.context.get('request')
         
-        new_status = validated_data['status']
+        try:
+            return state_machine.transition(
+                instance,
+                validated_data['status'],
+                changed_by=request.user if request else None,
+                source=self.context.get('source', 'admin')
+            )
+        except state_machine.InvalidTransition as e:
+            raise serializers.ValidationError({'status': [str(e)]})
+
+
+class OrderBulkUpdateStatusSerializer(serializers.Serializer):
+    """Serializer cho việc cập nhật trạng thái nhiều đơn hàng cùng lúc"""
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+    status = serializers.ChoiceField(
+        choices=['pending', 'confirmed', 'processing', 'shipping', 'delivered', 'cancelled', 'returned']
+    )
+    
+    def validate_order_ids(self, value):
+        """Loại bỏ ID trùng lặp, giữ nguyên thứ tự"""
+        return list(dict.fromkeys(value))
+    
+    def save(self, **kwargs):
+        """
+        Cập nhật trạng thái hàng loạt
         
-        with transaction.atomic():
-            instance.status = new_status
-            
-            # Cập nhật các timestamp tương ứng
-            if new_status == 'confirmed':
-                instance.confirmed_at = timezone.now()
-            elif new_status == 'delivered':
-                instance.delivered_at = timezone.now()
-                instance.payment_status = 'paid'  # Đánh dấu đã thanh toán khi giao hàng thành công
-            elif new_status == 'cancelled':
-                # Hoàn lại số lượng tồn kho
-                for item in instance.items.all():
-                    product = item.product
-                    product.stock += item.quantity
-                    product.sold_count -= item.quantity
-                    product.save()
-            
-            instance.save()
+        Returns:
+            List kết quả theo từng đơn hàng (theo thứ tự order_ids)
+        """
+        request = self.context.get('request')
         
-        return instance
+        return state_machine.bulk_transition(
+            self.validated_data['order_ids'],
+            self.validated_data['status'],
+            changed_by=request.user if request else None,
+            source='admin'
+        )
+
+
+class RefundCreateSerializer(serializers.Serializer):
+    """Serializer cho việc tạo yêu cầu hoàn tiền (bỏ trống amount: hoàn phần còn lại)"""
+    amount = serializers.DecimalField(max_digits=12, decimal_places=0, min_value=1, required=False)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    
+    def save(self, **kwargs):
+        try:
+            return refunds.create_refund(
+                self.context['order'],
+                self.validated_data.get('amount'),
+                note=self.validated_data.get('note', '')
+            )
+        except refunds.RefundError as e:
+            raise serializers.ValidationError({'amount': [str(e)]})
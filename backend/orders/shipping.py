@@ -0,0 +1,194 @@
+"""
+Tính phí vận chuyển
+
+Quy tắc phí vận chuyển (ShippingRule) được đọc từ database một lần và biên
+dịch thành bảng tra cứu trong bộ nhớ: khu vực (tỉnh/thành, quận/huyện) ->
+danh sách khuyến mãi có thời hạn + các ngưỡng tạm tính đã sắp xếp (tra bằng
+bisect). Bảng được giữ theo từng process và biên dịch lại khi bảng quy tắc
+thay đổi (số quy tắc / updated_at mới nhất, kiểm tra mỗi
+SHIPPING_RULES_CHECK_INTERVAL giây), nên báo giá không tốn truy vấn.
+Dùng chung cho giỏ hàng, API báo giá và lúc đặt hàng.
+"""
+import re
+import unicodedata
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend.compiled_cache import CompiledCache, table_version
+
+
+# Quy tắc mặc định khi chưa cấu hình quy tắc nào (miễn phí nếu đơn hàng >= 500k)
+FREE_SHIPPING_THRESHOLD = Decimal('500000')
+DEFAULT_SHIPPING_FEE = Decimal('30000')
+
+ShippingQuote = namedtuple('ShippingQuote', ['fee', 'rule_id', 'rule_name'])
+
+AREA_PREFIX_PATTERN = re.compile(r'^(thanh pho|tp\.?|tinh|quan|huyen|thi xa|q\.?)\s+')
+WEIGHT_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*(kg|g|gr|gram|ml|l|lit)\b')
+WEIGHT_UNITS = {
+    'kg': Decimal('1'),
+    'g': Decimal('0.001'),
+    'gr': Decimal('0.001'),
+    'gram': Decimal('0.001'),
+    'l': Decimal('1'),
+    'lit': Decimal('1'),
+    'ml': Decimal('0.001'),
+}
+
+
+def _strip_accents(value):
+    value = unicodedata.normalize('NFKD', value.replace('đ', 'd').replace('Đ', 'D'))
+    return ''.join(ch for ch in value if not unicodedata.combining(ch))
+
+
+@lru_cache(maxsize=1024)
+def normalize_area(value):
+    """Chuẩn hóa tên khu vực: 'TP. Hồ Chí Minh' -> 'ho chi minh'"""
+    value = ' '.join(_strip_accents(value or '').lower().split())
+    return AREA_PREFIX_PATTERN.sub('', value)
+
+
+@lru_cache(maxsize=4096)
+def parse_weight_kg(value):
+    """
+    Đọc khối lượng (kg) từ chuỗi Product.weight: '500g', '1.5 kg', '1 lít'...
+
+    Trả về 0 nếu không đọc được đơn vị.
+    """
+    match = WEIGHT_PATTERN.search(_strip_accents(value or '').lower())
+    if not match:
+        return Decimal('0')
+    amount, unit = match.groups()
+    return Decimal(amount.replace(',', '.')) * WEIGHT_UNITS[unit]
+
+
+class _Rule:
+    """Quy tắc đã biên dịch"""
+    __slots__ = [
+        'id', 'name', 'min_subtotal', 'base_fee', 'included_weight_kg',
+        'per_kg_fee', 'valid_from', 'valid_to', 'priority'
+    ]
+
+    def __init__(self, rule):
+        for field in self.__slots__:
+            setattr(self, field, getattr(rule, field))
+
+    def is_valid_at(self, now):
+        return (
+            (self.valid_from is None or self.valid_from <= now) and
+            (self.valid_to is None or now <= self.valid_to)
+        )
+
+    def fee(self, weight_kg):
+        extra_weight = max(Decimal(weight_kg) - self.included_weight_kg, Decimal('0'))
+        return self.base_fee + (self.per_kg_fee * extra_weight).quantize(Decimal('1'))
+
+
+class _Area:
+    """Các quy tắc của một khu vực"""
+    __slots__ = ['promotions', 'thresholds', 'tiers']
+
+    def __init__(self, rules):
+        # Khuyến mãi: ưu tiên cao trước, cùng ưu tiên thì ngưỡng cao trước
+        self.promotions = sorted(
+            (rule for rule in rules if rule.valid_from or rule.valid_to),
+            key=lambda rule: (-rule.priority, -rule.min_subtotal)
+        )
+
+        # Quy tắc thường: mỗi ngưỡng giữ quy tắc có độ ưu tiên cao nhất
+        tiers = {}
+        for rule in rules:
+            if rule.valid_from or rule.valid_to:
+                continue
+            current = tiers.get(rule.min_subtotal)
+            if current is None or rule.priority > current.priority:
+                tiers[rule.min_subtotal] = rule
+        self.thresholds = sorted(tiers)
+        self.tiers = [tiers[threshold] for threshold in self.thresholds]
+
+    def match_promotion(self, subtotal, now):
+        for rule in self.promotions:
+            if subtotal >= rule.min_subtotal and rule.is_valid_at(now):
+                return rule
+        return None
+
+    def match_tier(self, subtotal):
+        index = bisect_right(self.thresholds, subtotal) - 1
+        return self.tiers[index] if index >= 0 else None
+
+
+def _default_rules():
+    from .models import ShippingRule
+    return [
+        ShippingRule(id=None, name='Phí vận chuyển tiêu chuẩn', base_fee=DEFAULT_SHIPPING_FEE),
+        ShippingRule(id=None, name='Miễn phí vận chuyển', min_subtotal=FREE_SHIPPING_THRESHOLD),
+    ]
+
+
+def build_rules():
+    """Biên dịch các quy tắc đang áp dụng thành bảng tra cứu theo khu vực"""
+    from .models import ShippingRule
+
+    rules = list(ShippingRule.objects.filter(is_active=True)) or _default_rules()
+
+    areas = {}
+    for rule in rules:
+        key = (normalize_area(rule.city), normalize_area(rule.district) if rule.city else '')
+        areas.setdefault(key, []).append(_Rule(rule))
+
+    return {key: _Area(area_rules) for key, area_rules in areas.items()}
+
+
+def rules_version():
+    """Version của bảng quy tắc (đọc từ database: mọi process thấy cùng thay đổi)"""
+    from .models import ShippingRule
+
+    return table_version(ShippingRule)()
+
+
+rules_cache = CompiledCache(
+    'shipping_rules',
+    build_rules,
+    check_interval=settings.SHIPPING_RULES_CHECK_INTERVAL,
+    version=rules_version
+)
+
+
+def quote(subtotal, city='', district='', weight_kg=0, now=None):
+    """
+    Báo giá phí vận chuyển
+
+    Khuyến mãi đang hiệu lực được xét trước quy tắc thường; ở mỗi loại,
+    quy tắc của quận/huyện được xét trước, sau đó tỉnh/thành, cuối cùng là
+    quy tắc mặc định (không chỉ định khu vực).
+    """
+    subtotal = Decimal(subtotal)
+    if subtotal <= 0:
+        return ShippingQuote(Decimal('0'), None, '')
+
+    areas = rules_cache.get()
+    now = now or timezone.now()
+    city = normalize_area(city)
+    district = normalize_area(district)
+
+    matched = [areas[key] for key in [(city, district), (city, ''), ('', '')] if key in areas]
+    for area in matched:
+        rule = area.match_promotion(subtotal, now)
+        if rule is not None:
+            return ShippingQuote(rule.fee(weight_kg), rule.id, rule.name)
+    for area in matched:
+        rule = area.match_tier(subtotal)
+        if rule is not None:
+            return ShippingQuote(rule.fee(weight_kg), rule.id, rule.name)
+
+    return ShippingQuote(DEFAULT_SHIPPING_FEE, None, '')
+
+
+def calculate_shipping_fee(subtotal, city='', district='', weight_kg=0):
+    """Phí vận chuyển theo tạm tính, khu vực giao hàng và khối lượng"""
+    return quote(subtotal, city, district, weight_kg).fee
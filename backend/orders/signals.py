@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ShippingRule
+from .shipping import rules_cache
+
+
+@receiver([post_save, post_delete], sender=ShippingRule)
+def invalidate_shipping_rules(sender, **kwargs):
+    """Biên dịch lại bảng quy tắc phí vận chuyển sau khi quy tắc thay đổi"""
+    transaction.on_commit(rules_cache.invalidate)
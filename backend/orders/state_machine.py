@@ -0,0 +1,229 @@
+"""
+Order status state machine
+Tập trung bảng chuyển trạng thái đơn hàng, cập nhật timestamp, hoàn kho,
+ghi yêu cầu hoàn tiền, bảng tổng hợp doanh số và lịch sử trạng thái trong
+cùng một transaction.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from notifications import outbox
+from products.models import Product
+from promotions import engine as promotions
+from .models import Order, OrderItem, OrderStatusHistory
+from . import refunds, rollups, tracking
+
+
+# Định nghĩa các chuyển trạng thái hợp lệ
+TRANSITIONS = {
+    'pending': ['confirmed', 'cancelled'],
+    'confirmed': ['processing', 'cancelled'],
+    'processing': ['shipping', 'cancelled'],
+    'shipping': ['delivered', 'returned'],
+    'delivered': [],
+    'cancelled': [],
+    'returned': []
+}
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+class InvalidTransition(Exception):
+    """Chuyển trạng thái không hợp lệ"""
+
+    def __init__(self, current_status, new_status):
+        self.current_status = current_status
+        self.new_status = new_status
+        super().__init__(
+            f"Không thể chuyển từ trạng thái '{current_status}' sang '{new_status}'"
+        )
+
+
+def can_transition(current_status, new_status):
+    """Kiểm tra có thể chuyển từ current_status sang new_status hay không"""
+    return new_status in TRANSITIONS.get(current_status, [])
+
+
+def _status_fields(new_status, now):
+    """Các field cần cập nhật kèm theo trạng thái mới"""
+    fields = {'status': new_status}
+    if new_status == 'confirmed':
+        fields['confirmed_at'] = now
+    elif new_status == 'delivered':
+        fields['delivered_at'] = now
+        fields['payment_status'] = 'paid'  # Đánh dấu đã thanh toán khi giao hàng thành công
+    return fields
+
+
+def _restock(order_ids):
+    """Hoàn lại tồn kho cho các đơn hàng: một câu UPDATE F() cho mỗi sản phẩm"""
+    restock = OrderItem.objects.filter(
+        order_id__in=order_ids
+    ).values('product_id').annotate(
+        quantity=Sum('quantity')
+    ).order_by('product_id')
+
+    for row in restock:
+        Product.objects.filter(id=row['product_id']).update(
+            stock=F('stock') + row['quantity'],
+            sold_count=F('sold_count') - row['quantity']
+        )
+
+
+def record_created(order, changed_by=None, source='checkout'):
+    """Ghi bản ghi lịch sử đầu tiên khi đơn hàng được tạo"""
+    return OrderStatusHistory.objects.create(
+        order=order,
+        from_status='',
+        status=order.status,
+        changed_by=changed_by,
+        source=source,
+        changed_at=order.created_at or timezone.now()
+    )
+
+
+def transition(order, new_status, changed_by=None, source='', note='', notify=True, update_fields=None):
+    """
+    Chuyển trạng thái một đơn hàng
+
+    Các thay đổi khác đã gán trên instance (ví dụ thông tin thanh toán)
+    được lưu cùng lúc với trạng thái mới; truyền update_fields để chỉ ghi
+    các field trạng thái cùng các field được liệt kê. Thông báo cho khách
+    hàng được ghi vào outbox trong cùng transaction (notify=False để bỏ qua).
+
+    Raises:
+        InvalidTransition: nếu chuyển trạng thái không hợp lệ
+    """
+    current_status = order.status
+    if not can_transition(current_status, new_status):
+        raise InvalidTransition(current_status, new_status)
+
+    now = timezone.now()
+    status_fields = _status_fields(new_status, now)
+    # rollups.tracking mở transaction và khóa đơn hàng trước khi ghi
+    with rollups.tracking([order.pk]):
+        for field, value in status_fields.items():
+            setattr(order, field, value)
+
+        if new_status == 'cancelled':
+            _restock([order.pk])
+            promotions.release_usage([order.pk])
+
+        if update_fields is None:
+            order.save()
+        else:
+            order.save(update_fields=[*status_fields, *update_fields, 'updated_at'])
+
+        if new_status in refunds.REFUND_STATUSES:
+            refunds.enqueue_for_orders([order.pk], new_status)
+
+        OrderStatusHistory.objects.create(
+            order=order,
+            from_status=current_status,
+            status=new_status,
+            changed_by=changed_by,
+            source=source,
+            note=note,
+            changed_at=now
+        )
+        if notify:
+            outbox.enqueue_order_event('order_status_changed', order)
+        tracking.refresh_on_commit([order.pk])
+
+    return order
+
+
+def bulk_transition(order_ids, new_status, changed_by=None, source='', note='', notify=True):
+    """
+    Chuyển trạng thái nhiều đơn hàng bằng các câu UPDATE theo tập hợp
+
+    Trạng thái hiện tại được đọc một lần (có khóa dòng), kiểm tra chuyển
+    trạng thái trong bộ nhớ, sau đó áp dụng bằng một câu UPDATE và một
+    câu INSERT lịch sử cho toàn bộ các đơn hợp lệ (notify=False để không
+    ghi thông báo đổi trạng thái).
+
+    Returns:
+        List kết quả theo từng đơn hàng (theo thứ tự order_ids)
+    """
+    now = timezone.now()
+    results = {}
+
+    with transaction.atomic():
+        # Khóa các đơn hàng theo thứ tự ID để tránh deadlock
+        current = {
+            row[0]: row[1:]
+            for row in Order.objects.select_for_update().filter(
+                id__in=order_ids
+            ).order_by('id').values_list('id', 'order_number', 'status', 'full_name', 'email', 'phone', 'total')
+        }
+
+        history = []
+        messages = []
+        for order_id in order_ids:
+            if order_id not in current:
+                results[order_id] = {
+                    'id': order_id,
+                    'success': False,
+                    'error': 'Không tìm thấy đơn hàng'
+                }
+                continue
+
+            order_number, current_status, full_name, email, phone, total = current[order_id]
+            if not can_transition(current_status, new_status):
+                results[order_id] = {
+                    'id': order_id,
+                    'order_number': order_number,
+                    'success': False,
+                    'status': current_status,
+                    'error': str(InvalidTransition(current_status, new_status))
+                }
+                continue
+
+            history.append(OrderStatusHistory(
+                order_id=order_id,
+                from_status=current_status,
+                status=new_status,
+                changed_by=changed_by,
+                source=source,
+                note=note,
+                changed_at=now
+            ))
+            if notify:
+                messages.extend(outbox.order_messages(
+                    'order_status_changed',
+                    order_number=order_number,
+                    full_name=full_name,
+                    email=email,
+                    phone=phone,
+                    total=float(total),
+                    status=new_status,
+                    status_display=STATUS_LABELS[new_status]
+                ))
+            results[order_id] = {
+                'id': order_id,
+                'order_number': order_number,
+                'success': True,
+                'previous_status': current_status,
+                'status': new_status
+            }
+
+        valid_ids = [entry.order_id for entry in history]
+        if valid_ids:
+            with rollups.tracking(valid_ids):
+                Order.objects.filter(id__in=valid_ids).update(
+                    updated_at=now,
+                    **_status_fields(new_status, now)
+                )
+
+            if new_status == 'cancelled':
+                _restock(valid_ids)
+                promotions.release_usage(valid_ids)
+            if new_status in refunds.REFUND_STATUSES:
+                refunds.enqueue_for_orders(valid_ids, new_status)
+
+            OrderStatusHistory.objects.bulk_create(history)
+            outbox.enqueue(messages)
+            tracking.refresh_on_commit(valid_ids)
+
+    return [results[order_id] for order_id in order_ids]
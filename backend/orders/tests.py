@@ -1,3 +1,997 @@
-from django.test import TestCase
+import csv
+import itertools
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from categories.models import Category
+from products.models import Product
+from users.models import User
+from .models import DailySalesRollup, Order, OrderItem, OrderStatusHistory, PaymentAttempt, PaymentEvent, Refund, ShippingRule
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from backend import compiled_cache
+from . import (
+    bank_statements, exports, gateway_client, payment_providers, payments, refunds, rollups, shipping,
+    state_machine, timeseries,
+)
+
+
+class OrderFixtures:
+    """Tạo danh mục, sản phẩm và đơn hàng dùng chung cho các test"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Rau củ')
+        cls.admin = User.objects.create_user(
+            username='admin', password='admin', phone='0900000000', role='admin'
+        )
+
+    def make_product(self, stock=10, sold_count=0, price=10000):
+        return Product.objects.create(
+            name=f'Sản phẩm {Product.objects.count() + 1}',
+            category=self.category,
+            price=price,
+            stock=stock,
+            sold_count=sold_count
+        )
+
+    def make_order(self, items, status='pending', payment_method='cod', payment_status='pending'):
+        """items: [(sản phẩm, số lượng)]"""
+        subtotal = sum(product.price * quantity for product, quantity in items)
+        order = Order.objects.create(
+            full_name='Nguyễn Văn A',
+            phone='0911111111',
+            address='1 Lê Lợi',
+            subtotal=subtotal,
+            total=subtotal,
+            status=status,
+            payment_method=payment_method,
+            payment_status=payment_status
+        )
+        for product, quantity in items:
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=quantity
+            )
+        return order
+
+
+class StateMachineTransitionTests(OrderFixtures, TestCase):
+    """state_machine.transition: bảng chuyển trạng thái, hoàn kho, lịch sử"""
+
+    def test_transition_matrix(self):
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        product = self.make_product(stock=1000)
+        for current_status in statuses:
+            for new_status in statuses:
+                with self.subTest(current_status=current_status, new_status=new_status):
+                    order = self.make_order([(product, 1)], status=current_status)
+                    allowed = new_status in state_machine.TRANSITIONS[current_status]
+                    self.assertEqual(state_machine.can_transition(current_status, new_status), allowed)
+                    if allowed:
+                        state_machine.transition(order, new_status, notify=False)
+                        order.refresh_from_db()
+                        self.assertEqual(order.status, new_status)
+                    else:
+                        with self.assertRaises(state_machine.InvalidTransition):
+                            state_machine.transition(order, new_status, notify=False)
+                        order.refresh_from_db()
+                        self.assertEqual(order.status, current_status)
+
+    def test_status_timestamps(self):
+        order = self.make_order([(self.make_product(), 1)])
+        state_machine.transition(order, 'confirmed', notify=False)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.confirmed_at)
+
+        for status in ['processing', 'shipping', 'delivered']:
+            state_machine.transition(order, status, notify=False)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.delivered_at)
+        self.assertEqual(order.payment_status, 'paid')
+
+    def test_cancel_restocks_once(self):
+        product = self.make_product(stock=5, sold_count=3)
+        order = self.make_order([(product, 3)], status='confirmed')
+
+        state_machine.transition(order, 'cancelled', notify=False)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold_count), (8, 0))
+
+        with self.assertRaises(state_machine.InvalidTransition):
+            state_machine.transition(order, 'cancelled', notify=False)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold_count), (8, 0))
+
+    def test_non_cancel_does_not_restock(self):
+        product = self.make_product(stock=5, sold_count=3)
+        order = self.make_order([(product, 3)])
+        state_machine.transition(order, 'confirmed', notify=False)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold_count), (5, 3))
+
+    def test_history_rows(self):
+        order = self.make_order([(self.make_product(), 1)])
+        state_machine.transition(order, 'confirmed', changed_by=self.admin, source='admin', notify=False)
+        state_machine.transition(order, 'cancelled', source='customer', note='Đổi ý', notify=False)
+
+        history = list(OrderStatusHistory.objects.filter(order=order).values_list(
+            'from_status', 'status', 'changed_by', 'source', 'note'
+        ))
+        self.assertEqual(history, [
+            ('pending', 'confirmed', self.admin.pk, 'admin', ''),
+            ('confirmed', 'cancelled', None, 'customer', 'Đổi ý'),
+        ])
+
+    def test_forbidden_transition_writes_no_history(self):
+        order = self.make_order([(self.make_product(), 1)], status='delivered')
+        with self.assertRaises(state_machine.InvalidTransition):
+            state_machine.transition(order, 'cancelled', notify=False)
+        self.assertFalse(OrderStatusHistory.objects.filter(order=order).exists())
+
+    def test_history_is_append_only(self):
+        order = self.make_order([(self.make_product(), 1)])
+        state_machine.transition(order, 'confirmed', notify=False)
+        entry = OrderStatusHistory.objects.get(order=order)
+        entry.note = 'Sửa'
+        with self.assertRaises(ValueError):
+            entry.save()
+
+
+class StateMachineBulkTransitionTests(OrderFixtures, TestCase):
+    """state_machine.bulk_transition: kết quả theo từng đơn, hoàn kho theo lô"""
+
+    def test_results_per_order(self):
+        product = self.make_product()
+        pending = self.make_order([(product, 1)])
+        delivered = self.make_order([(product, 1)], status='delivered')
+        missing_id = delivered.pk + 1000
+
+        results = state_machine.bulk_transition([pending.pk, delivered.pk, missing_id], 'cancelled', notify=False)
+
+        self.assertEqual([result['id'] for result in results], [pending.pk, delivered.pk, missing_id])
+        self.assertEqual([result['success'] for result in results], [True, False, False])
+        self.assertEqual(results[0]['previous_status'], 'pending')
+        self.assertEqual(results[1]['status'], 'delivered')
+        self.assertEqual(results[2]['error'], 'Không tìm thấy đơn hàng')
+
+        self.assertEqual(Order.objects.get(pk=pending.pk).status, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=delivered.pk).status, 'delivered')
+
+    def test_bulk_cancel_restocks_once(self):
+        first = self.make_product(stock=0, sold_count=5)
+        second = self.make_product(stock=0, sold_count=5)
+        orders = [
+            self.make_order([(first, 2), (second, 1)]),
+            self.make_order([(first, 3)], status='processing'),
+            self.make_order([(second, 4)], status='shipping'),
+        ]
+        order_ids = [order.pk for order in orders]
+
+        state_machine.bulk_transition(order_ids, 'cancelled', notify=False)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, first.sold_count), (5, 0))
+        self.assertEqual((second.stock, second.sold_count), (1, 4))
+
+        results = state_machine.bulk_transition(order_ids, 'cancelled', notify=False)
+        self.assertFalse(any(result['success'] for result in results))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, first.sold_count), (5, 0))
+        self.assertEqual((second.stock, second.sold_count), (1, 4))
+
+    def test_bulk_history_rows(self):
+        product = self.make_product()
+        orders = [self.make_order([(product, 1)]) for _ in range(3)]
+        state_machine.bulk_transition(
+            [order.pk for order in orders], 'confirmed', changed_by=self.admin, source='bulk', notify=False
+        )
+
+        history = OrderStatusHistory.objects.filter(order__in=orders)
+        self.assertEqual(history.count(), 3)
+        self.assertEqual(
+            set(history.values_list('from_status', 'status', 'changed_by', 'source')),
+            {('pending', 'confirmed', self.admin.pk, 'bulk')}
+        )
+        self.assertTrue(all(
+            order.confirmed_at is not None for order in Order.objects.filter(pk__in=[order.pk for order in orders])
+        ))
+
+    def test_bulk_delivered_marks_paid(self):
+        order = self.make_order([(self.make_product(), 1)], status='shipping')
+        state_machine.bulk_transition([order.pk], 'delivered', notify=False)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status), ('delivered', 'paid'))
+        self.assertIsNotNone(order.delivered_at)
+
+
+class PaymentTransitionTests(OrderFixtures, TestCase):
+    """payments.transition_payment / mark_paid: UPDATE có điều kiện theo payment_version"""
+
+    def setUp(self):
+        self.product = self.make_product()
+
+    def result(self, transaction_id='14000001'):
+        return SimpleNamespace(transaction_id=transaction_id, bank_code='NCB', bank_transaction_no='VNP001')
+
+    def test_transition_increments_version(self):
+        order = self.make_order([(self.product, 1)], payment_method='vnpay')
+        self.assertTrue(payments.transition_payment(order, 'paid', transaction_id='1'))
+        self.assertEqual((order.payment_status, order.payment_version), ('paid', 1))
+
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.payment_version, order.transaction_id), ('paid', 1, '1'))
+
+    def test_illegal_predecessor_is_rejected(self):
+        order = self.make_order([(self.product, 1)], payment_method='vnpay', payment_status='paid')
+        # paid -> failed không có trong PAYMENT_TRANSITIONS
+        self.assertFalse(payments.transition_payment(order, 'failed'))
+        self.assertFalse(payments.mark_failed(order))
+
+        pending = self.make_order([(self.product, 1)], payment_method='vnpay')
+        self.assertFalse(payments.transition_payment(pending, 'refunded'))
+
+        for instance in [order, pending]:
+            instance.refresh_from_db()
+        self.assertEqual((order.payment_status, order.payment_version), ('paid', 0))
+        self.assertEqual((pending.payment_status, pending.payment_version), ('pending', 0))
+
+    def test_stale_version_loses(self):
+        order = self.make_order([(self.product, 1)], payment_method='vnpay')
+        stale = Order.objects.get(pk=order.pk)
+        self.assertTrue(payments.transition_payment(order, 'failed', expected_version=0))
+
+        # Lần ghi thứ hai vẫn mang version cũ: không được ghi đè
+        self.assertFalse(payments.transition_payment(stale, 'paid', expected_version=0))
+        self.assertEqual((stale.payment_status, stale.payment_version), ('failed', 1))
+
+    def test_duplicate_mark_paid_is_noop(self):
+        order = self.make_order([(self.product, 1)], payment_method='vnpay')
+        self.assertTrue(payments.mark_paid(order, self.result(), source='vnpay'))
+
+        # Return URL và IPN cùng báo thành công: lần sau không ghi gì thêm
+        duplicate = Order.objects.get(pk=order.pk)
+        self.assertFalse(payments.mark_paid(duplicate, self.result(), source='vnpay_return'))
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status, order.payment_version), ('confirmed', 'paid', 1))
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=order).values_list('status', 'source')),
+            [('confirmed', 'vnpay')]
+        )
+
+    def test_paid_after_failed(self):
+        order = self.make_order([(self.product, 1)], payment_method='momo')
+        self.assertTrue(payments.mark_failed(order))
+        self.assertTrue(payments.mark_paid(order, self.result(), source='momo'))
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.payment_version), ('paid', 2))
+
+    def test_payment_on_cancelled_order_enqueues_refund(self):
+        order = self.make_order([(self.product, 2)], payment_method='vnpay')
+        state_machine.transition(order, 'cancelled', notify=False)
+        self.assertFalse(Refund.objects.exists())
+
+        self.assertTrue(payments.mark_paid(order, self.result(), source='vnpay'))
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status), ('cancelled', 'paid'))
+
+        refund = Refund.objects.get(order=order)
+        self.assertEqual((refund.reason, refund.amount, refund.refund_type), ('cancelled', order.total, 'full'))
+
+        # IPN trùng không tạo thêm yêu cầu hoàn tiền
+        self.assertFalse(payments.mark_paid(Order.objects.get(pk=order.pk), self.result(), source='vnpay'))
+        self.assertEqual(Refund.objects.filter(order=order).count(), 1)
+
+
+
+class PaymentAttemptTests(OrderFixtures, TestCase):
+    """payments.get_or_create_attempt: gọi cổng thanh toán ngoài transaction"""
+
+    def setUp(self):
+        self.order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        self.provider = mock.Mock()
+        self.provider.name = 'vnpay'
+        self.depth = len(connection.atomic_blocks)
+
+        def create_payment(order, ip_address, expires_at):
+            # Không có transaction nào đang mở (ngoài transaction của test), dòng giữ chỗ đã được ghi
+            self.assertEqual(len(connection.atomic_blocks), self.depth)
+            self.assertEqual(PaymentAttempt.objects.get(order=order).status, 'creating')
+            return payment_providers.PaymentRequest('https://pay.test/1', '20260101120000', {'qr': 'x'})
+
+        self.provider.create_payment.side_effect = create_payment
+
+    def test_create_then_reuse(self):
+        attempt, created = payments.get_or_create_attempt(self.order, self.provider)
+        self.assertTrue(created)
+        attempt = PaymentAttempt.objects.get(pk=attempt.pk)
+        self.assertEqual(
+            (attempt.status, attempt.payment_url, attempt.reference, attempt.response),
+            ('active', 'https://pay.test/1', '20260101120000', {'qr': 'x'})
+        )
+
+        again, created = payments.get_or_create_attempt(self.order, self.provider)
+        self.assertEqual((again.pk, created), (attempt.pk, False))
+        self.assertEqual(self.provider.create_payment.call_count, 1)
+
+    def test_gateway_error_releases_placeholder(self):
+        self.provider.create_payment.side_effect = payment_providers.PaymentProviderError('Từ chối')
+        with self.assertRaises(payment_providers.PaymentProviderError):
+            payments.get_or_create_attempt(self.order, self.provider)
+        self.assertFalse(PaymentAttempt.objects.exists())
+
+    def test_waits_for_attempt_being_created(self):
+        PaymentAttempt.objects.create(
+            order=self.order, gateway='vnpay', amount=self.order.total,
+            status='creating', expires_at=timezone.now() + timedelta(minutes=15)
+        )
+        clock = itertools.count(step=30)
+        with mock.patch.object(payments.time, 'monotonic', side_effect=lambda: next(clock)), \
+                mock.patch.object(payments.time, 'sleep') as sleep:
+            with self.assertRaises(payment_providers.PaymentProviderError):
+                payments.get_or_create_attempt(self.order, self.provider)
+        self.assertTrue(sleep.called)
+        self.provider.create_payment.assert_not_called()
+
+    def test_abandoned_placeholder_is_replaced(self):
+        stale = PaymentAttempt.objects.create(
+            order=self.order, gateway='vnpay', amount=self.order.total,
+            status='creating', expires_at=timezone.now() + timedelta(minutes=15)
+        )
+        PaymentAttempt.objects.filter(pk=stale.pk).update(
+            created_at=timezone.now() - payments.ATTEMPT_CREATING_TIMEOUT * 2
+        )
+        self.assertEqual(payments.expire_attempts(), 1)
+
+        self.provider.create_payment.side_effect = None
+        self.provider.create_payment.return_value = payment_providers.PaymentRequest('https://pay.test/2', 'ref', {})
+        attempt, created = payments.get_or_create_attempt(self.order, self.provider)
+        self.assertTrue(created)
+        self.assertEqual(payments.latest_references([self.order.pk]), {self.order.pk: 'ref'})
+
+class PaymentEventTests(OrderFixtures, TestCase):
+    """Inbox sự kiện thanh toán: IPN trùng được bỏ qua"""
+
+    def event_result(self, order, is_success=True, transaction_id='14000001'):
+        return SimpleNamespace(
+            order_number=order.order_number,
+            transaction_id=transaction_id,
+            is_success=is_success,
+            amount=order.total,
+            bank_code='NCB',
+            bank_transaction_no='VNP001',
+            message='Thành công' if is_success else 'Thất bại'
+        )
+
+    def test_duplicate_ipn_is_recorded_once(self):
+        order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        result = self.event_result(order)
+        self.assertTrue(payments.record_event('vnpay', result, {'vnp_TxnRef': order.order_number}))
+        self.assertFalse(payments.record_event('vnpay', result, {'vnp_TxnRef': order.order_number}))
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def process_all(self):
+        while True:
+            events = payments.claim_batch(10)
+            if not events:
+                return
+            payments.process_batch(events)
+
+    def test_events_applied_once(self):
+        order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        payments.record_event('vnpay', self.event_result(order), {})
+        payments.record_event('vnpay', self.event_result(order, transaction_id='14000002'), {})
+        self.process_all()
+
+        self.assertEqual(
+            list(PaymentEvent.objects.order_by('id').values_list('status', flat=True)),
+            ['processed', 'ignored']
+        )
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.payment_version), ('paid', 1))
+
+    def test_failure_after_paid_is_ignored(self):
+        order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        payments.record_event('vnpay', self.event_result(order), {})
+        payments.record_event('vnpay', self.event_result(order, is_success=False, transaction_id='0'), {'rsp': '24'})
+        self.process_all()
+
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'paid')
+        self.assertEqual(
+            list(PaymentEvent.objects.order_by('id').values_list('status', flat=True)),
+            ['processed', 'ignored']
+        )
+
+    def test_one_event_per_order_per_batch(self):
+        product = self.make_product()
+        first, second = [self.make_order([(product, 1)], payment_method='vnpay') for _ in range(2)]
+        for order, prefix in [(first, '1'), (second, '2')]:
+            payments.record_event('vnpay', self.event_result(order, transaction_id=f'{prefix}01'), {})
+            payments.record_event('vnpay', self.event_result(order, transaction_id=f'{prefix}02'), {})
+
+        events = payments.claim_batch(10)
+        self.assertEqual([event.transaction_id for event in events], ['101', '201'])
+        # Sự kiện đầu đang được xử lý: các sự kiện sau của cùng đơn hàng phải chờ
+        self.assertEqual(payments.claim_batch(10), [])
+
+    def test_retrying_event_blocks_later_events(self):
+        order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        payments.record_event('vnpay', self.event_result(order, is_success=False, transaction_id='0'), {})
+        payments.record_event('vnpay', self.event_result(order), {})
+
+        with mock.patch.object(payments, 'apply_event', side_effect=RuntimeError('db down')):
+            self.assertEqual(payments.process_batch(payments.claim_batch(10)), (0, 1))
+        first, second = PaymentEvent.objects.order_by('id')
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+
+        # Sự kiện đầu chờ backoff: sự kiện thành công đến sau không được áp dụng trước
+        self.assertEqual(payments.claim_batch(10), [])
+
+        PaymentEvent.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        self.process_all()
+        self.assertEqual(
+            list(PaymentEvent.objects.order_by('id').values_list('status', flat=True)),
+            ['processed', 'processed']
+        )
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.payment_version), ('paid', 2))
+
+    def test_failed_event_blocks_until_resolved(self):
+        order = self.make_order([(self.make_product(), 1)], payment_method='vnpay')
+        payments.record_event('vnpay', self.event_result(order, transaction_id='14000001'), {})
+        payments.record_event('vnpay', self.event_result(order, transaction_id='14000002'), {})
+
+        with self.settings(PAYMENT_EVENT_MAX_ATTEMPTS=1):
+            with mock.patch.object(payments, 'apply_event', side_effect=RuntimeError('db down')):
+                payments.process_batch(payments.claim_batch(10))
+        self.assertEqual(PaymentEvent.objects.order_by('id').first().status, 'failed')
+        self.assertEqual(payments.claim_batch(10), [])
+
+        PaymentEvent.objects.filter(status='failed').update(status='ignored')
+        self.assertEqual([event.transaction_id for event in payments.claim_batch(10)], ['14000002'])
+
+
+class BankStatementParsingTests(SimpleTestCase):
+    """bank_statements: đọc số tiền, mã đơn hàng và file sao kê"""
+
+    def test_parse_amount(self):
+        cases = [
+            ('1.250.000', Decimal('1250000')),
+            ('1,250,000', Decimal('1250000')),
+            ('1250000,00', Decimal('1250000')),
+            ('1250000.00', Decimal('1250000')),
+            ('1.250.000,50', Decimal('1250000.50')),
+            ('1,250,000.50', Decimal('1250000.50')),
+            ('1250000', Decimal('1250000')),
+            ('1.250', Decimal('1250')),
+            ('12,5', Decimal('12.5')),
+            ('250.000 VND', Decimal('250000')),
+            ('+1.000.000', Decimal('1000000')),
+            ('-500.000', Decimal('-500000')),
+            ('', None),
+            ('-', None),
+            ('abc', None),
+            (None, None),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(bank_statements.parse_amount(text), expected)
+
+    def test_extract_order_numbers(self):
+        cases = [
+            ('CK ORD20240101120000123456', ['ORD20240101120000123456']),
+            ('ord 20240101120000123456 thanh toan', ['ORD20240101120000123456']),
+            ('ORD.20240101120000123456', ['ORD20240101120000123456']),
+            # Mã đơn cũ: ORD + 14 chữ số
+            ('ORD-20231231235959', ['ORD20231231235959']),
+            ('TT ORD_20231231235959.', ['ORD20231231235959']),
+            ('ORD20240101120000123456 ORD20240101120000123456', ['ORD20240101120000123456']),
+            ('ORD20240101120000123456ORD20231231235959', ['ORD20240101120000123456', 'ORD20231231235959']),
+            # Không đúng 14 hoặc 20 chữ số
+            ('ORD202401011200001', []),
+            ('ORD2024010112000012345', []),
+            ('ORD202401011200001234567', []),
+            ('ORDER 20240101120000', []),
+            ('', []),
+        ]
+        for memo, expected in cases:
+            with self.subTest(memo=memo):
+                self.assertEqual(bank_statements.extract_order_numbers(memo), expected)
+
+    def test_iter_mt940(self):
+        stream = StringIO(
+            ':20:STMT240103\n'
+            ':25:0123456789\n'
+            ':28C:1/1\n'
+            ':60F:C240101VND0,\n'
+            ':61:2401010101C1250000,NTRFNONREF//FT24001\n'
+            ':86:CHUYEN KHOAN ORD20240101120000123456\n'
+            ' THANH TOAN DON HANG\n'
+            ':61:240102D500000,NTRF//FT24002\n'
+            ':86:RUT TIEN ORD20240101120000654321\n'
+            ':61:240103C300000,50NTRF\n'
+            ':86:ORD.20231231235959\n'
+            ':62F:C240103VND1050000,50\n'
+            '-}\n'
+        )
+        lines = list(bank_statements.iter_mt940(stream))
+        self.assertEqual(lines, [
+            bank_statements.StatementLine(
+                line_no=5,
+                date='240101',
+                amount=Decimal('1250000'),
+                memo='CHUYEN KHOAN ORD20240101120000123456 THANH TOAN DON HANG',
+                reference='FT24001'
+            ),
+            bank_statements.StatementLine(
+                line_no=10,
+                date='240103',
+                amount=Decimal('300000.50'),
+                memo='ORD.20231231235959',
+                reference=''
+            ),
+        ])
+
+    def test_iter_csv(self):
+        stream = StringIO(
+            'Ngày giao dịch;Số tiền ghi có;Nội dung;Mã giao dịch\n'
+            '01/01/2024;1.250.000;CK ORD20240101120000123456;FT001\n'
+            '01/01/2024;;Phi dich vu;FT002\n'
+            '02/01/2024;250.000,00;ORD20231231235959;FT003\n'
+        )
+        lines = list(bank_statements.iter_csv(stream))
+        self.assertEqual([(line.line_no, line.amount, line.reference) for line in lines], [
+            (2, Decimal('1250000'), 'FT001'),
+            (4, Decimal('250000'), 'FT003'),
+        ])
+
+    def test_iter_csv_requires_columns(self):
+        with self.assertRaises(bank_statements.StatementError):
+            list(bank_statements.iter_csv(StringIO('date,foo\n01/01/2024,1\n')))
+
+    def test_match_lines(self):
+        index = (
+            {
+                ('ORD20240101120000000001', Decimal('100000')): 1,
+                ('ORD20240101120000000002', Decimal('200000')): 2,
+                ('ORD20240101120000000003', Decimal('300000')): 3,
+                ('ORD20231231235959', Decimal('400000')): 4,
+            },
+            {
+                'ORD20240101120000000001': Decimal('100000'),
+                'ORD20240101120000000002': Decimal('200000'),
+                'ORD20240101120000000003': Decimal('300000'),
+                'ORD20231231235959': Decimal('400000'),
+            },
+        )
+        cases = [
+            ('CK ORD20240101120000000001', '100000', 'matched', 1),
+            ('ORD20240101120000000002', '150000', 'amount_mismatch', None),
+            ('ORD20240101120000999999', '100000', 'unmatched', None),
+            ('Chuyen tien', '100000', 'no_code', None),
+            # Nhiều mã trong một giao dịch
+            ('ORD20240101120000000002 ORD20240101120000000003', '500000', 'ambiguous', None),
+            # Hai giao dịch cùng khớp một đơn (mã cũ 14 chữ số)
+            ('TT ORD20231231235959', '400000', 'ambiguous', None),
+            ('ORD-20231231235959 lan 2', '400000', 'ambiguous', None),
+        ]
+        lines = [
+            bank_statements.StatementLine(line_no, '', Decimal(amount), memo, '')
+            for line_no, (memo, amount, _, _) in enumerate(cases, start=1)
+        ]
+        matches = bank_statements.match_lines(lines, index)
+
+        self.assertEqual(
+            [(match.line.line_no, match.result, match.order_id) for match in matches],
+            [(line_no, result, order_id) for line_no, (_, _, result, order_id) in enumerate(cases, start=1)]
+        )
+        self.assertEqual(matches[4].order_numbers, ['ORD20240101120000000002', 'ORD20240101120000000003'])
+        self.assertEqual(matches[5].detail, '2 giao dịch cho cùng một đơn hàng')
+        self.assertEqual(matches[6].order_numbers, ['ORD20231231235959'])
+
+
+class BankStatementReconcileTests(OrderFixtures, TestCase):
+    """bank_statements.reconcile: ghi nhận thanh toán cho đơn khớp duy nhất"""
+
+    def test_reconcile_legacy_and_current_order_numbers(self):
+        product = self.make_product()
+        legacy = self.make_order([(product, 2)], payment_method='banking')
+        Order.objects.filter(pk=legacy.pk).update(order_number='ORD20231231235959')
+        current = self.make_order([(product, 1)], payment_method='banking')
+
+        stream = StringIO(
+            'date,amount,description,reference\n'
+            '01/01/2024,"20,000",TT ORD 20231231235959,FT001\n'
+            f'01/01/2024,"10,000",CK {current.order_number},FT002\n'
+        )
+        matches, stats = bank_statements.reconcile(stream, 'csv')
+
+        self.assertEqual((stats['matched'], stats['applied']), (2, 2))
+        for order, reference in [(legacy, 'FT001'), (current, 'FT002')]:
+            order.refresh_from_db()
+            self.assertEqual(
+                (order.status, order.payment_status, order.transaction_id),
+                ('confirmed', 'paid', reference)
+            )
+
+        # Nạp lại cùng file: các đơn đã thanh toán không còn trong index
+        stream.seek(0)
+        _, stats = bank_statements.reconcile(stream, 'csv')
+        self.assertEqual((stats['unmatched'], stats['applied']), (2, 0))
+
+
+class SalesRollupTests(OrderFixtures, TestCase):
+    """rollups: số liệu của một khóa là tổng các mảnh, khớp với tính lại từ đầu"""
+
+    def totals(self):
+        return {
+            (row['status'], row['payment_method'], row['payment_status']): (row['orders'], row['revenue'])
+            for row in DailySalesRollup.objects.values(*rollups.KEY_FIELDS).annotate(
+                orders=Sum('order_count'),
+                revenue=Sum('revenue')
+            ).order_by()
+            if row['orders']
+        }
+
+    def test_prepare_day_creates_slots_once(self):
+        today = timezone.localdate()
+        with self.settings(SALES_ROLLUP_SLOTS=4):
+            rollups._prepared_days.clear()
+            rollups.prepare_day(today)
+            rollups.prepare_day(today)
+        self.assertEqual(
+            DailySalesRollup.objects.filter(date=today).count(),
+            4 * len(Order.PAYMENT_METHOD_CHOICES)
+        )
+        self.assertEqual(self.totals(), {})
+
+    def test_slots_sum_to_rebuilt_totals(self):
+        product = self.make_product(stock=100)
+        with self.settings(SALES_ROLLUP_SLOTS=4):
+            orders = []
+            for payment_method in ['cod', 'vnpay', 'cod', 'banking', 'cod']:
+                order = self.make_order([(product, 2)], payment_method=payment_method)
+                rollups.record_created(order, 2)
+                orders.append(order)
+            state_machine.transition(orders[0], 'cancelled', notify=False)
+            payments.mark_failed(orders[1])
+            state_machine.bulk_transition([orders[2].pk, orders[3].pk], 'confirmed', notify=False)
+
+        incremental = self.totals()
+        self.assertEqual(incremental[('pending', 'cod', 'pending')], (1, Decimal('20000')))
+        self.assertEqual(incremental[('cancelled', 'cod', 'pending')], (1, Decimal('20000')))
+        self.assertEqual(incremental[('pending', 'vnpay', 'failed')], (1, Decimal('20000')))
+
+        today = timezone.localdate()
+        rollups.rebuild_range(today, today)
+        self.assertEqual(self.totals(), incremental)
+        self.assertEqual(set(DailySalesRollup.objects.values_list('slot', flat=True)), {0})
+
+    def test_reports_sum_slots_before_filtering(self):
+        # Đơn được cộng vào một mảnh và chuyển trạng thái ở mảnh khác: từng
+        # mảnh có thể âm, báo cáo phải lọc trên tổng các mảnh
+        cache.clear()
+        product = self.make_product(stock=100)
+        slots = itertools.cycle(range(4))
+        with self.settings(SALES_ROLLUP_SLOTS=4), \
+                mock.patch.object(rollups.random, 'randrange', side_effect=lambda stop: next(slots)):
+            orders = []
+            for payment_method in ['cod', 'cod', 'cod', 'vnpay', 'cod']:
+                order = self.make_order([(product, 1)], payment_method=payment_method, payment_status='paid')
+                rollups.record_created(order, 1)
+                orders.append(order)
+            state_machine.bulk_transition([order.pk for order in orders[:4]], 'confirmed', notify=False)
+            state_machine.transition(orders[4], 'cancelled', notify=False)
+            orders[0].refresh_from_db()
+            for new_status in ['processing', 'shipping', 'delivered']:
+                state_machine.transition(orders[0], new_status, notify=False)
+        self.assertTrue(DailySalesRollup.objects.filter(order_count__lt=0).exists())
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.get('/api/reports/order_status_stats/')
+        self.assertEqual(
+            {row['status']: row['count'] for row in response.data},
+            {'confirmed': 3, 'delivered': 1, 'cancelled': 1}
+        )
+        response = client.get('/api/reports/payment_method_stats/')
+        self.assertEqual({row['payment_method']: row['count'] for row in response.data}, {'cod': 4, 'vnpay': 1})
+        response = client.get('/api/reports/daily_revenue/', {'days': 1})
+        self.assertEqual(
+            [(row['revenue'], row['orders_count']) for row in response.data][-1],
+            (Decimal('10000'), 1)
+        )
+        response = client.get('/api/reports/top_products/')
+        self.assertEqual([(row['product_id'], row['sold']) for row in response.data], [(product.pk, 1)])
+
+
+class ExportTests(OrderFixtures, TestCase):
+    """exports: CSV / XLSX được stream theo lô"""
+
+    def test_csv(self):
+        product = self.make_product()
+        orders = [self.make_order([(product, quantity)]) for quantity in [1, 2, 3]]
+        response = exports.export_orders(Order.objects.all(), 'csv')
+        content = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual(content[0].split(',')[0], 'Mã đơn hàng')
+        self.assertEqual([line.split(',')[0] for line in content[1:]], [order.order_number for order in reversed(orders)])
+
+    def test_xlsx_is_streamed_in_chunks(self):
+        rows = [(f'ORD{number}', 'Nguyễn <A> & B\x01', number, Decimal('15000')) for number in range(5)]
+        columns = [('order_number', 'Mã'), ('full_name', 'Tên'), ('quantity', 'SL'), ('total', 'Tổng')]
+        chunks = list(exports._stream_xlsx(iter(rows), columns, 'Orders', chunk_size=2))
+        self.assertGreater(len(chunks), 2)
+
+        with zipfile.ZipFile(BytesIO(b''.join(chunks))) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        values = [
+            [cell.findtext('x:v', namespaces=namespace) or cell.findtext('x:is/x:t', namespaces=namespace)
+             for cell in row.findall('x:c', namespace)]
+            for row in sheet.findall('x:sheetData/x:row', namespace)
+        ]
+        self.assertEqual(values[0], ['Mã', 'Tên', 'SL', 'Tổng'])
+        self.assertEqual(values[1:], [[f'ORD{number}', 'Nguyễn <A> & B', str(number), '15000'] for number in range(5)])
+
+    def test_xlsx_response(self):
+        self.make_order([(self.make_product(), 1)])
+        response = exports.export_order_items(OrderItem.objects.all(), 'xlsx')
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIsNone(archive.testzip())
+
+    def test_formulas_are_not_exported(self):
+        order = self.make_order([(self.make_product(), 1)])
+        injected = {
+            'full_name': '=HYPERLINK("http://evil.test","Xem")',
+            'address': '+1+cmd|\' /C calc\'!A0',
+            'email': '@SUM(1+1)',
+            'district': '-2+3',
+            'city': '\t=1+1',
+        }
+        Order.objects.filter(pk=order.pk).update(**injected)
+
+        response = exports.export_orders(Order.objects.all(), 'csv')
+        _, row = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        values = dict(zip([field for field, _ in exports.ORDER_COLUMNS], row))
+        for field, value in injected.items():
+            self.assertEqual(values[field], "'" + value)
+        self.assertEqual(values['total'], '10000')
+
+        response = exports.export_orders(Order.objects.all(), 'xlsx')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        cells = sheet.findall('x:sheetData/x:row', namespace)[1].findall('x:c', namespace)
+        self.assertEqual(sheet.findall('.//x:f', namespace), [])
+        for field, value in injected.items():
+            cell = cells[[name for name, _ in exports.ORDER_COLUMNS].index(field)]
+            self.assertEqual((cell.get('t'), cell.findtext('x:is/x:t', namespaces=namespace)), ('inlineStr', value))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """gateway_client.CircuitBreaker: request thử ở trạng thái half-open"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(gateway_client.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = gateway_client.CircuitBreaker(failure_threshold=2, reset_timeout=30, name='test')
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+        self.now += 30
+
+    def test_single_probe_when_half_open(self):
+        self.open_breaker()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_aborted_probe_allows_next_probe(self):
+        self.open_breaker()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.abort()
+        self.assertTrue(self.breaker.allow())
+
+    def test_abandoned_probe_times_out(self):
+        self.open_breaker()
+        self.assertTrue(self.breaker.allow())
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+
+    def test_client_releases_probe_on_unexpected_error(self):
+        client = gateway_client.GatewayClient('test')
+        client.breaker = self.breaker
+        self.open_breaker()
+
+        with mock.patch.object(client.session, 'post', side_effect=KeyError('result')):
+            with self.assertRaises(KeyError):
+                client.post_json('http://gateway.test/query', {})
+        self.assertEqual(self.breaker.state, 'half_open')
+
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'resultCode': 0}
+        with mock.patch.object(client.session, 'post', return_value=response):
+            self.assertEqual(client.post_json('http://gateway.test/query', {}), {'resultCode': 0})
+        self.assertEqual(self.breaker.state, 'closed')
+
+
+class GatewayClientErrorTests(SimpleTestCase):
+    """gateway_client: phân biệt request chưa tới cổng với request có thể đã được xử lý"""
+
+    def setUp(self):
+        self.client = gateway_client.GatewayClient('test')
+        patcher = mock.patch.object(gateway_client.time, 'sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, error, idempotent=False):
+        with mock.patch.object(self.client.session, 'post', side_effect=error) as post:
+            with self.assertRaises(gateway_client.GatewayError) as context:
+                self.client.post_json('http://gateway.test/refund', {}, idempotent=idempotent)
+        return context.exception, post.call_count
+
+    def test_connection_refused_is_unreachable(self):
+        reason = NewConnectionError(None, 'Connection refused')
+        error, calls = self.post(requests.exceptions.ConnectionError(MaxRetryError(None, '/refund', reason)))
+        self.assertIsInstance(error, gateway_client.GatewayUnreachableError)
+        self.assertEqual(calls, self.client.max_retries + 1)
+
+    def test_connect_timeout_is_unreachable(self):
+        error, _ = self.post(requests.exceptions.ConnectTimeout())
+        self.assertIsInstance(error, gateway_client.GatewayUnreachableError)
+
+    def test_read_timeout_is_not_retried_unless_idempotent(self):
+        error, calls = self.post(requests.exceptions.ReadTimeout())
+        self.assertNotIsInstance(error, gateway_client.GatewayUnreachableError)
+        self.assertEqual(calls, 1)
+
+        _, calls = self.post(requests.exceptions.ReadTimeout(), idempotent=True)
+        self.assertEqual(calls, self.client.max_retries + 1)
+
+    def test_dropped_connection_is_not_unreachable(self):
+        error, calls = self.post(requests.exceptions.ConnectionError('Connection aborted.'))
+        self.assertNotIsInstance(error, gateway_client.GatewayUnreachableError)
+        self.assertEqual(calls, 1)
+
+
+class RefundProcessorTests(OrderFixtures, TestCase):
+    """refunds: chỉ gửi lại yêu cầu hoàn tiền chắc chắn chưa tới cổng"""
+
+    def setUp(self):
+        product = self.make_product()
+        self.order = self.make_order([(product, 1)], status='cancelled', payment_method='vnpay', payment_status='paid')
+        refunds.enqueue_for_orders([self.order.pk], 'cancelled')
+        self.refund = Refund.objects.get(order=self.order)
+
+    def run_processor(self, error):
+        gateway = mock.Mock()
+        gateway.post_json.side_effect = error
+        provider = payment_providers.VNPayProvider()
+        with mock.patch('orders.vnpay.get_client', return_value=gateway):
+            refunds.RefundProcessor(providers={'vnpay': provider}, concurrency=1, rate_limits={}).run()
+        self.refund.refresh_from_db()
+        return gateway.post_json.call_count
+
+    def test_unreachable_gateway_is_retried(self):
+        self.run_processor(gateway_client.GatewayUnreachableError('Connection refused'))
+        self.assertEqual((self.refund.status, self.refund.attempts), ('pending', 1))
+
+    def test_timeout_needs_review(self):
+        self.run_processor(gateway_client.GatewayError('Read timed out'))
+        self.assertEqual(self.refund.status, 'review')
+
+        # Không được nhận lại, không tạo thêm yêu cầu hoàn phần tiền đang chờ kiểm tra
+        Refund.objects.filter(pk=self.refund.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(refunds.claim_batch(10), [])
+        self.assertEqual(refunds.enqueue_for_orders([self.order.pk], 'returned'), 0)
+
+    def test_confirm_reviewed_refund(self):
+        self.run_processor(gateway_client.GatewayError('Read timed out'))
+        self.assertEqual(refunds.confirm_refunds([self.refund.pk]), 1)
+        self.assertEqual(refunds.confirm_refunds([self.refund.pk]), 0)
+
+        self.refund.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.refund.status, 'succeeded')
+        self.assertEqual((self.order.refunded_amount, self.order.payment_status), (self.order.total, 'refunded'))
+
+    def test_requeue_reviewed_refund(self):
+        self.run_processor(gateway_client.GatewayError('Read timed out'))
+        self.assertEqual(refunds.requeue_refunds([self.refund.pk]), 1)
+        self.assertEqual([refund.pk for refund in refunds.claim_batch(10)], [self.refund.pk])
+
+
+class ShippingRulesCacheTests(TestCase):
+    """shipping.rules_cache: thay đổi quy tắc ở process khác được nhận qua version trong database"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(compiled_cache.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        shipping.rules_cache._version = None
+        self.addCleanup(setattr, shipping.rules_cache, '_version', None)
+
+    def test_change_without_invalidate_is_picked_up(self):
+        rule = ShippingRule.objects.create(name='Mặc định', base_fee=20000)
+        self.assertEqual(shipping.quote(100000).fee, 20000)
+
+        # Process khác sửa quy tắc: không đổi version trong cache (LocMemCache) của process này
+        ShippingRule.objects.filter(pk=rule.pk).update(base_fee=35000, updated_at=timezone.now())
+        self.assertEqual(shipping.quote(100000).fee, 20000)
+
+        self.now += shipping.rules_cache.check_interval
+        self.assertEqual(shipping.quote(100000).fee, 35000)
+
+        ShippingRule.objects.filter(pk=rule.pk).delete()
+        self.now += shipping.rules_cache.check_interval
+        self.assertEqual(shipping.quote(100000).fee, shipping.DEFAULT_SHIPPING_FEE)
+
+
+class DateRangeTests(SimpleTestCase):
+    """timeseries.date_range: đủ các mốc giữa hai ngày"""
+
+    def test_buckets(self):
+        cases = [
+            ('day', date(2024, 2, 27), date(2024, 3, 1), [date(2024, 2, 27), date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1)]),
+            ('week', date(2024, 1, 3), date(2024, 1, 15), [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 15)]),
+            ('month', date(2023, 11, 30), date(2024, 2, 1), [date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)]),
+            ('day', date(2024, 3, 2), date(2024, 3, 1), []),
+            ('month', date(2024, 3, 31), date(2024, 3, 1), [date(2024, 3, 1)]),
+        ]
+        for interval, start, end, expected in cases:
+            with self.subTest(interval=interval, start=start, end=end):
+                self.assertEqual(timeseries.date_range(start, end, interval), expected)
+
+    def test_matches_buckets_of_each_day(self):
+        start = date(2023, 12, 20)
+        for interval in timeseries.INTERVALS:
+            for length in [0, 1, 6, 7, 31, 45, 400]:
+                end = start + timedelta(days=length)
+                days = (start + timedelta(days=offset) for offset in range(length + 1))
+                with self.subTest(interval=interval, length=length):
+                    self.assertEqual(
+                        timeseries.date_range(start, end, interval),
+                        sorted({timeseries.bucket_start(day, interval) for day in days})
+                    )
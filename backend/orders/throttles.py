@@ -0,0 +1,12 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class OrderTrackingThrottle(SimpleRateThrottle):
+    """Giới hạn số lượt tra cứu đơn hàng theo IP (áp dụng cả khi đã đăng nhập)"""
+    scope = 'order_tracking'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
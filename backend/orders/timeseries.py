@@ -0,0 +1,97 @@
+"""
+Truy vấn chuỗi thời gian cho báo cáo
+
+series() nhóm một queryset theo ngày / tuần (bắt đầu thứ 2) / tháng theo
+múi giờ cấu hình (TIME_ZONE) và điền các mốc không có dữ liệu bằng 0.
+Chỉ dùng hàm Trunc của Django nên chạy được trên MySQL, PostgreSQL và
+SQLite:
+
+- DateField (ví dụ DailySalesRollup.date, đã là ngày địa phương): Trunc
+  trên cột ngày, không chuyển múi giờ trong SQL.
+- DateTimeField: Trunc với tzinfo múi giờ hiện tại (MySQL cần nạp bảng
+  múi giờ, xem mysql_tzinfo_to_sql).
+"""
+from datetime import date, datetime, timedelta
+
+from django.db import models
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+
+TRUNCATE = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+INTERVALS = list(TRUNCATE)
+
+
+def bucket_start(day, interval):
+    """Ngày đầu của mốc chứa `day` (thứ 2 với tuần, ngày 1 với tháng)"""
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def date_range(start_day, end_day, interval):
+    """
+    Các mốc từ mốc chứa start_day đến mốc chứa end_day (bao gồm)
+
+    Số mốc được tính trước, cả danh sách sinh trong một lần theo chỉ số mốc.
+    """
+    start = bucket_start(start_day, interval)
+    end = bucket_start(end_day, interval)
+    if end < start:
+        return []
+    if interval == 'month':
+        # Chỉ số tháng liên tục: năm * 12 + (tháng - 1)
+        first = start.year * 12 + start.month - 1
+        last = end.year * 12 + end.month - 1
+        return [date(index // 12, index % 12 + 1, 1) for index in range(first, last + 1)]
+    step = 7 if interval == 'week' else 1
+    return [start + timedelta(days=offset * step) for offset in range((end - start).days // step + 1)]
+
+
+def _local_day(value):
+    """Giá trị Trunc trả về (date hoặc datetime aware) -> ngày địa phương"""
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def series(queryset, field, interval, start_day, end_day, **aggregates):
+    """
+    Nhóm queryset theo mốc thời gian và điền các mốc trống
+
+    Args:
+        queryset: Queryset đã lọc sẵn khoảng thời gian
+        field: Tên cột ngày / thời gian dùng để nhóm
+        interval: 'day', 'week' hoặc 'month'
+        start_day, end_day: Khoảng ngày (địa phương) cần trả về đủ các mốc
+        aggregates: Tên giá trị -> biểu thức tổng hợp (Sum, Count, ...)
+
+    Returns:
+        List dict {'bucket': ngày đầu mốc, <giá trị>...} theo thứ tự thời gian;
+        mốc không có dữ liệu có giá trị 0
+    """
+    if interval not in TRUNCATE:
+        raise ValueError(f"interval phải là một trong {', '.join(INTERVALS)}")
+
+    trunc_kwargs = {}
+    if isinstance(queryset.model._meta.get_field(field), models.DateTimeField):
+        trunc_kwargs['tzinfo'] = timezone.get_current_timezone()
+
+    rows = queryset.annotate(
+        bucket=TRUNCATE[interval](field, **trunc_kwargs)
+    ).values('bucket').annotate(**aggregates).order_by()
+
+    values = {_local_day(row.pop('bucket')): row for row in rows}
+
+    empty = dict.fromkeys(aggregates, 0)
+    return [
+        {'bucket': bucket, **values.get(bucket, empty)}
+        for bucket in date_range(start_day, end_day, interval)
+    ]
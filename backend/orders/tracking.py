@@ -0,0 +1,118 @@
+"""
+Tra cứu đơn hàng công khai (guest checkout) theo mã đơn hàng + số điện thoại
+
+Mỗi đơn hàng có một bản chiếu trạng thái tối giản trong cache, được làm mới
+sau mỗi lần thay đổi trạng thái (sau khi transaction commit), nên các lượt
+hỏi "đơn của tôi đang ở đâu" không cần truy vấn database.
+"""
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Order, ArchivedOrder, OrderStatusHistory
+
+
+CACHE_KEY = 'orders:tracking:{}'
+# Đánh dấu mã đơn hàng không tồn tại để tránh truy vấn lặp lại
+NOT_FOUND = '__not_found__'
+NOT_FOUND_TIMEOUT = 60
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+PAYMENT_STATUS_LABELS = dict(Order.PAYMENT_STATUS_CHOICES)
+
+
+def normalize_phone(phone):
+    """Chuẩn hóa số điện thoại: chỉ giữ chữ số, +84xxx -> 0xxx"""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('84') and len(digits) == 11:
+        digits = '0' + digits[2:]
+    return digits
+
+
+def _phone_hash(phone):
+    return hashlib.sha256(normalize_phone(phone).encode('utf-8')).hexdigest()
+
+
+def build_projection(order, history=None):
+    """Bản chiếu trạng thái tối giản của đơn hàng (lưu trong cache)"""
+    if history is None:
+        history = OrderStatusHistory.objects.filter(order_id=order.id)
+
+    return {
+        'phone_hash': _phone_hash(order.phone),
+        'order_number': order.order_number,
+        'status': order.status,
+        'status_display': STATUS_LABELS.get(order.status, order.status),
+        'payment_method': order.payment_method,
+        'payment_status': order.payment_status,
+        'payment_status_display': PAYMENT_STATUS_LABELS.get(order.payment_status, order.payment_status),
+        'total': float(order.total),
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'confirmed_at': order.confirmed_at.isoformat() if order.confirmed_at else None,
+        'delivered_at': order.delivered_at.isoformat() if order.delivered_at else None,
+        'status_history': [
+            {
+                'status': entry.status,
+                'status_display': STATUS_LABELS.get(entry.status, entry.status),
+                'changed_at': entry.changed_at.isoformat()
+            }
+            for entry in history
+        ]
+    }
+
+
+def _load(order_number):
+    """Đọc đơn hàng từ database (kể cả bảng lưu trữ) và ghi vào cache"""
+    order = Order.objects.filter(order_number=order_number).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(order_number=order_number).first()
+
+    if order is None:
+        cache.set(CACHE_KEY.format(order_number), NOT_FOUND, NOT_FOUND_TIMEOUT)
+        return None
+
+    projection = build_projection(order)
+    cache.set(CACHE_KEY.format(order_number), projection, settings.ORDER_TRACKING_CACHE_TIMEOUT)
+    return projection
+
+
+def lookup(order_number, phone):
+    """
+    Tra cứu đơn hàng
+
+    Returns:
+        Dict trạng thái đơn hàng (không gồm thông tin nhạy cảm),
+        hoặc None nếu không tìm thấy / số điện thoại không khớp
+    """
+    projection = cache.get(CACHE_KEY.format(order_number))
+    if projection is None:
+        projection = _load(order_number)
+    if not projection or projection == NOT_FOUND:
+        return None
+
+    if not hmac.compare_digest(projection['phone_hash'], _phone_hash(phone)):
+        return None
+
+    return {key: value for key, value in projection.items() if key != 'phone_hash'}
+
+
+def refresh(order_ids):
+    """Làm mới cache tra cứu cho các đơn hàng"""
+    orders = Order.objects.filter(id__in=order_ids).prefetch_related('status_history')
+    cache.set_many(
+        {
+            CACHE_KEY.format(order.order_number): build_projection(order, order.status_history.all())
+            for order in orders
+        },
+        settings.ORDER_TRACKING_CACHE_TIMEOUT
+    )
+
+
+def refresh_on_commit(order_ids):
+    """Làm mới cache sau khi transaction hiện tại commit thành công"""
+    order_ids = list(order_ids)
+    transaction.on_commit(lambda: refresh(order_ids))
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet
+from .views import OrderViewSet, ShippingViewSet
 from .reports import ReportViewSet
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'shipping', ShippingViewSet, basename='shipping')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,29 @@
+"""
+Helpers dùng chung cho app orders
+"""
+import logging
+from datetime import datetime
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_date(date_str, default=None):
+    """Parse date string safely"""
+    if not date_str:
+        return default
+    try:
+        # Remove timezone indicator and parse
+        date_str = date_str.replace('Z', '').replace('+00:00', '')
+        if 'T' in date_str:
+            dt = datetime.strptime(date_str.split('.')[0], '%Y-%m-%dT%H:%M:%S')
+        else:
+            dt = datetime.strptime(date_str, '%Y-%m-%d')
+        # Make timezone aware
+        if timezone.is_naive(dt):
+            dt = timezone.make_aware(dt)
+        return dt
+    except Exception as e:
+        logger.debug('parse_date_failed', extra={'value': date_str, 'error': str(e)})
+        return default
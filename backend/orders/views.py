@@ -1,18 +1,36 @@
+import io
+import itertools
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.db import transaction
 from django.db.models import Q
-from django.conf import settings
 from django.shortcuts import redirect
-from .models import Order, OrderItem
+from django.http import Http404
+from datetime import timedelta
+from decimal import Decimal
+from carts import services as cart_services
+from products.models import Product
+from promotions import engine as promotions
+from .models import Order, OrderItem, ArchivedOrder
 from .serializers import (
     OrderSerializer,
+    ArchivedOrderSerializer,
     OrderCreateSerializer,
-    OrderUpdateStatusSerializer
+    OrderUpdateStatusSerializer,
+    OrderBulkUpdateStatusSerializer,
+    ShippingQuoteSerializer,
+    RefundCreateSerializer
 )
-from .vnpay import VNPay
-from .momo import MoMo
+from .utils import parse_date
+from .throttles import OrderTrackingThrottle
+from . import archive, bank_statements, exports, payment_providers, payments, rollups, shipping, tracking
+
+
+logger = logging.getLogger(__name__)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -20,9 +38,12 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     
+    # Số giao dịch cần kiểm tra trả về tối đa khi đối soát sao kê qua API
+    STATEMENT_ISSUE_LIMIT = 500
+    
     def get_permissions(self):
         """Phân quyền"""
-        if self.action in ['create', 'create_vnpay_payment', 'vnpay_return', 'create_momo_payment', 'momo_return', 'momo_ipn']:
+        if self.action in ['create', 'track', 'create_vnpay_payment', 'vnpay_return', 'create_momo_payment', 'momo_return', 'momo_ipn', 'vnpay_ipn']:
             # Cho phép tạo đơn hàng và thanh toán không cần đăng nhập (guest checkout)
             return [AllowAny()]
         return [IsAuthenticated()]
@@ -36,12 +57,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         # Admin có thể xem tất cả đơn hàng
         if user.role == 'admin':
-            return Order.objects.all().prefetch_related('items', 'items__product')
+            return Order.objects.all().prefetch_related('items', 'items__product', 'status_history')
         
         # User chỉ xem được đơn hàng của mình
         return Order.objects.filter(
             Q(user=user) | Q(email=user.email)
-        ).prefetch_related('items', 'items__product')
+        ).prefetch_related('items', 'items__product', 'status_history')
     
     def get_serializer_class(self):
         """Chọn serializer phù hợp"""
@@ -49,6 +70,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderCreateSerializer
         elif self.action == 'update_status':
             return OrderUpdateStatusSerializer
+        elif self.action == 'bulk_update_status':
+            return OrderBulkUpdateStatusSerializer
         return OrderSerializer
     
     def create(self, request, *args, **kwargs):
@@ -69,32 +92,101 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    def perform_update(self, serializer):
+        """Cập nhật đơn hàng (PUT/PATCH) kèm bảng tổng hợp doanh số"""
+        with rollups.tracking([serializer.instance.pk]):
+            serializer.save()
+    
+    def perform_destroy(self, instance):
+        """Xóa đơn hàng và trừ khỏi bảng tổng hợp doanh số"""
+        with transaction.atomic():
+            rollups.record_deleted([instance.pk])
+            instance.delete()
+    
     def list(self, request, *args, **kwargs):
         """Lấy danh sách đơn hàng"""
         queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.filter(**self._order_filters(request))
+        
+        # Khách hàng luôn xem được cả đơn hàng đã lưu trữ (sau các đơn hiện tại);
+        # admin cần truyền include_archived=true
+        include_archived = request.query_params.get('include_archived') in ['true', '1']
+        if request.user.role != 'admin' or include_archived:
+            queryset = archive.CombinedOrderList(
+                queryset,
+                self._get_archived_queryset().filter(**self._order_filters(request))
+            )
+        
+        # Phân trang
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self._serialize_orders(page))
+        
+        return Response(self._serialize_orders(queryset))
+    
+    def _get_archived_queryset(self):
+        """Queryset đơn hàng đã lưu trữ theo quyền của user"""
+        user = self.request.user
+        queryset = ArchivedOrder.objects.prefetch_related('items')
+        
+        if user.role == 'admin':
+            return queryset
+        
+        return queryset.filter(Q(user=user) | Q(email=user.email))
+    
+    def _serialize_orders(self, orders):
+        """Serialize danh sách gồm cả đơn hàng hiện tại và đơn hàng đã lưu trữ"""
+        return [
+            ArchivedOrderSerializer(order).data if isinstance(order, ArchivedOrder)
+            else OrderSerializer(order).data
+            for order in orders
+        ]
+    
+    def _order_filters(self, request, prefix=''):
+        """
+        Điều kiện lọc đơn hàng dùng chung cho list và export
+        
+        Hỗ trợ: status, payment_method, start_date, end_date
+        (end_date dạng YYYY-MM-DD được tính trọn ngày)
+        """
+        filters = {}
         
         # Lọc theo trạng thái nếu có
         status_filter = request.query_params.get('status', None)
         if status_filter:
-            queryset = queryset.filter(status=status_filter)
+            filters[f'{prefix}status'] = status_filter
         
         # Lọc theo phương thức thanh toán nếu có
         payment_method = request.query_params.get('payment_method', None)
         if payment_method:
-            queryset = queryset.filter(payment_method=payment_method)
+            filters[f'{prefix}payment_method'] = payment_method
         
-        # Phân trang
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        # Lọc theo khoảng thời gian tạo đơn
+        start_date = parse_date(request.query_params.get('start_date'))
+        if start_date:
+            filters[f'{prefix}created_at__gte'] = start_date
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        end_date_str = request.query_params.get('end_date')
+        end_date = parse_date(end_date_str)
+        if end_date:
+            if 'T' in end_date_str:
+                filters[f'{prefix}created_at__lte'] = end_date
+            else:
+                filters[f'{prefix}created_at__lt'] = end_date + timedelta(days=1)
+        
+        return filters
     
     def retrieve(self, request, *args, **kwargs):
-        """Lấy chi tiết đơn hàng"""
-        instance = self.get_object()
+        """Lấy chi tiết đơn hàng (tự động tìm trong bảng lưu trữ)"""
+        try:
+            instance = self.get_object()
+        except Http404:
+            pk = str(kwargs.get('pk', ''))
+            instance = self._get_archived_queryset().filter(pk=pk).first() if pk.isdigit() else None
+            if instance is None:
+                raise
+            return Response(ArchivedOrderSerializer(instance).data)
+        
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
@@ -113,7 +205,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(
             order,
             data=request.data,
-            context={'order': order}
+            context={'order': order, 'request': request, 'source': 'admin'}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -127,6 +219,31 @@ class OrderViewSet(viewsets.ModelViewSet):
             }
         )
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_update_status(self, request):
+        """
+        Cập nhật trạng thái nhiều đơn hàng trong một request (chỉ dành cho admin)
+        
+        Body: {"order_ids": [1, 2, 3], "status": "shipping"}
+        """
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Bạn không có quyền cập nhật trạng thái đơn hàng'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        
+        updated_count = sum(1 for result in results if result['success'])
+        return Response({
+            'message': f'Cập nhật trạng thái thành công {updated_count}/{len(results)} đơn hàng',
+            'updated_count': updated_count,
+            'failed_count': len(results) - updated_count,
+            'results': results
+        })
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def cancel(self, request, pk=None):
         """Hủy đơn hàng"""
@@ -150,7 +267,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = OrderUpdateStatusSerializer(
             order,
             data={'status': 'cancelled'},
-            context={'order': order}
+            context={
+                'order': order,
+                'request': request,
+                'source': 'admin' if request.user.role == 'admin' else 'customer'
+            }
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -164,6 +285,63 @@ class OrderViewSet(viewsets.ModelViewSet):
             }
         )
     
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def refund(self, request, pk=None):
+        """
+        Tạo yêu cầu hoàn tiền cho đơn đã thanh toán online (chỉ dành cho admin)
+        
+        Body: {"amount": 50000, "note": "..."} (bỏ trống amount để hoàn phần còn lại)
+        """
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Bạn không có quyền hoàn tiền đơn hàng'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        order = self.get_object()
+        serializer = RefundCreateSerializer(data=request.data, context={'order': order})
+        serializer.is_valid(raise_exception=True)
+        refund = serializer.save()
+        
+        return Response({
+            'message': 'Đã tạo yêu cầu hoàn tiền',
+            'reference': refund.reference,
+            'amount': refund.amount,
+            'refund_type': refund.refund_type,
+            'status': refund.status
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny],
+        throttle_classes=[OrderTrackingThrottle]
+    )
+    def track(self, request):
+        """
+        Tra cứu đơn hàng công khai (không cần đăng nhập)
+        
+        Query params: order_number, phone
+        """
+        order_number = request.query_params.get('order_number', '').strip()
+        phone = request.query_params.get('phone', '').strip()
+        
+        if not order_number or not phone:
+            return Response(
+                {'error': 'Vui lòng cung cấp mã đơn hàng và số điện thoại'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = tracking.lookup(order_number, phone)
+        if result is None:
+            # Cùng một thông báo cho cả hai trường hợp để tránh dò mã đơn hàng
+            return Response(
+                {'error': 'Không tìm thấy đơn hàng với mã và số điện thoại đã nhập'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(result)
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def statistics(self, request):
         """Thống kê đơn hàng (chỉ dành cho admin)"""
@@ -175,180 +353,168 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         from django.db.models import Count, Sum
         
-        # Thống kê tổng quan
-        total_orders = Order.objects.count()
-        total_revenue = Order.objects.filter(
-            status='delivered',
-            payment_status='paid'
-        ).aggregate(Sum('total'))['total__sum'] or 0
+        # Thống kê tổng quan (bao gồm cả đơn hàng đã lưu trữ)
+        sources = [model for model, _ in archive.order_sources()]
+        total_orders = sum(model.objects.count() for model in sources)
+        total_revenue = sum(
+            model.objects.filter(
+                status='delivered',
+                payment_status='paid'
+            ).aggregate(Sum('total'))['total__sum'] or 0
+            for model in sources
+        )
         
         # Thống kê theo trạng thái
-        status_stats = Order.objects.values('status').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        status_stats = archive.merge_grouped(
+            [row for model in sources for row in model.objects.values('status').annotate(
+                count=Count('id')
+            ).order_by()],
+            keys=['status'],
+            sums=['count'],
+            order_by='count'
+        )
         
         # Thống kê theo phương thức thanh toán
-        payment_stats = Order.objects.values('payment_method').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        payment_stats = archive.merge_grouped(
+            [row for model in sources for row in model.objects.values('payment_method').annotate(
+                count=Count('id')
+            ).order_by()],
+            keys=['payment_method'],
+            sums=['count'],
+            order_by='count'
+        )
         
         return Response({
             'total_orders': total_orders,
             'total_revenue': float(total_revenue),
-            'status_statistics': list(status_stats),
-            'payment_statistics': list(payment_stats)
+            'status_statistics': status_stats,
+            'payment_statistics': payment_stats
         })
     
-    @action(detail=True, methods=['post'], permission_classes=[AllowAny])
-    def create_vnpay_payment(self, request, pk=None):
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
         """
-        Tạo URL thanh toán VNPay cho đơn hàng
+        Export danh sách đơn hàng (chỉ dành cho admin)
+        
+        Query params: status, payment_method, start_date, end_date,
+        file_format (csv|xlsx, mặc định csv)
         """
-        # Lấy order theo ID trực tiếp, không qua get_object() để bypass permission check
-        try:
-            order = Order.objects.get(pk=pk)
-        except Order.DoesNotExist:
+        return self._export(request, items=False)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export_items(self, request):
+        """Export chi tiết đơn hàng (chỉ dành cho admin), cùng bộ lọc với export"""
+        return self._export(request, items=True)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def import_bank_statement(self, request):
+        """
+        Đối soát file sao kê ngân hàng với đơn chuyển khoản chờ thanh toán (chỉ dành cho admin)
+        
+        Multipart: file (CSV / MT940), format (tùy chọn), dry_run (tùy chọn)
+        """
+        if request.user.role != 'admin':
             return Response(
-                {'error': 'Không tìm thấy đơn hàng'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'Bạn không có quyền đối soát chuyển khoản'},
+                status=status.HTTP_403_FORBIDDEN
             )
         
-        # Kiểm tra đơn hàng đã thanh toán chưa
-        if order.payment_status == 'paid':
+        upload = request.FILES.get('file')
+        if upload is None:
             return Response(
-                {'error': 'Đơn hàng đã được thanh toán'},
+                {'error': 'Vui lòng tải lên file sao kê'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Kiểm tra phương thức thanh toán
-        if order.payment_method != 'vnpay':
+        file_format = request.data.get('format') or bank_statements.detect_format(upload.name)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            matches, stats = bank_statements.reconcile(
+                stream, file_format, dry_run=dry_run, changed_by=request.user
+            )
+        except (bank_statements.StatementError, UnicodeDecodeError) as e:
             return Response(
-                {'error': 'Đơn hàng không sử dụng phương thức thanh toán VNPay'},
+                {'error': f'Không đọc được file sao kê: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            # Khởi tạo VNPay
-            vnpay = VNPay(
-                vnp_tmn_code=settings.VNPAY_TMN_CODE,
-                vnp_hash_secret=settings.VNPAY_HASH_SECRET,
-                vnp_url=settings.VNPAY_URL,
-                vnp_return_url=settings.VNPAY_RETURN_URL
-            )
-            
-            # Lấy IP address
-            ip_address = self._get_client_ip(request)
-            
-            # Tạo URL thanh toán
-            payment_url = vnpay.create_payment_url(
-                order_id=order.order_number,
-                amount=float(order.total),
-                order_desc=f"Thanh toan don hang {order.order_number}",
-                order_type='other',
-                language='vn',
-                ip_address=ip_address
+        issues = list(itertools.islice(bank_statements.issue_rows(matches), self.STATEMENT_ISSUE_LIMIT))
+        return Response({
+            'message': f"Đã ghi nhận thanh toán {stats['applied']} đơn hàng" if not dry_run else 'Đã so khớp (chưa cập nhật)',
+            'stats': dict(stats),
+            'issues': issues
+        })
+    
+    def _export(self, request, items):
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Bạn không có quyền export đơn hàng'},
+                status=status.HTTP_403_FORBIDDEN
             )
-            
-            return Response({
-                'payment_url': payment_url,
-                'order_number': order.order_number
-            })
-            
-        except Exception as e:
+        
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in ['csv', 'xlsx']:
             return Response(
-                {'error': f'Lỗi tạo URL thanh toán: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Định dạng export không hợp lệ (csv hoặc xlsx)'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        
+        if items:
+            queryset = OrderItem.objects.filter(**self._order_filters(request, prefix='order__'))
+            return exports.export_order_items(queryset, file_format)
+        
+        queryset = Order.objects.filter(**self._order_filters(request))
+        return exports.export_orders(queryset, file_format)
+    
+    @action(detail=True, methods=['post'], permission_classes=[AllowAny])
+    def create_vnpay_payment(self, request, pk=None):
+        """
+        Tạo URL thanh toán VNPay cho đơn hàng
+        """
+        return self._create_payment(request, pk, 'vnpay')
     
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def vnpay_return(self, request):
         """
         Xử lý callback từ VNPay sau khi thanh toán
         """
-        try:
-            # DEBUG: Log query params
-            print("=== VNPAY CALLBACK DEBUG ===")
-            print("Query params received:")
-            for k, v in request.query_params.items():
-                if k != 'vnp_SecureHash':
-                    print(f"  {k} = {v}")
-                else:
-                    print(f"  {k} = {v[:20]}...")
-            
-            # Khởi tạo VNPay
-            vnpay = VNPay(
-                vnp_tmn_code=settings.VNPAY_TMN_CODE,
-                vnp_hash_secret=settings.VNPAY_HASH_SECRET,
-                vnp_url=settings.VNPAY_URL,
-                vnp_return_url=settings.VNPAY_RETURN_URL
-            )
-            
-            # Validate response
-            query_params = dict(request.query_params)
-            # Convert QueryDict values từ list sang string
-            query_params = {k: v[0] if isinstance(v, list) else v for k, v in query_params.items()}
-            
-            result = vnpay.validate_response(query_params)
-            
-            print(f"Validation result: {'✅ VALID' if result['is_valid'] else '❌ INVALID'}")
-            print(f"Response code: {result['response_code']}")
-            print("=" * 50)
-            
-            if not result['is_valid']:
-                return Response(
-                    {'error': 'Chữ ký không hợp lệ'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Tìm đơn hàng
-            try:
-                order = Order.objects.get(order_number=result['order_id'])
-            except Order.DoesNotExist:
-                return Response(
-                    {'error': 'Không tìm thấy đơn hàng'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Cập nhật trạng thái thanh toán
-            if result['is_success']:
-                order.payment_status = 'paid'
-                order.status = 'confirmed'
-                
-                # Lưu thông tin giao dịch
-                order.transaction_id = result['transaction_no']
-                order.bank_code = result['bank_code']
-                order.bank_transaction_no = result.get('bank_tran_no', '')
-                
-                order.save()
-                
-                return Response({
-                    'message': 'Thanh toán thành công',
-                    'order': OrderSerializer(order).data,
-                    'transaction': result
-                })
-            else:
-                order.payment_status = 'failed'
-                order.save()
-                
-                return Response({
-                    'message': result['message'],
-                    'error': 'Thanh toán thất bại',
-                    'order': OrderSerializer(order).data,
-                    'transaction': result
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            return Response(
-                {'error': f'Lỗi xử lý callback: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return self._payment_return(request, 'vnpay')
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def create_momo_payment(self, request, pk=None):
         """
         Tạo payment request tới MoMo cho đơn hàng
         """
-        # Lấy order theo ID
+        return self._create_payment(request, pk, 'momo')
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def momo_return(self, request):
+        """
+        Xử lý callback từ MoMo sau khi thanh toán
+        """
+        return self._payment_return(request, 'momo')
+    
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def momo_ipn(self, request):
+        """
+        Xử lý IPN (Instant Payment Notification) từ MoMo
+        Đây là webhook để MoMo thông báo kết quả thanh toán
+        """
+        return self._payment_ipn(request, 'momo', request.data)
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def vnpay_ipn(self, request):
+        """
+        Xử lý IPN từ VNPay (VNPay gọi GET tới IPN URL đã đăng ký)
+        """
+        return self._payment_ipn(request, 'vnpay', request.query_params.dict())
+    
+    def _create_payment(self, request, pk, method):
+        """Tạo yêu cầu thanh toán online qua cổng `method`"""
+        provider = payment_providers.get_provider(method)
+        
+        # Lấy order theo ID trực tiếp, không qua get_object() để bypass permission check
         try:
             order = Order.objects.get(pk=pk)
         except Order.DoesNotExist:
@@ -365,87 +531,52 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
         
         # Kiểm tra phương thức thanh toán
-        if order.payment_method != 'momo':
+        if order.payment_method != method:
             return Response(
-                {'error': 'Đơn hàng không sử dụng phương thức thanh toán MoMo'},
+                {'error': f'Đơn hàng không sử dụng phương thức thanh toán {provider.label}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         try:
-            # Khởi tạo MoMo
-            momo = MoMo(
-                partner_code=settings.MOMO_PARTNER_CODE,
-                access_key=settings.MOMO_ACCESS_KEY,
-                secret_key=settings.MOMO_SECRET_KEY,
-                api_url=settings.MOMO_API_URL,
-                return_url=settings.MOMO_RETURN_URL,
-                notify_url=settings.MOMO_NOTIFY_URL
+            # Dùng lại URL thanh toán còn hiệu lực nếu khách bấm thanh toán nhiều lần
+            attempt, _ = payments.get_or_create_attempt(
+                order, provider, ip_address=self._get_client_ip(request)
             )
-            
-            # Tạo payment request
-            result = momo.create_payment_url(
-                order_id=order.order_number,
-                amount=float(order.total),
-                order_info=f"Thanh toan don hang {order.order_number}",
-                lang='vi'
+        except payment_providers.PaymentProviderError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            
-            if result['success']:
-                return Response({
-                    'payment_url': result['payment_url'],
-                    'order_number': order.order_number,
-                    'deep_link': result.get('deep_link'),
-                    'qr_code_url': result.get('qr_code_url')
-                })
-            else:
-                return Response(
-                    {'error': result.get('error', 'Lỗi tạo payment request')},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
         except Exception as e:
             return Response(
-                {'error': f'Lỗi tạo payment request: {str(e)}'},
+                {'error': f'Lỗi tạo URL thanh toán: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        return Response({
+            'payment_url': attempt.payment_url,
+            'order_number': order.order_number,
+            'expires_at': attempt.expires_at,
+            **attempt.response
+        })
     
-    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
-    def momo_return(self, request):
-        """
-        Xử lý callback từ MoMo sau khi thanh toán
-        """
+    def _payment_return(self, request, method):
+        """Xử lý return URL của cổng `method` (khách được chuyển về sau khi thanh toán)"""
+        provider = payment_providers.get_provider(method)
+        
         try:
-            # DEBUG: Log query params
-            print("=== MOMO CALLBACK DEBUG ===")
-            print("Query params received:")
-            for k, v in request.query_params.items():
-                if k != 'signature':
-                    print(f"  {k} = {v}")
-                else:
-                    print(f"  {k} = {v[:20]}...")
-            
-            # Khởi tạo MoMo
-            momo = MoMo(
-                partner_code=settings.MOMO_PARTNER_CODE,
-                access_key=settings.MOMO_ACCESS_KEY,
-                secret_key=settings.MOMO_SECRET_KEY,
-                api_url=settings.MOMO_API_URL,
-                return_url=settings.MOMO_RETURN_URL,
-                notify_url=settings.MOMO_NOTIFY_URL
-            )
-            
-            # Validate response
-            query_params = dict(request.query_params)
             # Convert QueryDict values từ list sang string
-            query_params = {k: v[0] if isinstance(v, list) else v for k, v in query_params.items()}
-            
-            result = momo.validate_response(query_params)
+            query_params = {k: v[0] if isinstance(v, list) else v for k, v in dict(request.query_params).items()}
             
-            print(f"Validation result: {'✅ VALID' if result['is_valid'] else '❌ INVALID'}")
-            print(f"Result code: {result['result_code']}")
-            print("=" * 50)
+            result = provider.verify_callback(query_params)
+            logger.info('payment.return', extra={
+                'gateway': method,
+                'order_number': result.order_number,
+                'valid': result.is_valid,
+                'success': result.is_success
+            })
             
-            if not result['is_valid']:
+            if not result.is_valid:
                 return Response(
                     {'error': 'Chữ ký không hợp lệ'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -453,117 +584,79 @@ class OrderViewSet(viewsets.ModelViewSet):
             
             # Tìm đơn hàng
             try:
-                order = Order.objects.get(order_number=result['order_id'])
+                order = Order.objects.get(order_number=result.order_number)
             except Order.DoesNotExist:
                 return Response(
                     {'error': 'Không tìm thấy đơn hàng'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Cập nhật trạng thái thanh toán
-            if result['is_success']:
-                order.payment_status = 'paid'
-                order.status = 'confirmed'
-                
-                # Lưu thông tin giao dịch
-                order.transaction_id = result['trans_id']
-                order.bank_transaction_no = result['request_id']
-                
-                order.save()
+            # Cập nhật trạng thái thanh toán (UPDATE có điều kiện: return URL và IPN
+            # tới cùng lúc chỉ một bên ghi, đơn đã thanh toán không bị ghi đè thành failed)
+            if result.is_success:
+                payments.mark_paid(order, result, source=method)
                 
                 return Response({
                     'message': 'Thanh toán thành công',
                     'order': OrderSerializer(order).data,
-                    'transaction': result
+                    'transaction': result.data
                 })
             else:
-                order.payment_status = 'failed'
-                order.save()
+                payments.mark_failed(order)
                 
                 return Response({
-                    'message': result['error_message'],
+                    'message': result.message,
                     'error': 'Thanh toán thất bại',
                     'order': OrderSerializer(order).data,
-                    'transaction': result
+                    'transaction': result.data
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
         except Exception as e:
+            logger.exception('payment.return_error', extra={'gateway': method})
             return Response(
                 {'error': f'Lỗi xử lý callback: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
-    def momo_ipn(self, request):
+    def _payment_ipn(self, request, method, data):
         """
-        Xử lý IPN (Instant Payment Notification) từ MoMo
-        Đây là webhook để MoMo thông báo kết quả thanh toán
+        Nhận IPN của cổng `method`: kiểm tra chữ ký, ghi vào inbox và trả lời ngay
+        
+        Đơn hàng được cập nhật bởi worker `process_payment_events`; IPN gửi lại
+        cho cùng giao dịch bị loại nhờ unique (gateway, transaction_id).
         """
+        provider = payment_providers.get_provider(method)
+        
         try:
-            # DEBUG: Log IPN data
-            print("=== MOMO IPN DEBUG ===")
-            print(f"IPN data received: {request.data}")
-            
-            # Khởi tạo MoMo
-            momo = MoMo(
-                partner_code=settings.MOMO_PARTNER_CODE,
-                access_key=settings.MOMO_ACCESS_KEY,
-                secret_key=settings.MOMO_SECRET_KEY,
-                api_url=settings.MOMO_API_URL,
-                return_url=settings.MOMO_RETURN_URL,
-                notify_url=settings.MOMO_NOTIFY_URL
-            )
-            
-            # Validate IPN
-            result = momo.validate_response(request.data)
-            
-            print(f"IPN Validation: {'✅ VALID' if result['is_valid'] else '❌ INVALID'}")
-            print("=" * 50)
+            result = provider.verify_callback(data)
             
-            if not result['is_valid']:
-                # Trả về response theo format của MoMo
-                return Response({
-                    'partnerCode': settings.MOMO_PARTNER_CODE,
-                    'requestId': request.data.get('requestId'),
-                    'orderId': request.data.get('orderId'),
-                    'resultCode': 97,  # Invalid signature
-                    'message': 'Invalid signature'
+            if not result.is_valid:
+                logger.warning('payment.ipn_invalid_signature', extra={
+                    'gateway': method,
+                    'order_number': result.order_number
                 })
+                return Response(provider.ipn_response(data, payment_providers.IPN_INVALID_SIGNATURE))
             
-            # Tìm và cập nhật đơn hàng
-            try:
-                order = Order.objects.get(order_number=result['order_id'])
-                
-                if result['is_success'] and order.payment_status != 'paid':
-                    order.payment_status = 'paid'
-                    order.status = 'confirmed'
-                    order.transaction_id = result['trans_id']
-                    order.bank_transaction_no = result['request_id']
-                    order.save()
-                    
-                    print(f"✅ Order {order.order_number} updated successfully")
-                
-            except Order.DoesNotExist:
-                print(f"❌ Order {result['order_id']} not found")
+            if not payments.record_event(method, result, data):
+                logger.info('payment.ipn_duplicate', extra={
+                    'gateway': method,
+                    'order_number': result.order_number,
+                    'transaction_id': result.transaction_id
+                })
+                return Response(provider.ipn_response(data, payment_providers.IPN_ALREADY_CONFIRMED))
             
-            # Trả về response thành công cho MoMo
-            return Response({
-                'partnerCode': settings.MOMO_PARTNER_CODE,
-                'requestId': request.data.get('requestId'),
-                'orderId': request.data.get('orderId'),
-                'resultCode': 0,
-                'message': 'Success'
+            logger.info('payment.ipn_received', extra={
+                'gateway': method,
+                'order_number': result.order_number,
+                'transaction_id': result.transaction_id,
+                'success': result.is_success
             })
+            logger.debug('payment.ipn_payload', extra={'gateway': method, 'payload': dict(data)})
+            return Response(provider.ipn_response(data, payment_providers.IPN_OK))
             
         except Exception as e:
-            print(f"Error processing MoMo IPN: {str(e)}")
-            return Response({
-                'partnerCode': settings.MOMO_PARTNER_CODE,
-                'requestId': request.data.get('requestId', ''),
-                'orderId': request.data.get('orderId', ''),
-                'resultCode': 99,
-                'message': str(e)
-            })
+            logger.exception('payment.ipn_error', extra={'gateway': method})
+            return Response(provider.ipn_response(data, payment_providers.IPN_ERROR, str(e)))
     
     def _get_client_ip(self, request):
         """Lấy IP address của client"""
@@ -573,3 +666,62 @@ class OrderViewSet(viewsets.ModelViewSet):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip or '127.0.0.1'
+
+
+class ShippingViewSet(viewsets.ViewSet):
+    """ViewSet báo giá phí vận chuyển (trang giỏ hàng / thanh toán)"""
+    permission_classes = [AllowAny]
+    
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        Báo giá phí vận chuyển theo khu vực giao hàng
+        
+        Body: city, district, coupon_code (tùy chọn) và items [{product_id, quantity}];
+        không truyền items thì báo giá cho giỏ hàng hiện tại.
+        """
+        serializer = ShippingQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        if data.get('items'):
+            products = Product.objects.in_bulk([item['product_id'] for item in data['items']])
+            lines = [
+                (products[item['product_id']], item['quantity'])
+                for item in data['items']
+                if item['product_id'] in products
+            ]
+        else:
+            cart = cart_services.get_cart(request)
+            lines = [
+                (line.product, line.quantity)
+                for line in (cart.items.select_related('product') if cart else [])
+            ]
+        
+        subtotal = sum((product.price * quantity for product, quantity in lines), Decimal('0'))
+        weight_kg = sum(
+            (shipping.parse_weight_kg(product.weight) * quantity for product, quantity in lines),
+            Decimal('0')
+        )
+        result = shipping.quote(subtotal, data['city'], data['district'], weight_kg)
+        
+        discount = Decimal('0')
+        if data.get('coupon_code'):
+            try:
+                discount = promotions.evaluate(
+                    data['coupon_code'],
+                    [(product.category_id, product.price * quantity) for product, quantity in lines],
+                    subtotal,
+                    result.fee
+                ).amount
+            except promotions.CouponError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'subtotal': subtotal,
+            'weight_kg': weight_kg,
+            'shipping_fee': result.fee,
+            'discount': discount,
+            'total': subtotal + result.fee - discount,
+            'rule': result.rule_name
+        })
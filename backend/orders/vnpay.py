@@ -4,10 +4,17 @@ Documentation: https://sandbox.vnpayment.vn/apis/docs/thanh-toan-pay/pay.html
 """
 import hashlib
 import hmac
+import logging
 import urllib.parse
+import uuid
 from datetime import datetime
 from typing import Dict, Optional
 
+from .gateway_client import get_client, CircuitOpenError, GatewayError, GatewayUnreachableError
+
+
+logger = logging.getLogger(__name__)
+
 
 class VNPay:
     """VNPay Payment Gateway Handler"""
@@ -17,7 +24,8 @@ class VNPay:
         vnp_tmn_code: str,
         vnp_hash_secret: str,
         vnp_url: str,
-        vnp_return_url: str
+        vnp_return_url: str,
+        vnp_api_url: Optional[str] = None
     ):
         """
         Initialize VNPay configuration
@@ -27,11 +35,22 @@ class VNPay:
             vnp_hash_secret: VNPay Hash Secret Key
             vnp_url: VNPay Payment URL
             vnp_return_url: Return URL after payment
+            vnp_api_url: VNPay merchant API URL (querydr/refund)
         """
         self.vnp_tmn_code = vnp_tmn_code
         self.vnp_hash_secret = vnp_hash_secret
         self.vnp_url = vnp_url
         self.vnp_return_url = vnp_return_url
+        self.vnp_api_url = vnp_api_url
+        
+        # Secret key được encode một lần; mỗi chữ ký copy() từ HMAC đã khởi tạo
+        self._hmac = hmac.new(vnp_hash_secret.encode('utf-8'), digestmod=hashlib.sha512)
+    
+    def sign(self, hash_data: str) -> str:
+        """Tạo HMAC SHA512 cho chuỗi dữ liệu"""
+        mac = self._hmac.copy()
+        mac.update(hash_data.encode('utf-8'))
+        return mac.hexdigest()
     
     def create_payment_url(
         self,
@@ -41,7 +60,9 @@ class VNPay:
         order_type: str = 'other',
         language: str = 'vn',
         bank_code: Optional[str] = None,
-        ip_address: str = '127.0.0.1'
+        ip_address: str = '127.0.0.1',
+        create_date: Optional[str] = None,
+        expire_date: Optional[str] = None
     ) -> str:
         """
         Tạo URL thanh toán VNPay
@@ -54,6 +75,8 @@ class VNPay:
             language: Ngôn ngữ (vn/en)
             bank_code: Mã ngân hàng (nếu có)
             ip_address: IP address của khách hàng
+            create_date: Thời gian tạo giao dịch (yyyyMMddHHmmss, mặc định: hiện tại)
+            expire_date: Thời hạn thanh toán (yyyyMMddHHmmss, nếu có)
         
         Returns:
             URL thanh toán VNPay
@@ -71,13 +94,16 @@ class VNPay:
             'vnp_Locale': language,
             'vnp_ReturnUrl': self.vnp_return_url,
             'vnp_IpAddr': ip_address,
-            'vnp_CreateDate': datetime.now().strftime('%Y%m%d%H%M%S')
+            'vnp_CreateDate': create_date or datetime.now().strftime('%Y%m%d%H%M%S')
         }
         
         # Thêm bank code nếu có
         if bank_code:
             vnp_params['vnp_BankCode'] = bank_code
         
+        if expire_date:
+            vnp_params['vnp_ExpireDate'] = expire_date
+        
         # Sắp xếp params theo key
         sorted_params = sorted(vnp_params.items())
         
@@ -85,11 +111,7 @@ class VNPay:
         hash_data = '&'.join([f"{key}={val}" for key, val in sorted_params])
         
         # Tạo secure hash
-        secure_hash = hmac.new(
-            self.vnp_hash_secret.encode('utf-8'),
-            hash_data.encode('utf-8'),
-            hashlib.sha512
-        ).hexdigest()
+        secure_hash = self.sign(hash_data)
         
         # Tạo query string (có encode)
         query_string = '&'.join([f"{key}={urllib.parse.quote_plus(str(val))}" for key, val in sorted_params])
@@ -122,25 +144,16 @@ class VNPay:
         # Tạo hash data - QUAN TRỌNG: không encode giá trị, chỉ nối chuỗi
         hash_data = '&'.join([f"{key}={val}" for key, val in sorted_params])
         
-        # DEBUG: Log hash calculation
-        print("\n=== VNPAY VALIDATE DEBUG ===")
-        print(f"Hash data: {hash_data[:200]}...")
-        print(f"Secret key: {self.vnp_hash_secret[:10]}...")
-        
         # Tính secure hash
-        calculated_hash = hmac.new(
-            self.vnp_hash_secret.encode('utf-8'),
-            hash_data.encode('utf-8'),
-            hashlib.sha512
-        ).hexdigest()
-        
-        print(f"VNPay hash:     {vnp_secure_hash[:40]}...")
-        print(f"Calculated hash: {calculated_hash[:40]}...")
-        print(f"Match: {calculated_hash == vnp_secure_hash}")
-        print("=" * 50)
+        calculated_hash = self.sign(hash_data)
         
         # Validate hash
-        is_valid = calculated_hash == vnp_secure_hash
+        is_valid = hmac.compare_digest(calculated_hash.encode(), str(vnp_secure_hash).lower().encode())
+        logger.debug('vnpay.validate_response', extra={
+            'order_number': query_params.get('vnp_TxnRef', ''),
+            'response_code': query_params.get('vnp_ResponseCode', ''),
+            'valid': is_valid
+        })
         
         # Parse response
         response_code = query_params.get('vnp_ResponseCode', '')
@@ -164,6 +177,140 @@ class VNPay:
         
         return result
     
+    def query_transaction(
+        self,
+        order_id: str,
+        transaction_date: str,
+        order_desc: str = '',
+        ip_address: str = '127.0.0.1'
+    ) -> Dict[str, any]:
+        """
+        Truy vấn kết quả giao dịch (querydr)
+        
+        Args:
+            order_id: Mã đơn hàng (vnp_TxnRef)
+            transaction_date: Thời gian tạo giao dịch (yyyyMMddHHmmss)
+            order_desc: Mô tả truy vấn
+            ip_address: IP của server gửi truy vấn
+        
+        Returns:
+            Dict response của VNPay (vnp_ResponseCode, vnp_TransactionStatus...)
+        """
+        request_data = {
+            'vnp_RequestId': uuid.uuid4().hex,
+            'vnp_Version': '2.1.0',
+            'vnp_Command': 'querydr',
+            'vnp_TmnCode': self.vnp_tmn_code,
+            'vnp_TxnRef': order_id,
+            'vnp_OrderInfo': order_desc or f"Truy van giao dich {order_id}",
+            'vnp_TransactionDate': transaction_date,
+            'vnp_CreateDate': datetime.now().strftime('%Y%m%d%H%M%S'),
+            'vnp_IpAddr': ip_address
+        }
+        
+        # Chuỗi ký của querydr nối bằng '|' theo thứ tự cố định
+        hash_data = '|'.join([
+            request_data['vnp_RequestId'],
+            request_data['vnp_Version'],
+            request_data['vnp_Command'],
+            request_data['vnp_TmnCode'],
+            request_data['vnp_TxnRef'],
+            request_data['vnp_TransactionDate'],
+            request_data['vnp_CreateDate'],
+            request_data['vnp_IpAddr'],
+            request_data['vnp_OrderInfo']
+        ])
+        request_data['vnp_SecureHash'] = self.sign(hash_data)
+        
+        try:
+            # vnp_RequestId cố định nên thử lại không tạo truy vấn trùng
+            return get_client('vnpay').post_json(self.vnp_api_url, request_data, idempotent=True)
+        except CircuitOpenError:
+            return {
+                'vnp_ResponseCode': '-1',
+                'vnp_Message': 'Cổng thanh toán VNPay tạm thời không khả dụng'
+            }
+        except GatewayError as e:
+            logger.warning('vnpay.query_failed', extra={'order_number': order_id, 'error': str(e)})
+            return {
+                'vnp_ResponseCode': '-1',
+                'vnp_Message': str(e)
+            }
+    
+    def refund(
+        self,
+        order_id: str,
+        amount: float,
+        transaction_no: str,
+        transaction_date: str,
+        full: bool = True,
+        create_by: str = 'system',
+        order_desc: str = '',
+        ip_address: str = '127.0.0.1'
+    ) -> Dict[str, any]:
+        """
+        Hoàn tiền giao dịch (refund)
+        
+        Args:
+            order_id: Mã đơn hàng (vnp_TxnRef)
+            amount: Số tiền hoàn (VNĐ)
+            transaction_no: Mã giao dịch VNPay (vnp_TransactionNo)
+            transaction_date: Thời gian tạo giao dịch thanh toán (yyyyMMddHHmmss)
+            full: Hoàn toàn phần (02) hay một phần (03)
+            create_by: Người tạo yêu cầu hoàn tiền
+            order_desc: Mô tả
+            ip_address: IP của server gửi yêu cầu
+        
+        Returns:
+            Dict response của VNPay (vnp_ResponseCode '-1' nếu request chưa tới
+            VNPay, '-2' nếu không rõ VNPay đã xử lý hay chưa)
+        """
+        request_data = {
+            'vnp_RequestId': uuid.uuid4().hex,
+            'vnp_Version': '2.1.0',
+            'vnp_Command': 'refund',
+            'vnp_TmnCode': self.vnp_tmn_code,
+            'vnp_TransactionType': '02' if full else '03',
+            'vnp_TxnRef': order_id,
+            'vnp_Amount': int(amount * 100),
+            'vnp_OrderInfo': order_desc or f"Hoan tien don hang {order_id}",
+            'vnp_TransactionNo': transaction_no or '',
+            'vnp_TransactionDate': transaction_date,
+            'vnp_CreateBy': create_by,
+            'vnp_CreateDate': datetime.now().strftime('%Y%m%d%H%M%S'),
+            'vnp_IpAddr': ip_address
+        }
+        
+        hash_data = '|'.join(str(request_data[key]) for key in [
+            'vnp_RequestId', 'vnp_Version', 'vnp_Command', 'vnp_TmnCode',
+            'vnp_TransactionType', 'vnp_TxnRef', 'vnp_Amount', 'vnp_TransactionNo',
+            'vnp_TransactionDate', 'vnp_CreateBy', 'vnp_CreateDate', 'vnp_IpAddr',
+            'vnp_OrderInfo'
+        ])
+        request_data['vnp_SecureHash'] = self.sign(hash_data)
+        
+        try:
+            # Không thử lại khi timeout: yêu cầu có thể đã được VNPay xử lý
+            return get_client('vnpay').post_json(self.vnp_api_url, request_data, idempotent=False)
+        except CircuitOpenError:
+            return {
+                'vnp_ResponseCode': '-1',
+                'vnp_Message': 'Cổng thanh toán VNPay tạm thời không khả dụng'
+            }
+        except GatewayUnreachableError as e:
+            logger.warning('vnpay.refund_failed', extra={'order_number': order_id, 'error': str(e)})
+            return {
+                'vnp_ResponseCode': '-1',
+                'vnp_Message': str(e)
+            }
+        except GatewayError as e:
+            # Timeout / lỗi sau khi đã gửi: gửi lại với vnp_RequestId mới có thể hoàn tiền hai lần
+            logger.warning('vnpay.refund_unknown', extra={'order_number': order_id, 'error': str(e)})
+            return {
+                'vnp_ResponseCode': '-2',
+                'vnp_Message': str(e)
+            }
+    
     def _get_response_message(self, response_code: str) -> str:
         """Lấy message từ response code"""
         messages = {
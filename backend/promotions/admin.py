@@ -0,0 +1,42 @@
+from django.contrib import admin
+from .models import Coupon, OrderDiscount
+from .engine import used_count
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    """Admin cho mã giảm giá"""
+    list_display = [
+        'code', 'name', 'discount_type', 'value', 'min_order_value', 'category',
+        'valid_from', 'valid_to', 'usage_limit', 'used', 'is_active'
+    ]
+    list_filter = ['discount_type', 'is_active', 'category']
+    search_fields = ['code', 'name']
+    
+    fieldsets = (
+        ('Thông tin mã', {
+            'fields': ('code', 'name', 'is_active')
+        }),
+        ('Giảm giá', {
+            'fields': ('discount_type', 'value', 'max_discount', 'min_order_value', 'category')
+        }),
+        ('Thời hạn và giới hạn', {
+            'fields': ('valid_from', 'valid_to', 'usage_limit')
+        }),
+    )
+    
+    @admin.display(description='Đã dùng')
+    def used(self, obj):
+        return used_count(obj)
+
+
+@admin.register(OrderDiscount)
+class OrderDiscountAdmin(admin.ModelAdmin):
+    """Admin cho dòng giảm giá của đơn hàng"""
+    list_display = ['order', 'code', 'discount_type', 'amount', 'created_at']
+    list_filter = ['discount_type', 'created_at']
+    search_fields = ['code', 'order__order_number']
+    readonly_fields = ['order', 'coupon', 'code', 'description', 'discount_type', 'amount', 'usage_shard', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
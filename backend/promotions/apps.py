@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PromotionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'promotions'
+
+    def ready(self):
+        # Biên dịch lại bảng mã giảm giá khi mã thay đổi
+        from . import signals  # noqa: F401
@@ -0,0 +1,210 @@
+"""
+Tính giảm giá theo mã khuyến mãi
+
+Các mã đang áp dụng được biên dịch thành dict code -> quy tắc trong bộ nhớ
+mỗi process (xem backend.compiled_cache), nên việc tính giảm giá không tốn
+truy vấn. Mã bị sửa / ngừng áp dụng ở process khác được nhận qua version
+của bảng mã trong database (kiểm tra mỗi COUPONS_CHECK_INTERVAL giây). Lượt dùng được ghi vào các CouponUsageShard bằng câu UPDATE có
+điều kiện trên một mảnh chọn ngẫu nhiên: nhiều đơn hàng dùng cùng một mã
+khóa các dòng khác nhau thay vì xếp hàng trên một bộ đếm duy nhất.
+"""
+import random
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend.compiled_cache import CompiledCache, table_version
+from .models import Coupon, CouponUsageShard, OrderDiscount
+
+
+Discount = namedtuple('Discount', ['coupon_id', 'code', 'description', 'discount_type', 'amount'])
+
+
+class CouponError(Exception):
+    """Mã giảm giá không hợp lệ hoặc không áp dụng được"""
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+class _Coupon:
+    """Mã giảm giá đã biên dịch"""
+    __slots__ = [
+        'id', 'code', 'name', 'discount_type', 'value', 'max_discount',
+        'min_order_value', 'category_id', 'valid_from', 'valid_to'
+    ]
+
+    def __init__(self, coupon):
+        for field in self.__slots__:
+            setattr(self, field, getattr(coupon, field))
+
+    def evaluate(self, lines, subtotal, shipping_fee, now):
+        """
+        Số tiền giảm cho đơn hàng
+
+        Args:
+            lines: list (category_id, thành tiền) của các dòng hàng
+        """
+        if self.valid_from and now < self.valid_from:
+            raise CouponError(f"Mã giảm giá {self.code} chưa đến thời gian áp dụng")
+        if self.valid_to and now > self.valid_to:
+            raise CouponError(f"Mã giảm giá {self.code} đã hết hạn")
+        if subtotal < self.min_order_value:
+            raise CouponError(
+                f"Mã giảm giá {self.code} áp dụng cho đơn hàng từ {self.min_order_value:,.0f}đ"
+            )
+
+        if self.category_id:
+            eligible = sum(
+                (line_subtotal for category_id, line_subtotal in lines if category_id == self.category_id),
+                Decimal('0')
+            )
+            if not eligible:
+                raise CouponError(f"Mã giảm giá {self.code} không áp dụng cho sản phẩm trong đơn hàng")
+        else:
+            eligible = subtotal
+
+        if self.discount_type == 'percentage':
+            amount = (eligible * self.value / 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        elif self.discount_type == 'fixed':
+            amount = min(self.value, eligible)
+        else:
+            amount = shipping_fee
+
+        if self.max_discount is not None:
+            amount = min(amount, self.max_discount)
+        return max(amount, Decimal('0'))
+
+
+def build_coupons():
+    """Biên dịch các mã giảm giá đang áp dụng"""
+    return {
+        coupon.code: _Coupon(coupon)
+        for coupon in Coupon.objects.filter(is_active=True)
+    }
+
+
+coupons_cache = CompiledCache(
+    'coupons',
+    build_coupons,
+    check_interval=settings.COUPONS_CHECK_INTERVAL,
+    version=table_version(Coupon)
+)
+
+
+def get_coupon(code):
+    """Lấy mã giảm giá đã biên dịch (None nếu không tồn tại / ngừng áp dụng)"""
+    return coupons_cache.get().get(normalize_code(code))
+
+
+def evaluate(code, lines, subtotal, shipping_fee, now=None):
+    """
+    Tính giảm giá cho đơn hàng (không truy vấn database)
+
+    Raises:
+        CouponError: mã không tồn tại hoặc không áp dụng được
+    """
+    coupon = get_coupon(code)
+    if coupon is None:
+        raise CouponError(f"Mã giảm giá {normalize_code(code)} không tồn tại")
+
+    amount = coupon.evaluate(lines, subtotal, shipping_fee, now or timezone.now())
+    return Discount(coupon.id, coupon.code, coupon.name, coupon.discount_type, amount)
+
+
+def claim_usage(coupon_id):
+    """
+    Ghi một lượt dùng mã giảm giá (phải gọi trong transaction của đơn hàng)
+
+    Bắt đầu từ một mảnh ngẫu nhiên, thử lần lượt các mảnh bằng câu UPDATE
+    có điều kiện cho tới khi một mảnh còn chỗ.
+
+    Returns:
+        Số thứ tự mảnh đã ghi lượt dùng
+
+    Raises:
+        CouponError: mã đã hết lượt sử dụng
+    """
+    shard_count = settings.COUPON_USAGE_SHARDS
+    start = random.randrange(shard_count)
+    for offset in range(shard_count):
+        shard = (start + offset) % shard_count
+        updated = CouponUsageShard.objects.filter(
+            Q(capacity__isnull=True) | Q(used__lt=F('capacity')),
+            coupon_id=coupon_id,
+            shard=shard
+        ).update(used=F('used') + 1)
+        if updated:
+            return shard
+
+    raise CouponError("Mã giảm giá đã hết lượt sử dụng")
+
+
+def apply_to_order(order, discount):
+    """Ghi lượt dùng và dòng giảm giá cho đơn hàng"""
+    shard = claim_usage(discount.coupon_id)
+    return OrderDiscount.objects.create(
+        order=order,
+        coupon_id=discount.coupon_id,
+        code=discount.code,
+        description=discount.description,
+        discount_type=discount.discount_type,
+        amount=discount.amount,
+        usage_shard=shard
+    )
+
+
+def release_usage(order_ids):
+    """Hoàn lượt dùng mã giảm giá của các đơn hàng bị hủy"""
+    usages = OrderDiscount.objects.filter(
+        order_id__in=order_ids,
+        coupon__isnull=False,
+        usage_shard__isnull=False
+    ).values_list('coupon_id', 'usage_shard')
+
+    for coupon_id, shard in usages:
+        CouponUsageShard.objects.filter(
+            coupon_id=coupon_id,
+            shard=shard,
+            used__gt=0
+        ).update(used=F('used') - 1)
+
+
+def sync_shards(coupon):
+    """
+    Tạo / chia lại sức chứa các mảnh bộ đếm theo giới hạn lượt dùng
+
+    Lượt dùng còn lại được chia đều cho các mảnh; lượt đã dùng được giữ nguyên.
+    """
+    shard_count = settings.COUPON_USAGE_SHARDS
+    with transaction.atomic():
+        existing = set(
+            CouponUsageShard.objects.filter(coupon=coupon).values_list('shard', flat=True)
+        )
+        CouponUsageShard.objects.bulk_create([
+            CouponUsageShard(coupon=coupon, shard=number)
+            for number in range(shard_count)
+            if number not in existing
+        ])
+
+        ordered = list(CouponUsageShard.objects.select_for_update().filter(coupon=coupon).order_by('shard'))
+        if coupon.usage_limit is None:
+            for shard in ordered:
+                shard.capacity = None
+        else:
+            remaining = max(coupon.usage_limit - sum(shard.used for shard in ordered), 0)
+            share, extra = divmod(remaining, len(ordered))
+            for index, shard in enumerate(ordered):
+                shard.capacity = shard.used + share + (1 if index < extra else 0)
+
+        CouponUsageShard.objects.bulk_update(ordered, ['capacity'])
+
+
+def used_count(coupon):
+    """Tổng lượt đã dùng của mã giảm giá"""
+    return sum(coupon.usage_shards.values_list('used', flat=True))
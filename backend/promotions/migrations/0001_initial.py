@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('orders', '0006_archivedorder_discount_order_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True, verbose_name='Mã giảm giá')),
+                ('name', models.CharField(max_length=255, verbose_name='Tên chương trình')),
+                ('discount_type', models.CharField(choices=[('percentage', 'Giảm theo phần trăm'), ('fixed', 'Giảm số tiền cố định'), ('free_shipping', 'Miễn phí vận chuyển')], max_length=20, verbose_name='Loại giảm giá')),
+                ('value', models.DecimalField(decimal_places=0, default=0, help_text='Phần trăm (percentage) hoặc số tiền (fixed)', max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Giá trị')),
+                ('max_discount', models.DecimalField(blank=True, decimal_places=0, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Giảm tối đa')),
+                ('min_order_value', models.DecimalField(decimal_places=0, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Giá trị đơn hàng tối thiểu')),
+                ('valid_from', models.DateTimeField(blank=True, null=True, verbose_name='Áp dụng từ')),
+                ('valid_to', models.DateTimeField(blank=True, null=True, verbose_name='Áp dụng đến')),
+                ('usage_limit', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Giới hạn lượt dùng')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Đang áp dụng')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')),
+                ('category', models.ForeignKey(blank=True, help_text='Chỉ áp dụng cho sản phẩm thuộc danh mục này', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='coupons', to='categories.category', verbose_name='Danh mục áp dụng')),
+            ],
+            options={
+                'verbose_name': 'Mã giảm giá',
+                'verbose_name_plural': 'Mã giảm giá',
+                'db_table': 'coupons',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CouponUsageShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.IntegerField(verbose_name='Mảnh')),
+                ('used', models.IntegerField(default=0, verbose_name='Đã dùng')),
+                ('capacity', models.IntegerField(blank=True, null=True, verbose_name='Sức chứa')),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_shards', to='promotions.coupon', verbose_name='Mã giảm giá')),
+            ],
+            options={
+                'verbose_name': 'Bộ đếm lượt dùng',
+                'verbose_name_plural': 'Bộ đếm lượt dùng',
+                'db_table': 'coupon_usage_shards',
+                'ordering': ['coupon', 'shard'],
+                'unique_together': {('coupon', 'shard')},
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDiscount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, verbose_name='Mã giảm giá')),
+                ('description', models.CharField(max_length=255, verbose_name='Mô tả')),
+                ('discount_type', models.CharField(choices=[('percentage', 'Giảm theo phần trăm'), ('fixed', 'Giảm số tiền cố định'), ('free_shipping', 'Miễn phí vận chuyển')], max_length=20, verbose_name='Loại giảm giá')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Số tiền giảm')),
+                ('usage_shard', models.IntegerField(blank=True, null=True, verbose_name='Mảnh bộ đếm')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('coupon', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_discounts', to='promotions.coupon', verbose_name='Mã giảm giá')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='discounts', to='orders.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Giảm giá đơn hàng',
+                'verbose_name_plural': 'Giảm giá đơn hàng',
+                'db_table': 'order_discounts',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['coupon', 'created_at'], name='order_disco_coupon__7068f6_idx')],
+            },
+        ),
+    ]
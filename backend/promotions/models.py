@@ -0,0 +1,163 @@
+from django.db import models
+from django.core.validators import MinValueValidator
+from categories.models import Category
+from orders.models import Order
+
+
+class Coupon(models.Model):
+    """
+    Model mã giảm giá
+    
+    Giới hạn lượt dùng được chia thành nhiều CouponUsageShard để các đơn
+    hàng dùng cùng một mã không tranh chấp khóa trên một dòng duy nhất.
+    """
+    DISCOUNT_TYPE_CHOICES = [
+        ('percentage', 'Giảm theo phần trăm'),
+        ('fixed', 'Giảm số tiền cố định'),
+        ('free_shipping', 'Miễn phí vận chuyển'),
+    ]
+    
+    code = models.CharField(max_length=50, unique=True, verbose_name='Mã giảm giá')
+    name = models.CharField(max_length=255, verbose_name='Tên chương trình')
+    discount_type = models.CharField(
+        max_length=20,
+        choices=DISCOUNT_TYPE_CHOICES,
+        verbose_name='Loại giảm giá'
+    )
+    value = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text='Phần trăm (percentage) hoặc số tiền (fixed)',
+        verbose_name='Giá trị'
+    )
+    max_discount = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        verbose_name='Giảm tối đa'
+    )
+    min_order_value = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Giá trị đơn hàng tối thiểu'
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='coupons',
+        help_text='Chỉ áp dụng cho sản phẩm thuộc danh mục này',
+        verbose_name='Danh mục áp dụng'
+    )
+    
+    # Thời hạn và giới hạn lượt dùng
+    valid_from = models.DateTimeField(null=True, blank=True, verbose_name='Áp dụng từ')
+    valid_to = models.DateTimeField(null=True, blank=True, verbose_name='Áp dụng đến')
+    usage_limit = models.IntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        verbose_name='Giới hạn lượt dùng'
+    )
+    is_active = models.BooleanField(default=True, verbose_name='Đang áp dụng')
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')
+    
+    class Meta:
+        db_table = 'coupons'
+        verbose_name = 'Mã giảm giá'
+        verbose_name_plural = 'Mã giảm giá'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+    
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+
+class CouponUsageShard(models.Model):
+    """
+    Model bộ đếm lượt dùng mã giảm giá (phân mảnh)
+    
+    Mỗi mảnh có sức chứa riêng; lượt dùng được ghi bằng câu UPDATE có điều
+    kiện `used < capacity` trên một mảnh chọn ngẫu nhiên.
+    """
+    coupon = models.ForeignKey(
+        Coupon,
+        on_delete=models.CASCADE,
+        related_name='usage_shards',
+        verbose_name='Mã giảm giá'
+    )
+    shard = models.IntegerField(verbose_name='Mảnh')
+    used = models.IntegerField(default=0, verbose_name='Đã dùng')
+    capacity = models.IntegerField(null=True, blank=True, verbose_name='Sức chứa')
+    
+    class Meta:
+        db_table = 'coupon_usage_shards'
+        verbose_name = 'Bộ đếm lượt dùng'
+        verbose_name_plural = 'Bộ đếm lượt dùng'
+        ordering = ['coupon', 'shard']
+        unique_together = ['coupon', 'shard']
+    
+    def __str__(self):
+        return f"{self.coupon_id}#{self.shard}: {self.used}/{self.capacity or '∞'}"
+
+
+class OrderDiscount(models.Model):
+    """Model dòng giảm giá của đơn hàng"""
+    # Không ràng buộc khóa ngoại: dòng giảm giá được giữ lại khi đơn hàng
+    # được chuyển sang bảng lưu trữ (cùng id)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='discounts',
+        verbose_name='Đơn hàng'
+    )
+    coupon = models.ForeignKey(
+        Coupon,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='order_discounts',
+        verbose_name='Mã giảm giá'
+    )
+    code = models.CharField(max_length=50, verbose_name='Mã giảm giá')
+    description = models.CharField(max_length=255, verbose_name='Mô tả')
+    discount_type = models.CharField(
+        max_length=20,
+        choices=Coupon.DISCOUNT_TYPE_CHOICES,
+        verbose_name='Loại giảm giá'
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Số tiền giảm'
+    )
+    # Mảnh bộ đếm đã ghi lượt dùng (để hoàn lượt khi hủy đơn)
+    usage_shard = models.IntegerField(null=True, blank=True, verbose_name='Mảnh bộ đếm')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    
+    class Meta:
+        db_table = 'order_discounts'
+        verbose_name = 'Giảm giá đơn hàng'
+        verbose_name_plural = 'Giảm giá đơn hàng'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['coupon', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id}: {self.code} -{self.amount}"
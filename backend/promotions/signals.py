@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Coupon
+from .engine import coupons_cache, sync_shards
+
+
+@receiver(post_save, sender=Coupon)
+def coupon_saved(sender, instance, **kwargs):
+    """Cập nhật bộ đếm lượt dùng và biên dịch lại bảng mã giảm giá"""
+    sync_shards(instance)
+    transaction.on_commit(coupons_cache.invalidate)
+
+
+@receiver(post_delete, sender=Coupon)
+def coupon_deleted(sender, **kwargs):
+    transaction.on_commit(coupons_cache.invalidate)
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from backend import compiled_cache
+from .models import Coupon
+from . import engine
+
+
+class CouponsCacheTests(TestCase):
+    """engine.coupons_cache: mã bị sửa ở process khác được nhận qua version trong database"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(compiled_cache.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        engine.coupons_cache._version = None
+        self.addCleanup(setattr, engine.coupons_cache, '_version', None)
+
+        self.coupon = Coupon.objects.create(code='GIAM10', name='Giảm 10%', discount_type='percentage', value=10)
+
+    def evaluate(self):
+        return engine.evaluate('giam10', [(None, 200000)], 200000, 30000).amount
+
+    def next_check(self):
+        self.now += engine.coupons_cache.check_interval
+
+    def test_edit_without_invalidate_is_picked_up(self):
+        self.assertEqual(self.evaluate(), 20000)
+
+        # Process khác sửa mã: không đổi version trong cache (LocMemCache) của process này
+        Coupon.objects.filter(pk=self.coupon.pk).update(value=20, updated_at=timezone.now())
+        self.assertEqual(self.evaluate(), 20000)
+
+        self.next_check()
+        self.assertEqual(self.evaluate(), 40000)
+
+    def test_deactivated_coupon_is_rejected(self):
+        self.assertEqual(self.evaluate(), 20000)
+
+        Coupon.objects.filter(pk=self.coupon.pk).update(is_active=False, updated_at=timezone.now())
+        self.next_check()
+        with self.assertRaises(engine.CouponError):
+            self.evaluate()
+
+    def test_separate_version_source(self):
+        source = {'version': 1}
+        cache = compiled_cache.CompiledCache(
+            'test_coupons', engine.build_coupons,
+            check_interval=engine.coupons_cache.check_interval, version=lambda: source['version']
+        )
+        self.assertEqual(cache.get()['GIAM10'].value, 10)
+
+        Coupon.objects.filter(pk=self.coupon.pk).update(value=15)
+        self.next_check()
+        self.assertEqual(cache.get()['GIAM10'].value, 10)
+
+        source['version'] += 1
+        self.next_check()
+        self.assertEqual(cache.get()['GIAM10'].value, 15)
@@ -1,9 +1,14 @@
+import logging
+
 from rest_framework import serializers
 from .models import Review
 from products.models import Product
 from orders.models import Order
 
 
+logger = logging.getLogger(__name__)
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     """Serializer cho Review"""
     
@@ -48,7 +53,7 @@ class ReviewSerializer(serializers.ModelSerializer):
                     return request.build_absolute_uri(obj.product.main_image.url)
                 return obj.product.main_image.url
         except Exception as e:
-            print(f"Error getting product image in ReviewSerializer: {e}")
+            logger.warning('reviews.product_image_error', extra={'review_id': obj.pk, 'error': str(e)})
         return None
 
 
@@ -166,5 +171,5 @@ class ProductReviewableSerializer(serializers.Serializer):
                     return request.build_absolute_uri(obj.product.main_image.url)
                 return obj.product.main_image.url
         except Exception as e:
-            print(f"Error getting product image: {e}")
+            logger.warning('reviews.product_image_error', extra={'error': str(e)})
         return None
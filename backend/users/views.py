@@ -6,6 +6,7 @@ from rest_framework.decorators import action
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
 from django.db import models
+from carts.services import merge_guest_cart
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -87,6 +88,9 @@ class UserLoginView(APIView):
                     # Generate JWT tokens
                     refresh = RefreshToken.for_user(user)
                     
+                    # Gộp giỏ hàng khách (nếu có) vào giỏ của tài khoản
+                    cart = merge_guest_cart(request.data.get('cart_token'), user)
+                    
                     return Response({
                         'success': True,
                         'message': 'Đăng nhập thành công!',
@@ -95,7 +99,8 @@ class UserLoginView(APIView):
                             'tokens': {
                                 'refresh': str(refresh),
                                 'access': str(refresh.access_token),
-                            }
+                            },
+                            'cart_id': cart.id if cart else None
                         }
                     }, status=status.HTTP_200_OK)
                 else: